@@ -1,21 +1,51 @@
-from matplotlib.patches import Rectangle
-from random import randint
+import argparse
+import asyncio
 from datetime import timedelta
+import hashlib
+import json
+import math
 import os
-from timeit import default_timer as timer
-from minizinc import Solver, Instance, Model
-import matplotlib.pyplot as plt
+import random
 import re
+import shutil
+import subprocess
+from timeit import default_timer as timer
+from types import SimpleNamespace
+import minizinc
+from minizinc import Solver, Instance, Model, Status
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+FLATZINC_DIR = os.path.join(SRC_DIR, '..', '..', '.cache', 'flatzinc')
+
+# Search strategies: the one of the model, circuits by decreasing area or height, large neighbourhood search,
+# parallel probing of fixed heights
+SEARCHES = ('default', 'area', 'height', 'lns', 'probe')
+RESTARTS = ('none', 'luby', 'geometric')
+RESTART_SCALE = 100  # failures before the first restart
+LNS_RELAX = 0.3  # fraction of the circuits relaxed in every neighbourhood
+LNS_STEP = 10  # seconds given to every neighbourhood
+
+ORDERED_SEARCH = """seq_search([
+    int_search([y[search_order[i]] | i in 1..n], input_order, indomain_min),
+    int_search([x[search_order[i]] | i in 1..n], input_order, indomain_min),
+    int_search([height], input_order, indomain_min)])"""
+
+# Solvers, parsed models and analysed instances, reused by every instance solved in this process
+_solvers = {}
+_models = {}
+_base_instances = {}
+
+from vlsi.journal import journaled_solve
+from vlsi.instances import get_instance
+from vlsi.preprocessing import preprocess
+from vlsi import writer
+from vlsi import heuristics
+from vlsi import profiling
+from vlsi.bounds import lower_bound
+from vlsi.incumbents import IncumbentStream
 
 #================================================== Input-Output methods =================================================================
 
-def load_data(line):
-    line = line.split('[')[1]
-    line = line.split(']')[0]
-    line = line.split(',')
-    return [int(n) for n in line]
-
-
 def write_output(width, n_circuits, dx, dy, x_sol, y_sol, height, output_file, elapsed_time, rotation, rotations=None):
 
     with open(output_file, 'w+') as out_file:
@@ -41,116 +71,559 @@ def write_output(width, n_circuits, dx, dy, x_sol, y_sol, height, output_file, e
 
 def plot(x_sol, y_sol, d, r, w, n_ins, rotation):
 
-    n = len(x_sol)
-    colors = []
+    # Rendered off the solving path, see vlsi.writer
+    plots_dir = '../plots/plots_rotations/' if rotation else '../plots/plots_no_rotations/'
+    writer.save_plot(x_sol, y_sol, r, d, os.path.join(SRC_DIR, plots_dir + 'ins-' + str(n_ins) + '-plot.png'))
 
-    for i in range(n):
-        colors.append('#%06X' % randint(0, 0xFFFFFF))
 
-    fig, ax = plt.subplots()
+def save_solution(solution, w, n, n_ins, rotation, elapsed_time):
 
-    for i in range(n):
-        ax.plot()
-        ax.add_patch(Rectangle((x_sol[i], y_sol[i]), r[i], d[i] ,color=colors[i], alpha=0.5))
-
-    if rotation:
-        plt.savefig('../plots/plots_rotations/ins-' + str(n_ins) + '-plot.png')
-    else:
-        plt.savefig('../plots/plots_no_rotations/ins-' + str(n_ins) + '-plot.png')
+    # Output file and plot of a placement, also used for the optimal results answered by the cache (see vlsi.cache)
+    out_dir = os.path.join(SRC_DIR, "../out/out_rotations/" if rotation else "../out/out_no_rotations")
+    out_file = os.path.join(out_dir, "ins-" + str(n_ins) + '-out.txt')
+    writer.save_output(write_output, w, n, solution['dx'], solution['dy'], solution['x'], solution['y'], solution['height'], out_file, elapsed_time, rotation, solution.get('rotations'))
+    plot(solution['x'], solution['y'], solution['dy'], solution['dx'], w, n_ins, rotation)
 
 
 #============================================== Solving instances method ========================================================
 
 
-def solve_instance(w, r, d, n, n_ins, rotation):
+def get_solver(name):
 
-    if rotation:
+    # Any solver known to the MiniZinc installation: chuffed, gecode, cp-sat, ...
+    if name not in _solvers:
+        _solvers[name] = Solver.lookup(name)
+    return _solvers[name]
 
-        # Loading the rotation model
-        model = Model("./CP_rotations.mzn")
-
-        # Setting the solver
-        solver = Solver.lookup("chuffed")
-
-        # Loading data into the model
-        instance = Instance(solver, model)
-        instance["w"] = w
-        instance["n"] = n
-        instance["r"] = r
-        instance["d"] = d
-
-        # Running the model
-        start_time = timer()
-        mznout = instance.solve(timeout=timedelta(seconds=301), free_search=True)
-        solve_time = timer() - start_time
-
-        # Solution
-        x_sol = mznout.solution.x
-        y_sol = mznout.solution.y
-        x_dim = mznout.solution.x_dim
-        y_dim = mznout.solution.y_dim
-        height_sol = mznout.solution.height
-        rot_sol = mznout.solution.rotation
-
-        # Writing solution
-        out_dir = "../out/out_rotations/"
-        instance_name = "ins-" + str(n_ins)
-        out_file = os.path.join(out_dir, instance_name + '-out.txt')
-        write_output(w, n, x_dim, y_dim, x_sol, y_sol, height_sol, out_file, solve_time, rotation, rot_sol)
-        
-        # Plotting the solution
-        plot(x_sol, y_sol, y_dim, x_dim, w, n_ins, rotation)
 
+def warm_start_annotation(rotation):
+
+    # Starting point for the solvers supporting warm starts, given as data in the start_* arrays
+    names = ["x", "y", "rotation"] if rotation else ["x", "y"]
+    declarations = "".join("array[1..n] of {}: start_{};\n".format("bool" if name == "rotation" else "int", name)
+                           for name in names)
+    annotation = "warm_start_array([" + ", ".join("warm_start({0}, start_{0})".format(name) for name in names) + "])"
+    return declarations, annotation
+
+
+def restart_annotation(restart):
+    if restart == 'luby':
+        return "restart_luby({})".format(RESTART_SCALE)
+    return "restart_geometric(1.5, {})".format(RESTART_SCALE)
+
+
+def load_model(path, rotation, warm_start=False, search='default', restart='none'):
+
+    # Parsed once per process and strategy. The annotations of the solve item are, in order: the warm start,
+    # the search of the model or the ordered search of the strategy, the restart policy
+    key = (path, warm_start, search, restart)
+    if key not in _models:
+        with open(path, 'r') as f:
+            text = f.read()
+
+        declarations, annotations = "", []
+        if warm_start:
+            start_declarations, annotation = warm_start_annotation(rotation)
+            declarations += start_declarations
+            annotations.append(annotation)
+        if search in ('area', 'height'):
+            declarations += "array[1..n] of 1..n: search_order;\n"
+            annotations.append(ORDERED_SEARCH)
+        else:
+            annotations.append(re.search(r"solve ::(.*?)minimize", text, re.S).group(1).strip())
+        if restart != 'none':
+            annotations.append(restart_annotation(restart))
+
+        solve_item = "solve :: " + " :: ".join(annotations) + "\n    minimize"
+        text = declarations + re.sub(r"solve ::.*?minimize", lambda match: solve_item, text, count=1, flags=re.S)
+
+        model = Model()
+        model.add_string(text)
+        _models[key] = model
+
+    return _models[key]
+
+
+def new_instance(solver, path, rotation, start, search, restart):
+
+    # Branch of an instance analysed once per solver, model and strategy, receiving the data of this instance
+    key = (solver.id, path, start is not None, search, restart)
+    if key not in _base_instances:
+        _base_instances[key] = Instance(solver, load_model(path, rotation, start is not None, search, restart))
+    return _base_instances[key].branch()
+
+
+def instance_data(w, n, r, d, start, rotation, search='default'):
+
+    data = {"w": w, "n": n, "r": r, "d": d}
+    if start is not None:
+        data["start_x"] = [int(v) for v in start['x']]
+        data["start_y"] = [int(v) for v in start['y']]
+        if rotation:
+            data["start_rotation"] = [bool(v) for v in start['rotations']]
+
+    # Circuits branched on first: the largest ones, by area or by height
+    if search == 'area':
+        data["search_order"] = [i+1 for i in sorted(range(n), key=lambda i: -r[i]*d[i])]
+    elif search == 'height':
+        data["search_order"] = [i+1 for i in sorted(range(n), key=lambda i: -(max(r[i], d[i]) if rotation else d[i]))]
+    return data
+
+
+def preprocessing_constraints(pre, rotation):
+
+    # Constraints derived from the instance data, in MiniZinc syntax (1-based indices)
+    dy = "dy" if rotation else "d"
+    constraints = []
+
+    for i, j in pre['vertical_pairs']:
+        constraints.append("constraint y[{0}] + {2}[{0}] <= y[{1}] \\/ y[{1}] + {2}[{1}] <= y[{0}];".format(i+1, j+1, dy))
+
+    for i, value in pre['fixed_rotation'].items():
+        constraints.append("constraint rotation[{}] = {};".format(i+1, str(value).lower()))
+
+    for a, b in pre['ordered_pairs']:
+        constraints.append("constraint y[{}] <= y[{}];".format(a+1, b+1))
+
+    return "\n".join(constraints)
+
+
+
+def solver_options(solver, threads, seed, search='default'):
+
+    # Standard flags, only given to the solvers supporting them (chuffed is sequential). The ordered searches
+    # are followed strictly, the search of the model leaves the solver free
+    options = {'free_search': '-f' in solver.stdFlags and search in ('default', 'lns', 'probe')}
+    if threads is not None and '-p' in solver.stdFlags:
+        options['processes'] = threads
+    if seed is not None and '-r' in solver.stdFlags:
+        options['random_seed'] = seed
+    return options
+
+
+def solution_placement(solution, rotation, r, d):
+
+    # Placement of a solution: only the rotation model has the dx, dy and rotation variables
+    placement = {'height': solution.height, 'x': solution.x, 'y': solution.y}
+    if rotation:
+        placement.update(dx=solution.dx, dy=solution.dy, rotations=solution.rotation)
     else:
+        placement.update(dx=list(r), dy=list(d), rotations=None)
+    return placement
+
+
+def emit_solution(stream, solution, rotation, r, d):
+    placement = solution_placement(solution, rotation, r, d)
+    return stream.emit(placement['height'], placement['x'], placement['y'], placement['dx'], placement['dy'],
+                       placement['rotations'])
+
+
+def record_statistics(statistics):
+    # Sizes of the flattened model apart from the search statistics of the solver (nodes, failures, ...)
+    statistics = {k: v.total_seconds() if isinstance(v, timedelta) else v for k, v in statistics.items()}
+    model = {k: v for k, v in statistics.items() if k.startswith('flat') and k != 'flatTime'}
+    profiling.record(model=model, solver={k: v for k, v in statistics.items() if k not in model})
+
+
+def parse_statistic(line):
+    # '%%%mzn-stat: nodes=42' printed by the solvers with --statistics
+    key, _, value = line[len("%%%mzn-stat:"):].strip().partition("=")
+    for kind in (int, float):
+        try:
+            return key, kind(value)
+        except ValueError:
+            pass
+    return key, value.strip('"')
+
+
+def stream_solutions(instance, stream, rotation, r, d, time_limit, options):
+
+    # Intermediate solutions of the solver, each improving one is streamed as an incumbent
+    async def collect():
+        solution, status, statistics = None, Status.UNKNOWN, {}
+        results = instance.solutions(time_limit=timedelta(seconds=time_limit+1), intermediate_solutions=True, **options)
+        try:
+            async for result in results:
+                status = result.status
+                # Every result only carries the statistics printed since the previous one
+                statistics.update(result.statistics)
+                if result.solution is None:
+                    continue
+                solution = result.solution
+                if emit_solution(stream, solution, rotation, r, d):
+                    break
+        finally:
+            await results.aclose()
+        record_statistics(statistics)
+        return solution, status
+
+    return asyncio.run(collect())
+
+
+#============================================== FlatZinc reuse ========================================================
+
+
+def flatzinc_files(instance, solver, path, data, constraints, search, restart):
+
+    # FlatZinc of the instance for the library of the solver, compiled once and reused by every later trial
+    with open(path, 'r') as f:
+        # The output mode is part of the key, the output models compiled without it don't print JSON
+        content = [f.read(), data, constraints, solver.id, solver.version, search, restart, 'json']
+    key = hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()
+    fzn_file = os.path.join(FLATZINC_DIR, key + '.fzn')
+    ozn_file = os.path.join(FLATZINC_DIR, key + '.ozn')
+
+    if not (os.path.exists(fzn_file) and os.path.exists(ozn_file)):
+        os.makedirs(FLATZINC_DIR, exist_ok=True)
+        suffix = '.{}.tmp'.format(os.getpid())
+        # The output model prints the solutions as JSON, as read back by stream_flatzinc
+        with instance.flat(**{'output-mode': 'json'}) as (fzn, ozn, statistics):
+            shutil.copyfile(fzn.name, fzn_file + suffix)
+            shutil.copyfile(ozn.name, ozn_file + suffix)
+        os.replace(ozn_file + suffix, ozn_file)
+        os.replace(fzn_file + suffix, fzn_file)
+
+    return fzn_file, ozn_file
+
+
+def stream_flatzinc(fzn_file, ozn_file, solver, stream, rotation, r, d, time_limit, options):
+
+    # The solver runs on the stored FlatZinc, its solutions are printed as JSON through the output model
+    cmd = [str(minizinc.default_driver.executable), "--solver", solver.id, "--ozn-file", ozn_file,
+           "--output-mode", "json", "--intermediate-solutions", "--statistics", "--time-limit",
+           str(int((time_limit+1)*1000))]
+    if options['free_search']:
+        cmd.append("--free-search")
+    if 'processes' in options:
+        cmd.extend(["--parallel", str(options['processes'])])
+    if 'random_seed' in options:
+        cmd.extend(["--random-seed", str(options['random_seed'])])
+    cmd.append(fzn_file)
+
+    solution, status, statistics = None, Status.UNKNOWN, {}
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    lines = []
+    try:
+        for line in process.stdout:
+            line = line.strip()
+            if line == "----------":
+                solution = SimpleNamespace(**json.loads("\n".join(lines)))
+                status = Status.SATISFIED
+                lines = []
+                if emit_solution(stream, solution, rotation, r, d):
+                    break
+            elif line == "==========":
+                status = Status.OPTIMAL_SOLUTION
+            elif line == "=====UNSATISFIABLE=====":
+                status = Status.UNSATISFIABLE
+            elif line.startswith("%%%mzn-stat:"):
+                key, value = parse_statistic(line)
+                statistics[key] = value
+            elif line and not line.startswith(("%", "=====")):
+                lines.append(line)
+    finally:
+        process.terminate()
+        process.wait()
+
+    record_statistics(statistics)
+    return solution, status
+
+
+def solve_model(solver, path, rotation, r, d, data, constraints, start, stream, time_limit, options, flatzinc=False,
+                search='default', restart='none'):
+
+    # Loading data into the model
+    with new_instance(solver, path, rotation, start, search, restart) as instance:
+        for name, value in data.items():
+            instance[name] = value
+        instance.add_string("\n".join(constraints))
+        profiling.lap('build')
+
+        if flatzinc:
+            fzn_file, ozn_file = flatzinc_files(instance, solver, path, data, constraints, search, restart)
+            solution, status = stream_flatzinc(fzn_file, ozn_file, solver, stream, rotation, r, d, time_limit, options)
+        else:
+            solution, status = stream_solutions(instance, stream, rotation, r, d, time_limit, options)
+        profiling.lap('solve')
+        return solution, status
+
+
+#============================================== Large neighbourhood search ========================================================
+
+
+def lns_search(solver, path, rotation, w, n, r, d, constraints, start, h_lb, bound, stream, time_limit, options, seed,
+               restart):
+
+    # The positions of a random subset of circuits are relaxed around the incumbent, the other circuits stay in
+    # place, and every neighbourhood must lower the height. The neighbourhoods are solved by the model itself
+    rng = random.Random(seed)
+    end = timer() + time_limit
+    status = Status.UNKNOWN
+
+    if start is not None:
+        solution = SimpleNamespace(height=start['height'], x=start['x'], y=start['y'], dx=start['dx'], dy=start['dy'],
+                                   rotation=start['rotations'])
+    else:
+        # First incumbent from the whole model
+        solution, status = solve_model(solver, path, rotation, r, d, instance_data(w, n, r, d, None, rotation),
+                                       constraints, None, stream, min(LNS_STEP, time_limit), options)
+
+    while solution is not None and status != Status.OPTIMAL_SOLUTION and solution.height > h_lb:
+        remaining = end - timer()
+        if remaining < 1:
+            break
+
+        relaxed = set(rng.sample(range(n), math.ceil(LNS_RELAX * n)))
+        # Below the incumbent, and not above the height reached meanwhile by another engine of the portfolio
+        target = solution.height - 1
+        if bound is not None and bound.value > 0:
+            target = min(target, bound.value)
+        fixed = ["constraint height <= {};".format(target)]
+        for i in range(n):
+            if i not in relaxed:
+                fixed.append("constraint x[{0}] = {1} /\\ y[{0}] = {2};".format(i+1, solution.x[i], solution.y[i]))
+                if rotation:
+                    fixed.append("constraint rotation[{}] = {};".format(i+1, str(bool(solution.rotation[i])).lower()))
+
+        incumbent = solution_placement(solution, rotation, r, d)
+        neighbour, _ = solve_model(solver, path, rotation, r, d, instance_data(w, n, r, d, incumbent, rotation),
+                                   constraints + fixed, incumbent, stream, min(LNS_STEP, remaining), options,
+                                   restart=restart)
+        if neighbour is not None:
+            solution = neighbour
+
+    # Optimality is only known from the lower bound, or from a complete first solve
+    if solution is not None and status != Status.OPTIMAL_SOLUTION:
+        status = Status.OPTIMAL_SOLUTION if solution.height <= h_lb else Status.SATISFIED
+    return solution, status
+
+
+#============================================== Parallel height probing ========================================================
+
+
+def probe_heights(lower, upper, running, slots):
+
+    # Heights of the open interval [lower, upper) not being probed yet, spread over it. The lowest one comes first,
+    # since a feasible probe there proves optimality
+    candidates = [h for h in range(lower, upper) if h not in running]
+    return [candidates[(i * len(candidates)) // slots] for i in range(min(slots, len(candidates)))]
+
+
+def probe_search(solver, path, rotation, w, n, r, d, constraints, start, h_lb, h_max, bound, stream, time_limit,
+                 options, probes, restart):
+
+    # The optimization is split into decision problems 'height <= h' on several heights at once, each solved by its
+    # own MiniZinc process. A feasible probe lowers the upper end of the interval to the height it found, an
+    # infeasible one proves every height up to h infeasible and raises its lower end, and the probes left outside of
+    # the interval are cancelled. h_max is the upper bound of solve_instance (the greedy packing, the warm start or the
+    # height domain of the models)
+    end = timer() + time_limit
+    data = instance_data(w, n, r, d, start, rotation)
+
+    best = None
+    if start is not None:
+        best = SimpleNamespace(height=start['height'], x=start['x'], y=start['y'], dx=start['dx'], dy=start['dy'],
+                               rotation=start['rotations'])
+    state = {'lower': h_lb, 'upper': h_max + 1 if best is None else best.height, 'best': best, 'stop': False}
+    counts = {'probes': 0, 'cancelled_probes': 0, 'unknown_probes': 0}
+
+    async def probe(height):
+        with new_instance(solver, path, rotation, start, 'probe', restart) as instance:
+            for name, value in data.items():
+                instance[name] = value
+            instance.add_string("\n".join(constraints + ["constraint height <= {};".format(height)]))
+
+            # The first solution decides the probe, its process is stopped right away
+            solution, status, statistics = None, Status.UNKNOWN, {}
+            results = instance.solutions(time_limit=timedelta(seconds=max(1, end - timer())),
+                                         intermediate_solutions=True, **options)
+            try:
+                async for result in results:
+                    status = result.status
+                    statistics.update(result.statistics)
+                    if result.solution is not None:
+                        solution = result.solution
+                        break
+            finally:
+                await results.aclose()
+            record_statistics(statistics)
+            return solution, status
+
+    async def search():
+        running, cancelled = {}, []
+        try:
+            while state['lower'] < state['upper'] and not state['stop'] and timer() < end:
+
+                # A height reached by another engine of the portfolio: only the heights up to it are left to probe
+                if bound is not None and 0 < bound.value < state['upper'] - 1:
+                    state['upper'] = bound.value + 1
+
+                for height in probe_heights(state['lower'], state['upper'], set(running.values()),
+                                            probes - len(running)):
+                    running[asyncio.ensure_future(probe(height))] = height
+                    counts['probes'] += 1
+                if not running:
+                    break
+
+                done, _ = await asyncio.wait(running, timeout=end - timer(), return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                for task in done:
+                    height = running.pop(task)
+                    solution, status = task.result()
+                    if solution is not None and solution.height < state['upper']:
+                        state['upper'], state['best'] = solution.height, solution
+                        state['stop'] = state['stop'] or bool(emit_solution(stream, solution, rotation, r, d))
+                    elif solution is None and status == Status.UNSATISFIABLE:
+                        state['lower'] = max(state['lower'], height + 1)
+                    elif solution is None:
+                        # Stopped before deciding: the height stays open and is probed again while time remains
+                        counts['unknown_probes'] += 1
+
+                # Probes outside of the interval can't tell anything anymore
+                for task, height in list(running.items()):
+                    if height < state['lower'] or height >= state['upper']:
+                        task.cancel()
+                        del running[task]
+                        cancelled.append(task)
+                        counts['cancelled_probes'] += 1
+        finally:
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, *cancelled, return_exceptions=True)
+
+    asyncio.run(search())
+    profiling.record(solver=counts)
+
+    # Optimal only when every height below the incumbent was proven infeasible, undecided probes prove nothing
+    best = state['best']
+    if best is None:
+        return None, Status.UNSATISFIABLE if state['lower'] > h_max else Status.UNKNOWN
+    return best, Status.OPTIMAL_SOLUTION if state['lower'] >= best.height else Status.SATISFIED
+
+
+def run_search(solver, path, rotation, w, n, r, d, data, constraints, start, h_lb, h_max, bound, stream, time_limit,
+               options, seed, flatzinc, search, restart, probes):
+
+    # The whole model, a large neighbourhood search or parallel height probes, as chosen by the search strategy
+    if search == 'lns':
+        return lns_search(solver, path, rotation, w, n, r, d, constraints, start, h_lb, bound, stream, time_limit,
+                          options, seed, restart)
+    if search == 'probe':
+        profiling.lap('build')
+        solution, status = probe_search(solver, path, rotation, w, n, r, d, constraints, start, h_lb, h_max, bound,
+                                        stream, time_limit, options, probes or os.cpu_count(), restart)
+        profiling.lap('solve')
+        return solution, status
+    return solve_model(solver, path, rotation, r, d, data, constraints, start, stream, time_limit, options, flatzinc,
+                       search, restart)
+
+
+def model_height_bound(w, r, d, n):
+
+    # Upper end of the height domain of the models
+    levels = ((sum(r) // w) + 1)*2
+    d_sort = sorted(d)
+    return sum([d_sort[n-1-i] for i in range(min(levels,n))])
+
+
+def solved_by_bounds(start, w, n, n_ins, rotation, output, elapsed_time, strategy):
+
+    # The greedy packing reaches the lower bound: it is optimal and no solver is needed
+    if output:
+        save_solution(start, w, n, n_ins, rotation, elapsed_time)
+
+    return dict(start, optimal=True, time=elapsed_time, build_time=elapsed_time, first_solution_time=elapsed_time,
+                incumbents=[(elapsed_time, start['height'])], strategy=strategy)
+
+
+@profiling.instrument('CP')
+def solve_instance(w, r, d, n, n_ins, rotation, time_limit=300, bound=None, output=True, warm_start=True, seed=None,
+                   on_solution=None, solver="chuffed", threads=None, flatzinc=False, search='default', restart='none',
+                   probes=None):
+
+    call_time = timer()
+    if search not in SEARCHES or restart not in RESTARTS:
+        raise ValueError("Unknown search strategy '{}' with restarts '{}'".format(search, restart))
+    strategy = search if restart == 'none' else search + '+' + restart
+    stream = IncumbentStream(on_solution, start_time=call_time, bound=bound)
+    pre = preprocess(w, r, d, rotation)
+    h_lb = lower_bound(w, r, d, rotation)
+
+    # Greedy packing used as warm start and as upper bound on the height
+    start = heuristics.initial_packing(w, r, d, rotation, pre, warm_start)
+    profiling.lap('preprocess')
+    if start is not None:
+        stream.emit(start['height'], start['x'], start['y'], start['dx'], start['dy'], start['rotations'])
+    if start is not None and start['height'] <= h_lb:
+        return solved_by_bounds(start, w, n, n_ins, rotation, output, timer() - call_time, strategy)
+    solver = get_solver(solver)
+    options = solver_options(solver, threads, seed, search)
+
+    # Loading the model of the rotation mode, parsed once per process
+    path = os.path.join(SRC_DIR, "CP_rotations.mzn" if rotation else "CP_no_rotations.mzn")
+    data = instance_data(w, n, r, d, start, rotation, search)
+    constraints = [preprocessing_constraints(pre, rotation), "constraint height >= {};".format(h_lb)]
+
+    # Upper bound on the height, of the probed heights in particular: the greedy packing or warm start, else the
+    # height domain of the models
+    if start is not None:
+        h_max = start['height']
+        constraints.append("constraint height <= {};".format(h_max))
+    else:
+        h_max = model_height_bound(w, r, d, n)
+
+    # Height already reached by another engine (shared portfolio bound)
+    if bound is not None and bound.value > 0:
+        constraints.append("constraint height <= {};".format(bound.value))
+
+    # Running the model, streaming the intermediate solutions
+    start_time = timer()
+    build_time = start_time - call_time
+    solution, status = run_search(solver, path, rotation, w, n, r, d, data, constraints, start, h_lb, h_max, bound,
+                                  stream, time_limit, options, seed, flatzinc, search, restart, probes)
+    solve_time = timer() - start_time
+
+    if solution is None:
+        return {'height': None, 'optimal': False, 'time': solve_time, 'build_time': build_time,
+                'first_solution_time': None, 'incumbents': stream.timeline, 'strategy': strategy}
+
+    # Solution
+    placement = solution_placement(solution, rotation, r, d)
+    profiling.lap('extract')
+
+    # Writing solution and plotting it
+    if output:
+        save_solution(placement, w, n, n_ins, rotation, solve_time)
+
+    return dict(placement, optimal=status == Status.OPTIMAL_SOLUTION, time=solve_time, build_time=build_time,
+                first_solution_time=stream.first_time, incumbents=stream.timeline, strategy=strategy)
 
-        # Loading the no-rotation model
-        model = Model("./CP_no_rotations.mzn")
-
-        # Setting the solver
-        solver = Solver.lookup("chuffed")
-
-        # Loading data into the model
-        instance = Instance(solver, model)
-        instance["w"] = w
-        instance["n"] = n
-        instance["r"] = r
-        instance["d"] = d
-
-        # Running the model
-        start_time = timer()
-        mznout = instance.solve(timeout=timedelta(seconds=301), free_search = True)
-        solve_time = timer() - start_time
-
-        # Solution
-        x_sol = mznout.solution.x
-        y_sol = mznout.solution.y
-        height_sol = mznout.solution.height
-
-        # Writing solution
-        out_dir = "../out/out_no_rotations"
-        instance_name = "ins-" + str(n_ins)
-        out_file = os.path.join(out_dir, instance_name + '-out.txt')
-        write_output(w, n, r, d, x_sol, y_sol, height_sol, out_file, solve_time, rotation)
-        
-        # Plotting the solution
-        plot(x_sol, y_sol, d, r, w, n_ins, rotation)
 
 #=================================================== Running CP models ===================================================
 
 
-for n_ins in range(1,41):
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--no-cache', action='store_true', help='solve every instance again instead of using the result cache')
+    args = parser.parse_args()
+
+    # Journal of the sweep (VLSI_JOURNAL), which makes it resumable, see vlsi.journal
+    journal = os.environ.get('VLSI_JOURNAL')
+
+    for n_ins in range(1,41):
+
+        w, r, d, n = get_instance(os.path.join(SRC_DIR, '../instances'), 'ins-' + str(n_ins))
 
-    f = open('../instances/ins-' + str(n_ins) + ".dzn", "r")
-    lines = f.readlines()
-    w = int(re.findall(r'\d+', lines[0])[0])
-    r = load_data(lines[6])
-    d = load_data(lines[4])
-    n = len(d)
+        print("Solving instance "+str(n_ins))
 
-    print("Solving instance "+str(n_ins))
+        # Launch no-rotation model
+        journaled_solve(journal, 'CP', solve_instance, w, r, d, n, n_ins, rotation=False, cache=not args.no_cache)
 
-    # Launch no-rotation model
-    solve_instance(w, r, d, n, n_ins, rotation=False)
+        # Launch rotation model
+        journaled_solve(journal, 'CP', solve_instance, w, r, d, n, n_ins, rotation=True, cache=not args.no_cache)
 
-    # Launch rotation model
-    solve_instance(w, r, d, n, n_ins, rotation=True)
\ No newline at end of file
+    # Plots spooled during the sweep (VLSI_PLOTS=batch) are rendered all together
+    if writer.plot_mode() == 'batch':
+        writer.render_pending()
@@ -1,43 +1,39 @@
 import gurobipy as gp
 from gurobipy import GRB
-from matplotlib.patches import Rectangle
-from matplotlib.pyplot import figure
-from random import randint
+import argparse
 import os
 from timeit import default_timer as timer
-import matplotlib.pyplot as plt
-import matplotlib.patches as ptc
-import re
+import math
+import numpy as np
 
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
 
+from vlsi.journal import journaled_solve
+from vlsi.instances import get_instance
+from vlsi.preprocessing import preprocess
+from vlsi import writer
+from vlsi import heuristics
+from vlsi import profiling
+from vlsi.bounds import lower_bound
+from vlsi.incumbents import IncumbentStream
 
-#================================================== Input-Output methods =================================================================
-
-def load_data(line):
-    line = line.split('[')[1]
-    line = line.split(']')[0]
-    line = line.split(',')
-    return [int(n) for n in line]
 
+#================================================== Input-Output methods =================================================================
 
 def plot(x_sol, y_sol, d, r, w, n_ins, rotation):
 
-    n = len(x_sol)
-    colors = []
+    # Rendered off the solving path, see vlsi.writer
+    plots_dir = '../plots/plots_rotations/' if rotation else '../plots/plots_no_rotations/'
+    writer.save_plot(x_sol, y_sol, r, d, os.path.join(SRC_DIR, plots_dir + 'ins-' + str(n_ins) + '-plot.png'))
 
-    for i in range(n):
-        colors.append('#%06X' % randint(0, 0xFFFFFF))
 
-    fig, ax = plt.subplots()
+def save_solution(solution, w, n, n_ins, rotation, elapsed_time):
 
-    for i in range(n):
-        ax.plot()
-        ax.add_patch(Rectangle((x_sol[i], y_sol[i]), r[i], d[i] ,color=colors[i], alpha=0.5))
-
-    if rotation:
-        plt.savefig('../plots/plots_rotations/ins-' + str(n_ins) + '-plot.png')
-    else:
-        plt.savefig('../plots/plots_no_rotations/ins-' + str(n_ins) + '-plot.png')
+    # Output file and plot of a placement, also used for the optimal results answered by the cache (see vlsi.cache)
+    out_dir = os.path.join(SRC_DIR, "../out/output_rotations/" if rotation else "../out/output_no_rotations/")
+    out_file = os.path.join(out_dir, "ins-" + str(n_ins) + '-out.txt')
+    writer.save_output(write_output, w, n, solution['dx'], solution['dy'], solution['x'], solution['y'], solution['height'], out_file, elapsed_time, rotation, solution.get('rotations'))
+    plot(solution['x'], solution['y'], solution['dy'], solution['dx'], w, n_ins, rotation)
 
 
 def write_output(width, n_circuits, dx, dy, x_sol, y_sol, height, output_file, elapsed_time, rotation, rotations=None):
@@ -67,161 +63,309 @@ def write_output(width, n_circuits, dx, dy, x_sol, y_sol, height, output_file, e
 #============================================== Solving instances method ========================================================
 
 
-def solve_instance(w, r, d, n, n_ins, rotation):
+def separation(start, I, J):
+
+    # Binaries of the four no-overlap disjuncts for the pairs (I,J) in the starting packing: the first satisfied one is active
+    x, y, dx, dy = (np.asarray(start[key]) for key in ('x', 'y', 'dx', 'dy'))
+    holds = np.stack([x[I]+dx[I] <= x[J], y[I]+dy[I] <= y[J], x[J]+dx[J] <= x[I], y[J]+dy[J] <= y[I]], axis=1)
+    z = np.ones(holds.shape)
+    z[np.arange(len(I)), holds.argmax(axis=1)] = 0
+    return z
+
+
+def set_start(start, I, J, x, y, z, height, rot=None):
+
+    height.Start = start['height']
+    x.Start = np.asarray(start['x'])
+    y.Start = np.asarray(start['y'])
+    z.Start = separation(start, I, J)
+    if rot is not None:
+        rot.Start = np.asarray(start['rotations'], dtype=float)
+
+
+
+def share_bound(model, where, rejected=False):
+
+    # Publishing every new incumbent height to the other engines of the portfolio
+    if where == GRB.Callback.MIPSOL and not rejected:
+        height = round(model.cbGet(GRB.Callback.MIPSOL_OBJ))
+        with model._bound.get_lock():
+            if model._bound.value == 0 or height < model._bound.value:
+                model._bound.value = height
+
+    # Stopping as soon as no solution better than the shared one can exist
+    elif where == GRB.Callback.MIP:
+        best_bound = model.cbGet(GRB.Callback.MIP_OBJBND)
+        if model._bound.value > 0 and math.ceil(best_bound - 1e-6) >= model._bound.value:
+            model.terminate()
+
+
+
+def separate_overlaps(model, where):
+
+    # Lazy mode: the no-overlap constraints of the pairs overlapping in a new incumbent are added as lazy constraints
+    if where != GRB.Callback.MIPSOL:
+        return False
+
+    lazy = model._lazy
+    n = len(lazy['x'])
+    values = np.rint(model.cbGetSolution(lazy['x'] + lazy['y'] + lazy['rot']))
+    x, y = values[:n], values[n:2*n]
+    rotated = values[2*n:] == 1 if lazy['rot'] else np.zeros(n, dtype=bool)
+    dx = np.where(rotated, lazy['d'], lazy['r'])
+    dy = np.where(rotated, lazy['r'], lazy['d'])
+
+    I, J = lazy['I'], lazy['J']
+    # Pairs already cut off can come back in a new incumbent, so every overlapping pair is cut again
+    overlapping = (x[I] < x[J]+dx[J]) & (x[J] < x[I]+dx[I]) & (y[I] < y[J]+dy[J]) & (y[J] < y[I]+dy[I])
+
+    for k in np.flatnonzero(overlapping).tolist():
+        i, j = int(I[k]), int(J[k])
+        xs, ys, z = lazy['x'], lazy['y'], lazy['z'][k]
+        size_x, size_y = lazy['size_x'], lazy['size_y']
+        if lazy['side_by_side'][k]:
+            model.cbLazy(xs[i] + size_x(i) <= xs[j] + lazy['w']*z[0])
+            model.cbLazy(xs[j] + size_x(j) <= xs[i] + lazy['w']*z[2])
+        model.cbLazy(ys[i] + size_y(i) <= ys[j] + lazy['h_max']*z[1])
+        model.cbLazy(ys[j] + size_y(j) <= ys[i] + lazy['h_max']*z[3])
+        model.cbLazy(z[0] + z[1] + z[2] + z[3] <= 3)
+
+    return bool(overlapping.any())
+
+
+def callback(model, where):
+
+    # A rejected incumbent overlaps, so it is not published to the other engines
+    rejected = separate_overlaps(model, where) if model._lazy is not None else False
+
+    # Streaming every accepted incumbent, the stream may end the solve early
+    if where == GRB.Callback.MIPSOL and not rejected:
+        stream, n, r, d = model._stream, model._n, model._r, model._d
+        values = np.rint(model.cbGetSolution(model._solution)).astype(np.int64)
+        x_sol, y_sol = values[:n], values[n:2*n]
+        if len(values) > 2*n:
+            rot_sol = values[2*n:] == 1
+            dx_sol, dy_sol = np.where(rot_sol, d, r), np.where(rot_sol, r, d)
+        else:
+            rot_sol, dx_sol, dy_sol = None, r, d
+        # The height of the placement itself, the height variable may be looser in heuristic solutions
+        if stream.emit((y_sol + dy_sol).max(), x_sol, y_sol, dx_sol, dy_sol, rot_sol):
+            model.terminate()
+
+    if model._bound is not None:
+        share_bound(model, where, rejected)
+
+
+
+def lower_bound_of(m, h_lb):
+
+    # ObjBound is infinite when the solve is stopped before the root relaxation
+    return max(h_lb, math.ceil(m.ObjBound - 1e-6)) if math.isfinite(m.ObjBound) else h_lb
+
+
+def solved_by_bounds(start, w, n, n_ins, rotation, output, elapsed_time):
+
+    # The greedy packing reaches the lower bound: it is optimal and no solver is needed
+    if output:
+        save_solution(start, w, n, n_ins, rotation, elapsed_time)
+
+    return dict(start, optimal=True, lower_bound=start['height'], time=elapsed_time, build_time=elapsed_time,
+                first_solution_time=elapsed_time, incumbents=[(elapsed_time, start['height'])])
+
+
+@profiling.instrument('MIP')
+def solve_instance(w, r, d, n, n_ins, rotation, time_limit=300, threads=None, bound=None, output=True, warm_start=True,
+                   write_lp=False, lazy=False, seed=None, on_solution=None):
+
+    call_time = timer()
+    stream = IncumbentStream(on_solution, start_time=call_time)
 
     # Parameters
     levels = ((sum(r) // w) + 1)*2 
     d_sort = sorted(d)
     h_max = sum([d_sort[n-1-i] for i in range(min(levels,n))]) 
     area_min = sum(d[i]*r[i] for i in range(n))
-    area_max = h_max * w
-    M = h_max
-
-    if rotation:
 
-        # Creating the MIP model
-        m = gp.Model("MIP_rotation")
-        m.setParam("TimeLimit", 5*60)
-
-        # Variables
-        x = m.addVars(n, ub=w, vtype=GRB.INTEGER, name="x")
-        y = m.addVars(n, ub=h_max, vtype=GRB.INTEGER, name="y")
-        z = m.addVars(n, n, 4, vtype=GRB.BINARY, name="z")
-        height = m.addVar(vtype=GRB.INTEGER, name="height")
-        dx = m.addVars(n, vtype=GRB.INTEGER, name="dx")
-        dy = m.addVars(n, vtype=GRB.INTEGER, name="dy")
-        rot = m.addVars(n, vtype=GRB.BINARY, name="rot")
-
-        # Constraints        
-        m.addConstrs(((x[i]+dx[i] <= w) for i in range(n)), "bound_x")
-        m.addConstrs(((y[i]+dy[i] <= height) for i in range(n)), "bound_y")
-
-        m.addConstrs(((x[i]+dx[i] <= x[j] + M*z[i,j,0]) for i in range(n) for j in range(i+1,n)), "or1")
-        m.addConstrs(((y[i]+dy[i] <= y[j] + M*z[i,j,1]) for i in range(n) for j in range(i+1,n)), "or2")
-        m.addConstrs(((x[j]+dx[j] <= x[i] + M*z[i,j,2]) for i in range(n) for j in range(i+1,n)), "or3")
-        m.addConstrs(((y[j]+dy[j] <= y[i] + M*z[i,j,3]) for i in range(n) for j in range(i+1,n)), "or4")
-        m.addConstrs((gp.quicksum(z[i,j,k] for k in range(4))<=3 for i in range(n) for j in range(n)), "no_overlap")
-
-        area = height * w
-        m.addConstr(area >= area_min, "area_lb")
-        m.addConstr(area <= area_max, "area_ub")
-
-        m.addConstrs(((dy[i] == rot[i]*r[i] + (1-rot[i])*d[i]) for i in range(n)), "rot_y")
-        m.addConstrs(((dx[i] == rot[i]*d[i] + (1-rot[i])*r[i]) for i in range(n)), "rot_x")
-
-        # Objective function
-        m.setObjective(height, GRB.MINIMIZE)
-
-        # Solver
-        start_time = timer()
-        m.optimize()
-        solve_time = timer() - start_time
-
-        m.write('MIP_rotation.lp')
-
-        # Solution
-        print('')
-        print('Solution:')
-        print('')
-
-        x_sol = []
-        y_sol = []
-        rot_sol = []
-        dx_sol = []
-        dy_sol = []
-
-        for i in range(n):
-            x_sol.append(int(m.getVarByName(f"x[{i}]").X))
-            y_sol.append(int(m.getVarByName(f"y[{i}]").X))
-            rot_sol.append(int(m.getVarByName(f"rot[{i}]").X))
-            dx_sol.append(int(m.getVarByName(f"dx[{i}]").X))
-            dy_sol.append(int(m.getVarByName(f"dy[{i}]").X))
-
-        height_sol = int(m.ObjVal)
-
-        # Writing solution
-        out_dir = "../out/out_rotations/"
-        instance_name = "ins-" + str(n_ins)
-        out_file = os.path.join(out_dir, instance_name + '-out.txt')
-
-        write_output(w, n, dx_sol, dy_sol, x_sol, y_sol, height_sol, out_file, solve_time, rotation, rot_sol)
-        plot(x_sol, y_sol, dy_sol, dx_sol, w, n_ins, rotation)
-    
-    else:
+    # Pair pruning, forced orientations and identical circuits
+    pre = preprocess(w, r, d, rotation)
+    vertical = set(pre['vertical_pairs'])
 
-        # Creating the MIP model
-        m = gp.Model("MIP_no_rotation")
-        m.setParam("TimeLimit", 5*60) 
+    # Greedy packing used as MIP start and as upper bound on the height
+    start = heuristics.initial_packing(w, r, d, rotation, pre, warm_start)
+    if start is not None:
+        h_max = min(h_max, start['height'])
 
-        # Variables
-        x = m.addVars(n, ub=w, vtype=GRB.INTEGER, name="x")
-        y = m.addVars(n, ub=h_max, vtype=GRB.INTEGER, name="y")
-        z = m.addVars(n, n, 4, vtype=GRB.BINARY, name="z")
-        height = m.addVar(vtype=GRB.INTEGER, name="height")
-
-        
-        # Constraints
-        m.addConstrs(((x[i]+r[i] <= w) for i in range(n)), "bound_x")
-        m.addConstrs(((y[i]+d[i] <= height) for i in range(n)), "bound_y")
+    h_lb = lower_bound(w, r, d, rotation)
+    profiling.lap('preprocess')
+    if start is not None:
+        stream.emit(start['height'], start['x'], start['y'], start['dx'], start['dy'], start['rotations'])
+    if start is not None and start['height'] <= h_lb:
+        return solved_by_bounds(start, w, n, n_ins, rotation, output, timer() - call_time)
 
-        m.addConstrs(((x[i]+r[i] <= x[j] + M*z[i,j,0]) for i in range(n) for j in range(i+1,n)), "or1")
-        m.addConstrs(((y[i]+d[i] <= y[j] + M*z[i,j,1]) for i in range(n) for j in range(i+1,n)), "or2")
-        m.addConstrs(((x[j]+r[j] <= x[i] + M*z[i,j,2]) for i in range(n) for j in range(i+1,n)), "or3")
-        m.addConstrs(((y[j]+d[j] <= y[i] + M*z[i,j,3]) for i in range(n) for j in range(i+1,n)), "or4")
-        m.addConstrs((gp.quicksum(z[i,j,k] for k in range(4))<=3 for i in range(n) for j in range(n)), "no_overlap")
-
-        area = height * w
-        m.addConstr(area >= area_min, "area_lb")
-        m.addConstr(area <= area_max, "area_ub")
+    area_max = h_max * w
+    r_arr = np.asarray(r)
+    d_arr = np.asarray(d)
+
+    # Pairs i<j as index arrays, the ones that can be side by side and the identical circuits to order
+    I, J = np.triu_indices(n, 1)
+    side_by_side = np.array([(i, j) not in vertical for i, j in zip(I.tolist(), J.tolist())], dtype=bool)
+    A, B = (np.array(idx, dtype=np.int64) for idx in zip(*pre['ordered_pairs'])) if pre['ordered_pairs'] else ([], [])
+
+    # Creating the MIP model
+    m = gp.Model("MIP_rotation" if rotation else "MIP_no_rotation")
+    m.setParam("TimeLimit", time_limit)
+    if threads is not None:
+        m.setParam("Threads", threads)
+    if seed is not None:
+        m.setParam("Seed", seed)
+
+    # Variables: z only for the pairs i<j, the horizontal disjuncts of the vertical pairs are fixed to 1
+    z_lb = np.zeros((len(I), 4))
+    z_lb[~side_by_side, 0] = 1
+    z_lb[~side_by_side, 2] = 1
+
+    x = m.addMVar(n, ub=w, vtype=GRB.INTEGER, name="x")
+    y = m.addMVar(n, ub=h_max, vtype=GRB.INTEGER, name="y")
+    z = m.addMVar((len(I), 4), lb=z_lb, vtype=GRB.BINARY, name="z")
+    height = m.addVar(ub=h_max, vtype=GRB.INTEGER, name="height")
 
-        # Objective function
-        m.setObjective(height, GRB.MINIMIZE)
+    if rotation:
+        # Forced orientations
+        rot_lb = np.zeros(n)
+        rot_ub = np.ones(n)
+        for i, value in pre['fixed_rotation'].items():
+            rot_lb[i] = rot_ub[i] = int(value)
+        rot = m.addMVar(n, lb=rot_lb, ub=rot_ub, vtype=GRB.BINARY, name="rot")
+        dx = r_arr + (d_arr - r_arr) * rot
+        dy = d_arr + (r_arr - d_arr) * rot
+    else:
+        rot = None
+        dx = r_arr
+        dy = d_arr
+
+    # Constraints
+    m.addConstr(x + dx <= w, "bound_x")
+    m.addConstr(y + dy <= height, "bound_y")
+
+    # Big-M per axis: w for the horizontal disjuncts, h_max for the vertical ones
+    if lazy:
+        # Only added, from the callback, for the pairs found overlapping in an incumbent. The z binaries of every pair
+        # are still created up front: a callback can only add constraints on existing variables, not new columns, and
+        # creating them on demand would mean restarting the branch and bound each time. Until its pair is separated a
+        # binary is an empty column, so the saving of the lazy mode is in the 5 rows per pair
+        m.setParam("LazyConstraints", 1)
+        xs, ys, rots = x.tolist(), y.tolist(), rot.tolist() if rotation else []
+        m._lazy = {
+            'w': w, 'h_max': h_max, 'r': r_arr, 'd': d_arr, 'I': I, 'J': J, 'side_by_side': side_by_side,
+            'x': xs, 'y': ys, 'rot': rots, 'z': z.tolist(),
+            'size_x': (lambda i: r[i] + (d[i] - r[i])*rots[i]) if rotation else (lambda i: r[i]),
+            'size_y': (lambda i: d[i] + (r[i] - d[i])*rots[i]) if rotation else (lambda i: d[i]),
+        }
+    else:
+        Ih, Jh = I[side_by_side], J[side_by_side]
+        m.addConstr(x[Ih] + dx[Ih] <= x[Jh] + w*z[side_by_side, 0], "or1")
+        m.addConstr(y[I] + dy[I] <= y[J] + h_max*z[:, 1], "or2")
+        m.addConstr(x[Jh] + dx[Jh] <= x[Ih] + w*z[side_by_side, 2], "or3")
+        m.addConstr(y[J] + dy[J] <= y[I] + h_max*z[:, 3], "or4")
+        m.addConstr(z.sum(axis=1) <= 3, "no_overlap")
+        m._lazy = None
+
+    # Identical circuits ordered by y
+    if len(A) > 0:
+        m.addConstr(y[A] <= y[B], "identical")
+
+    area = height * w
+    m.addConstr(area >= area_min, "area_lb")
+    m.addConstr(height >= h_lb, "height_lb")
+    m.addConstr(area <= area_max, "area_ub")
+
+    if start is not None:
+        set_start(start, I, J, x, y, z, height, rot)
+
+    # Objective function
+    m.setObjective(height, GRB.MINIMIZE)
+
+    # Height already reached by another engine (shared portfolio bound)
+    if bound is not None and bound.value > 0:
+        m.addConstr(height <= bound.value, "shared_bound")
+    m._bound = bound
+    m._stream = stream
+    m._n, m._r, m._d = n, r_arr, d_arr
+    m._solution = x.tolist() + y.tolist() + (rot.tolist() if rotation else [])
+
+    # Solver
+    start_time = timer()
+    build_time = start_time - call_time
+    profiling.lap('build')
+    m.optimize(callback)
+    solve_time = timer() - start_time
+    profiling.lap('solve')
+    profiling.record(model={'variables': m.NumVars, 'integer_variables': m.NumIntVars, 'binary_variables': m.NumBinVars,
+                            'constraints': m.NumConstrs, 'nonzeros': m.NumNZs},
+                     solver={'nodes': m.NodeCount, 'simplex_iterations': m.IterCount, 'status': m.Status,
+                             'solutions': m.SolCount})
+
+    if write_lp:
+        m.write(os.path.join(SRC_DIR, m.ModelName + '.lp'))
+
+    if m.SolCount == 0:
+        return {'height': None, 'optimal': False, 'lower_bound': lower_bound_of(m, h_lb), 'time': solve_time,
+                'build_time': build_time, 'first_solution_time': None, 'incumbents': stream.timeline}
+
+    # Solution, read back with a single call
+    values = np.rint(m.getAttr("X", m._solution)).astype(np.int64)
+
+    x_sol = values[:n].tolist()
+    y_sol = values[n:2*n].tolist()
+    if rotation:
+        rot_sol = values[2*n:].tolist()
+        dx_sol = np.where(values[2*n:] == 1, d_arr, r_arr).tolist()
+        dy_sol = np.where(values[2*n:] == 1, r_arr, d_arr).tolist()
+    else:
+        rot_sol = None
+        dx_sol = list(r)
+        dy_sol = list(d)
 
-        # Solver
-        start_time = timer()
-        m.optimize()
-        solve_time = timer() - start_time
+    height_sol = int(round(m.ObjVal))
+    profiling.lap('extract')
 
-        m.write('MIP_no_rotation.lp')
+    # Writing solution
+    out_dir = os.path.join(SRC_DIR, "../out/output_rotations/" if rotation else "../out/output_no_rotations/")
+    instance_name = "ins-" + str(n_ins)
+    out_file = os.path.join(out_dir, instance_name + '-out.txt')
 
-        # Solution
-        print('')
-        print('Solution:')
-        print('')
+    if output:
+        writer.save_output(write_output, w, n, dx_sol, dy_sol, x_sol, y_sol, height_sol, out_file, solve_time, rotation, rot_sol)
+        plot(x_sol, y_sol, dy_sol, dx_sol, w, n_ins, rotation)
 
-        x_sol = []
-        y_sol = []
+    return {'height': height_sol, 'x': x_sol, 'y': y_sol, 'dx': dx_sol, 'dy': dy_sol, 'rotations': rot_sol,
+            'optimal': m.Status == GRB.OPTIMAL, 'lower_bound': lower_bound_of(m, h_lb), 'time': solve_time,
+            'build_time': build_time, 'first_solution_time': stream.first_time, 'incumbents': stream.timeline}
 
-        for i in range(n):
-            x_sol.append(int(m.getVarByName(f"x[{i}]").X))
-            y_sol.append(int(m.getVarByName(f"y[{i}]").X))
 
-        height_sol = int(m.ObjVal)
+#=================================================== Running MIP models ===================================================
 
-        # Writing solution
-        out_dir = "../out/out_no_rotations/"
-        instance_name = "ins-" + str(n_ins)
-        out_file = os.path.join(out_dir, instance_name + '-out.txt')
+if __name__ == '__main__':
 
-        write_output(w, n, r, d, x_sol, y_sol, height_sol, out_file, solve_time, rotation)
-        plot(x_sol, y_sol, d, r, w, n_ins, rotation)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--no-cache', action='store_true', help='solve every instance again instead of using the result cache')
+    args = parser.parse_args()
 
+    # Journal of the sweep (VLSI_JOURNAL), which makes it resumable, see vlsi.journal
+    journal = os.environ.get('VLSI_JOURNAL')
 
-#=================================================== Running MIP models ===================================================
+    for n_ins in range(1,5):
 
-for n_ins in range(1,5):
+        w, r, d, n = get_instance(os.path.join(SRC_DIR, '../instances'), 'ins-' + str(n_ins))
 
-    f = open('../instances/ins-' + str(n_ins) + ".dzn", "r")
-    lines = f.readlines()
-    w = int(re.findall(r'\d+', lines[0])[0])
-    r = load_data(lines[6])
-    d = load_data(lines[4])
-    n = len(d)
+        print("Solving instance "+str(n_ins))
 
-    print("Solving instance "+str(n_ins))
+        # Launch no-rotation model
+        journaled_solve(journal, 'MIP', solve_instance, w, r, d, n, n_ins, rotation=False, cache=not args.no_cache)
 
-    # Launch no-rotation model
-    solve_instance(w, r, d, n, n_ins, rotation=False)
+        # Launch rotation model
+        journaled_solve(journal, 'MIP', solve_instance, w, r, d, n, n_ins, rotation=True, cache=not args.no_cache)
 
-    # Launch rotation model
-    solve_instance(w, r, d, n, n_ins, rotation=True)
\ No newline at end of file
+    # Plots spooled during the sweep (VLSI_PLOTS=batch) are rendered all together
+    if writer.plot_mode() == 'batch':
+        writer.render_pending()
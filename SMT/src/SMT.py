@@ -1,23 +1,31 @@
+import argparse
 import os
 from z3 import *
 from z3 import And, Or, Bool, Int, Optimize, sat, If, Implies
-import re
 import numpy as np
 import time
-from matplotlib import pyplot as plt
-from matplotlib.patches import Rectangle
-from matplotlib.pyplot import figure
-from random import randint
+import math
+import threading
+import contextvars
 
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
 
-#================================================== Input-Output methods =================================================================
+# Configurations of the portfolio mode, in launch order: height search and arithmetic solver of z3 (6 is the default
+# solver, 2 the legacy simplex). Every member also gets its own random seed
+PORTFOLIO = [('optimize', 6), ('bisection', 6), ('optimize', 2), ('linear', 6), ('bisection', 2), ('linear', 2)]
+
+from SMT.src.order_encoding import order_model
+from vlsi.journal import journaled_solve
+from vlsi.instances import get_instance
+from vlsi.preprocessing import preprocess
+from vlsi import writer
+from vlsi import heuristics
+from vlsi import profiling
+from vlsi.bounds import lower_bound
+from vlsi.incumbents import IncumbentStream
 
-def load_data(line):
-    line = line.split('[')[1]
-    line = line.split(']')[0]
-    line = line.split(',')
-    return [int(n) for n in line]
 
+#================================================== Input-Output methods =================================================================
 
 def write_output(width, n_circuits, dx, dy, x_sol, y_sol, height, output_file, elapsed_time, time_expired, rotation, rotations=None):
 
@@ -47,22 +55,18 @@ def write_output(width, n_circuits, dx, dy, x_sol, y_sol, height, output_file, e
 
 def plot(x_sol, y_sol, d, r, w, n_ins, rotation):
 
-    n = len(x_sol)
-    colors = []
+    # Rendered off the solving path, see vlsi.writer
+    plots_dir = '../plots/plots_rotations/' if rotation else '../plots/plots_no_rotations/'
+    writer.save_plot(x_sol, y_sol, r, d, os.path.join(SRC_DIR, plots_dir + 'ins-' + str(n_ins) + '-plot.png'))
 
-    for i in range(n):
-        colors.append('#%06X' % randint(0, 0xFFFFFF))
 
-    fig, ax = plt.subplots()
+def save_solution(solution, w, n, n_ins, rotation, elapsed_time):
 
-    for i in range(n):
-        ax.plot()
-        ax.add_patch(Rectangle((x_sol[i], y_sol[i]), r[i], d[i] ,color=colors[i], alpha=0.5))
-
-    if rotation:
-        plt.savefig('../plots/plots_rotations/ins-' + str(n_ins) + '-plot.png')
-    else:
-        plt.savefig('../plots/plots_no_rotations/ins-' + str(n_ins) + '-plot.png')
+    # Output file and plot of a placement, also used for the optimal results answered by the cache (see vlsi.cache)
+    out_dir = os.path.join(SRC_DIR, "../out/output_rotations/" if rotation else "../out/output_no_rotations")
+    out_file = os.path.join(out_dir, "ins-" + str(n_ins) + '-out.txt')
+    writer.save_output(write_output, w, n, solution['dx'], solution['dy'], solution['x'], solution['y'], solution['height'], out_file, elapsed_time, False, rotation, solution.get('rotations'))
+    plot(solution['x'], solution['y'], solution['dy'], solution['dx'], w, n_ins, rotation)
 
 
 #================================================= Models' constraints methods ================================================
@@ -87,11 +91,179 @@ def lex(x, y):
     lex = [And([x[0] <= y[0]] + [Implies(And([x[i] == y[i] for i in range(k)]), x[k] <= y[k]) for k in range(1, len(x))])]
     return lex
 
-def no_overlap(x, y, r, d, n):
+def solver_statistics(solver):
+    # Conflicts, decisions, propagations, memory, ... as reported by z3
+    stats = solver.statistics()
+    return {key: stats.get_key_value(key) for key in stats.keys()}
+
+
+def height_search(solver, below, model_height, h_min, h_max, time_limit, strategy, on_model=None, bound=None):
+
+    # Incremental search over fixed heights on a single solver: each probe below(h) is checked under an
+    # assumption literal, while proven facts are added permanently so learned clauses stay valid
+    deadline = time.time() + time_limit
+    lower, upper = h_min, h_max
+    best_model = None
+
+    while lower <= upper:
+
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            break
+        solver.set("timeout", int(remaining*1000))
+
+        # Height reached meanwhile by another engine of the portfolio: only the heights up to it are left to search
+        if bound is not None and 0 < bound.value < upper:
+            upper = bound.value
+
+        if strategy == 'linear':
+            probe_height = lower
+        else:
+            probe_height = (lower + upper) // 2
+
+        probe = Bool(f"height_le_{probe_height}", solver.ctx)
+        solver.add(Implies(probe, below(probe_height)))
+        check = solver.check(probe)
+
+        if check == sat:
+            best_model = solver.model()
+            upper = model_height(best_model) - 1
+            solver.add(below(upper))
+            # Every satisfiable probe is a new incumbent, which may end the search early
+            if on_model is not None and on_model(best_model):
+                break
+        elif check == unsat:
+            lower = probe_height + 1
+            solver.add(Not(below(probe_height)))
+        else:
+            break
+
+    profiling.record(solver=solver_statistics(solver))
+    return best_model, lower > upper
+
+
+def int_search(constraints, tops, h_min, h_max, time_limit, strategy, on_model=None, params=None, bound=None):
+
+    solver = Solver(ctx=tops[0].ctx)
+    for name, value in (params or {}).items():
+        solver.set(name, value)
+    solver.add(constraints)
+
+    below = lambda h: And([top <= h for top in tops])
+    model_height = lambda model: max(model.evaluate(top).as_long() for top in tops)
+
+    return height_search(solver, below, model_height, h_min, h_max, time_limit, strategy, on_model, bound)
+
+
+def z3_search(constraints, height, tops, h_min, h_max, time_limit, search, on_model=None, params=None, bound=None):
+
+    # Single Optimize call or incremental height search, in the context of the constraints
+    if search != 'optimize':
+        return int_search(constraints, tops, h_min, h_max, time_limit, search, on_model, params, bound)
+
+    opt = Optimize(ctx=height.ctx)
+    for name, value in (params or {}).items():
+        opt.set(name, value)
+    opt.add(constraints)
+    opt.set("timeout", int(time_limit*1000))
+    opt.minimize(height)
+    check = opt.check()
+    model = opt.model() if check == sat else None
+    profiling.record(solver=solver_statistics(opt))
+
+    # Optimize only reports its final model
+    if model is not None and on_model is not None:
+        on_model(model)
+    return model, check == sat
+
+
+def portfolio_search(constraints, height, tops, h_min, h_max, time_limit, size, seed=None, on_model=None, bound=None):
+
+    # Differently configured z3 instances on the same model, each on a thread with its own context (z3 releases the
+    # GIL while solving). The first one proving its height optimal interrupts the others, else the lowest model wins
+    main = height.ctx
+    contexts = [Context() for _ in range(size)]
+    lock = threading.Lock()
+    finished = threading.Event()
+    results = []
+
+    def interrupt():
+        finished.set()
+        for ctx in contexts:
+            ctx.interrupt()
+
+    def member(k):
+        search, arith = PORTFOLIO[k % len(PORTFOLIO)]
+        params = {'random_seed': (seed or 0) + k, 'arith.solver': arith}
+
+        # Contexts aren't thread-safe: every use of the main one is serialized
+        with lock:
+            local_constraints = [c.translate(contexts[k]) for c in constraints]
+            local_height = height.translate(contexts[k])
+            local_tops = [top.translate(contexts[k]) for top in tops]
+
+        def report(model):
+            with lock:
+                stop = on_model is not None and on_model(model.translate(main))
+            if stop:
+                interrupt()
+            return stop
+
+        if finished.is_set():
+            return
+        try:
+            model, proven = z3_search(local_constraints, local_height, local_tops, h_min, h_max, time_limit, search,
+                                      report, params, bound)
+        except Z3Exception:
+            # Interrupted while building its solver
+            return
+
+        if model is not None:
+            with lock:
+                model = model.translate(main)
+                results.append((not proven, model.evaluate(height, model_completion=True).as_long(), k, model))
+        if proven:
+            interrupt()
+
+    # Each in a copy of the context of the call, so that the statistics of the members reach the profile of the run
+    threads = [threading.Thread(target=contextvars.copy_context().run, args=(member, k), daemon=True)
+               for k in range(size)]
+    for thread in threads:
+        thread.start()
+
+    # Members still starting when the winner is found miss the first interruption
+    deadline = time.time() + time_limit + 5
+    while any(thread.is_alive() for thread in threads):
+        if finished.wait(0.1) or time.time() > deadline:
+            interrupt()
+        for thread in threads:
+            thread.join(0.01)
+
+    if not results:
+        return None, False
+    unproven, _, _, model = min(results, key=lambda result: result[:3])
+    return model, not unproven
+
+
+def emit_model(stream, model, height, x, y, dx, dy, rot=None):
+
+    # Streaming a model of the integer encoding as an incumbent
+    value = lambda v: model.evaluate(v, model_completion=True).as_long()
+    if rot is None:
+        return stream.emit(value(height), [value(v) for v in x], [value(v) for v in y], dx, dy)
+    return stream.emit(value(height), [value(v) for v in x], [value(v) for v in y], [value(v) for v in dx],
+                       [value(v) for v in dy], [is_true(model.evaluate(v, model_completion=True)) for v in rot])
+
+
+def no_overlap(x, y, r, d, n, vertical=()):
     no_overlap = []
+    vertical = set(vertical)
     for i in range(n):
-        for j in range(n):
-            if (i!=j):
+        for j in range(i+1, n):
+            if (i, j) in vertical:
+                # Too wide to sit side by side
+                no_overlap.append(Or((y[i]+d[i]<=y[j]), (y[j]+d[j]<=y[i])))
+            else:
                 no_overlap.append(Or((x[i]+r[i]<=x[j]), (x[j]+r[j]<=x[i]), (y[i]+d[i]<=y[j]), (y[j]+d[j]<=y[i])))
     return no_overlap
 
@@ -99,49 +271,223 @@ def no_overlap(x, y, r, d, n):
 #============================================== Solving instances method ========================================================
 
 
-def solve_instance(w, r, d, n, n_ins, rotation):
+def sort_by_area(r, d):
+
+    # Pre-processing: ordering circuits by decreasing area
+    areas = []
+
+    for i in range(len(d)):
+        areas.append(d[i]*r[i])
+
+    sorted_idx = np.argsort(areas)[::-1]
+
+    d_sort = []
+    r_sort = []
+
+    for i in sorted_idx:
+       d_sort.append(d[i])
+       r_sort.append(r[i])
+
+    return r_sort, d_sort, sorted_idx
+
+
+def unsort(result, sorted_idx):
+
+    # Bringing the solution back to the original order of the circuits
+    for key in ('x', 'y', 'dx', 'dy', 'rotations'):
+        if result.get(key):
+            values = [None] * len(sorted_idx)
+            for k, i in enumerate(sorted_idx):
+                values[i] = result[key][k]
+            result[key] = values
+    return result
+
+
+def sort_packing(packing, sorted_idx):
+
+    # Bringing a known packing to the order of the sorted circuits
+    packing = dict(packing)
+    for key in ('x', 'y', 'dx', 'dy', 'rotations'):
+        if packing.get(key):
+            packing[key] = [packing[key][i] for i in sorted_idx]
+    return packing
+
+
+def solved_by_bounds(start, w, n, n_ins, rotation, output, elapsed_time, sorted_idx):
+
+    # The greedy packing reaches the lower bound: it is optimal and no solver is needed
+    if output:
+        save_solution(start, w, n, n_ins, rotation, elapsed_time)
+
+    return unsort(dict(start, optimal=True, time=elapsed_time, build_time=elapsed_time, first_solution_time=elapsed_time,
+                       incumbents=[(elapsed_time, start['height'])]), sorted_idx)
+
+
+def solve_order(w, r, d, n, n_ins, rotation, time_limit, bound, output, search, sorted_idx, pre, start, h_lb, call_time,
+                stream, params):
+
+    #Bounds
+    levels = ((sum(r) // w) + 1)*2
+    d_sort = sorted(d)
+    h_max = sum([d_sort[n-1-i] for i in range(min(levels,n))])
+    h_min = max(math.ceil(sum(d[i]*r[i] for i in range(n)) / w), h_lb)
+
+    if bound is not None and bound.value > 0:
+        h_max = min(h_max, bound.value)
+    if start is not None:
+        h_max = min(h_max, start['height'])
+
+    # Propositional model, solved by the SAT core of z3
+    t0 = time.time()
+
+    constraints, below, solution = order_model(w, r, d, n, h_max, rotation, pre)
+    solver = SolverFor("QF_FD")
+    for name, value in params.items():
+        solver.set(name, value)
+    solver.add(constraints)
+    build_time = time.time() - call_time
+    profiling.lap('build')
+    profiling.record(model={'assertions': len(constraints)})
+
+    def model_height(model):
+        x_sol, y_sol, dx_sol, dy_sol, rot_sol = solution(model)
+        return max(y_sol[i] + dy_sol[i] for i in range(n))
+
+    def on_model(model):
+        x_sol, y_sol, dx_sol, dy_sol, rot_sol = solution(model)
+        return stream.emit(model_height(model), x_sol, y_sol, dx_sol, dy_sol, rot_sol if rotation else None)
+
+    model, proven = height_search(solver, below, model_height, h_min, h_max, time_limit,
+                                  'linear' if search == 'linear' else 'bisection', on_model, bound)
+    elapsed_time = time.time() - t0
+    profiling.lap('solve')
+
+    # Solution
+    x_sol, y_sol, dx_sol, dy_sol, rot_sol = [], [], [], [], []
+    height_sol = ""
+    time_exp = model is None
+
+    if model is not None:
+        x_sol, y_sol, dx_sol, dy_sol, rot_sol = solution(model)
+        height_sol = str(model_height(model))
+        profiling.lap('extract')
+    elif start is not None:
+        # No model within the time limit: falling back to the greedy packing
+        time_exp = False
+        x_sol, y_sol, dx_sol, dy_sol = start['x'], start['y'], start['dx'], start['dy']
+        rot_sol = start['rotations'] or [False] * n
+        height_sol = str(start['height'])
+
+    if not time_exp:
+
+        # Plotting the solution
+        if output:
+            plot(x_sol, y_sol, dy_sol, dx_sol, w, n_ins, rotation)
+
+    # Writing solution
+    if rotation:
+        out_dir = os.path.join(SRC_DIR, "../out/output_rotations/")
+    else:
+        out_dir = os.path.join(SRC_DIR, "../out/output_no_rotations")
+    out_file = os.path.join(out_dir, "ins-" + str(n_ins) + '-out.txt')
+
+    if output:
+        writer.save_output(write_output, w, n, dx_sol, dy_sol, x_sol, y_sol, height_sol, out_file, elapsed_time, time_exp, rotation, rot_sol)
+
+    return unsort({'height': None if time_exp else int(height_sol), 'x': x_sol, 'y': y_sol, 'dx': dx_sol, 'dy': dy_sol,
+                   'rotations': rot_sol if rotation else None, 'optimal': proven, 'time': elapsed_time,
+                   'build_time': build_time, 'first_solution_time': stream.first_time, 'incumbents': stream.timeline},
+                  sorted_idx)
+
+
+@profiling.instrument('SMT')
+def solve_instance(w, r, d, n, n_ins, rotation, time_limit=300, bound=None, output=True, search='optimize', backend='int',
+                   warm_start=True, seed=None, on_solution=None, portfolio=1):
+
+    call_time = time.time()
+    r, d, sorted_idx = sort_by_area(r, d)
+    stream = IncumbentStream(on_solution, order=sorted_idx, bound=bound)
+
+    # Seed of the solvers of this call only, set_param would change the one of every solver of the process
+    params = {'random_seed': seed} if seed is not None else {}
+
+    # Pair pruning, forced orientations and identical circuits
+    pre = preprocess(w, r, d, rotation)
+    h_lb = lower_bound(w, r, d, rotation)
+
+    # Greedy packing tightening the upper bound on the height
+    if isinstance(warm_start, dict):
+        warm_start = sort_packing(warm_start, sorted_idx)
+    start = heuristics.initial_packing(w, r, d, rotation, pre, warm_start)
+    profiling.lap('preprocess')
+    if start is not None:
+        stream.emit(start['height'], start['x'], start['y'], start['dx'], start['dy'], start['rotations'])
+    if start is not None and start['height'] <= h_lb:
+        return solved_by_bounds(start, w, n, n_ins, rotation, output, time.time() - call_time, sorted_idx)
+
+    if backend == 'order':
+        return solve_order(w, r, d, n, n_ins, rotation, time_limit, bound, output, search, sorted_idx, pre, start, h_lb,
+                           call_time, stream, params)
 
     if rotation:
         
         # Variables
         x = [Int(f"x{i}") for i in range(n)]
         y = [Int(f"y{i}") for i in range(n)]
-        height = z3_max([dy[i] + y[i] for i in range(n)])
         dx = [Int(f"x_dim{i}") for i in range(n)]
         dy = [Int(f"y_dim{i}") for i in range(n)]
-        rotation = [Bool(f"rot{i}") for i in range(n)]
+        height = z3_max([dy[i] + y[i] for i in range(n)])
+        rot = [Bool(f"rot{i}") for i in range(n)]
 
         #Bounds
         levels = ((sum(r) // w) + 1)*2 
         d_sort = sorted(d)
         h_max = sum([d_sort[n-1-i] for i in range(min(levels,n))])
-        h_min = sum(d[i]*r[i] for i in range(n)) / w  
+        h_min = sum(d[i]*r[i] for i in range(n)) / w
+        h_min = max(h_min, h_lb)
+        if start is not None:
+            h_max = min(h_max, start['height'])
 
         # Domains
         domain_x = [x[i]>=0 for i in range(n)]
         domain_y = [y[i]>=0 for i in range(n)]
         domain_height = [And(height>=h_min, height<=h_max)]
+
+        # Height already reached by another engine (shared portfolio bound)
+        if bound is not None and bound.value > 0:
+            domain_height.append(height <= bound.value)
         
         # Constraints
         max_w = [z3_max([dx[i] + x[i] for i in range(n)]) <= w]
-        no_over = no_overlap(x, y, dx, dy, n)
+        no_over = no_overlap(x, y, dx, dy, n, pre['vertical_pairs'])
         cumulative_x = z3_cumulative(y,dy,dx,w)
-        rot_constraint = [If(rotation[i], And(dy[i]==r[i], dx[i]==d[i]), And(dy[i]==d[i], dx[i]==r[i])) for i in range(n)]
-        square = [Implies(d[i]==r[i], rotation[i]==False) for i in range(n)]
+        rot_constraint = [If(rot[i], And(dy[i]==r[i], dx[i]==d[i]), And(dy[i]==d[i], dx[i]==r[i])) for i in range(n)]
+        fixed_rot = [rot[i] == value for i, value in pre['fixed_rotation'].items()]
         break_x = [w-x[i]-dx[i] for i in range(n)]        
         sym_break_x = lex(x, break_x)
+        sym_break_y = [y[a] <= y[b] for a, b in pre['ordered_pairs']]
 
 
         # Solver
         
-        opt = Optimize()
-        opt.add(domain_x + domain_y + no_over + max_w + cumulative_x + sym_break_x  + rot_constraint  + domain_height + square)
-        opt.set("timeout", 300000)
-        opt.minimize(height)
+        constraints = domain_x + domain_y + no_over + max_w + cumulative_x + sym_break_x + sym_break_y + rot_constraint + domain_height + fixed_rot
 
         t0 = time.time()
-        check = opt.check()
+        build_time = t0 - call_time
+        profiling.lap('build')
+        profiling.record(model={'variables': 5*n, 'assertions': len(constraints)})
+
+        on_model = lambda model: emit_model(stream, model, height, x, y, dx, dy, rot)
+        tops = [dy[i] + y[i] for i in range(n)]
+        if portfolio > 1:
+            model, proven = portfolio_search(constraints, height, tops, math.ceil(h_min), h_max, time_limit, portfolio, seed,
+                                             on_model, bound)
+        else:
+            model, proven = z3_search(constraints, height, tops, math.ceil(h_min), h_max, time_limit, search, on_model,
+                                      params, bound)
+
         elapsed_time = time.time() - t0
+        profiling.lap('solve')
 
         # Solution
 
@@ -152,9 +498,8 @@ def solve_instance(w, r, d, n, n_ins, rotation):
         height_sol = ""
         rot_sol = []
 
-        if check == sat:
+        if model is not None:
             time_exp = False
-            model = opt.model()
             for i in range(n):
                 x_sol.append(model.evaluate(x[i]).as_long())
                 y_sol.append(model.evaluate(y[i]).as_long())
@@ -163,27 +508,44 @@ def solve_instance(w, r, d, n, n_ins, rotation):
 
 
             for i in range(n):
-                if model.evaluate(rotation[i]) == True:
+                if model.evaluate(rot[i]) == True:
                     rot_sol.append(True)
-                elif model.evaluate(rotation[i]) == False:
+                elif model.evaluate(rot[i]) == False:
                     rot_sol.append(False)
 
             height_sol = model.evaluate(height).as_string()
+            profiling.lap('extract')
             
             # Plotting the solution
             
-            plot(x_sol, y_sol, dy_sol, dx_sol, w, n_ins, rotation)
+            if output:
+                plot(x_sol, y_sol, dy_sol, dx_sol, w, n_ins, rotation)
+
+        elif start is not None:
+            # No model within the time limit: falling back to the greedy packing
+            time_exp = False
+            x_sol, y_sol, dx_sol, dy_sol, rot_sol = start['x'], start['y'], start['dx'], start['dy'], start['rotations']
+            height_sol = str(start['height'])
+
+            if output:
+                plot(x_sol, y_sol, dy_sol, dx_sol, w, n_ins, rotation)
 
         else:
             time_exp = True
 
         # Writing solution
 
-        out_dir = "../out/out_rotations/"
+        out_dir = os.path.join(SRC_DIR, "../out/output_rotations/")
         instance_name = "ins-" + str(n_ins)
         out_file = os.path.join(out_dir, instance_name + '-out.txt')
 
-        write_output(w, n, dx_sol, dy_sol, x_sol, y_sol, height_sol, out_file, elapsed_time, time_exp, rotation, rot_sol)
+        if output:
+            writer.save_output(write_output, w, n, dx_sol, dy_sol, x_sol, y_sol, height_sol, out_file, elapsed_time, time_exp, rotation, rot_sol)
+
+        return unsort({'height': None if time_exp else int(height_sol), 'x': x_sol, 'y': y_sol, 'dx': dx_sol,
+                       'dy': dy_sol, 'rotations': rot_sol, 'optimal': proven, 'time': elapsed_time,
+                       'build_time': build_time, 'first_solution_time': stream.first_time,
+                       'incumbents': stream.timeline}, sorted_idx)
 
         
     else:
@@ -198,88 +560,113 @@ def solve_instance(w, r, d, n, n_ins, rotation):
         d_sort = sorted(d)
         h_max = sum([d_sort[n-1-i] for i in range(min(levels,n))])
         h_min = sum(d[i]*r[i] for i in range(n)) / w
+        h_min = max(h_min, h_lb)
+        if start is not None:
+            h_max = min(h_max, start['height'])
 
         # Domains
         domain_x = [x[i]>=0 for i in range(n)]
         domain_y = [y[i]>=0 for i in range(n)]
         domain_height = [And(height>=h_min, height<=h_max)]
 
+        if bound is not None and bound.value > 0:
+            domain_height.append(height <= bound.value)
+
         # Constraints
         max_w = [z3_max([r[i] + x[i] for i in range(n)]) <= w]
-        no_over = no_overlap(x, y, r, d, n)
+        no_over = no_overlap(x, y, r, d, n, pre['vertical_pairs'])
         cumulative_x = z3_cumulative(y,d,r,w)
+        sym_break_y = [y[a] <= y[b] for a, b in pre['ordered_pairs']]
 
         # Solver
-        opt = Optimize()
-        opt.add(domain_x + domain_y + no_over + max_w + cumulative_x + domain_height)
-        opt.set("timeout", 300000)
-        opt.minimize(height)
+        constraints = domain_x + domain_y + no_over + max_w + cumulative_x + sym_break_y + domain_height
 
         t0 = time.time()
-        check = opt.check()
+        build_time = t0 - call_time
+        profiling.lap('build')
+        profiling.record(model={'variables': 2*n, 'assertions': len(constraints)})
+
+        on_model = lambda model: emit_model(stream, model, height, x, y, r, d)
+        tops = [d[i] + y[i] for i in range(n)]
+        if portfolio > 1:
+            model, proven = portfolio_search(constraints, height, tops, math.ceil(h_min), h_max, time_limit, portfolio, seed,
+                                             on_model, bound)
+        else:
+            model, proven = z3_search(constraints, height, tops, math.ceil(h_min), h_max, time_limit, search, on_model,
+                                      params, bound)
+
         elapsed_time = time.time() - t0
+        profiling.lap('solve')
 
         # Solution
         x_sol = []
         y_sol = []
         height_sol = ""
 
-        if check == sat:
+        if model is not None:
             time_exp = False
-            model = opt.model()
             for i in range(n):
                 x_sol.append(model.evaluate(x[i]).as_long())
             for i in range(n):
                 y_sol.append(model.evaluate(y[i]).as_long())
 
             height_sol = model.evaluate(height).as_string()
+            profiling.lap('extract')
             
             # Plotting the solution
 
-            plot(x_sol, y_sol, d, r, w, n_ins, rotation)
+            if output:
+                plot(x_sol, y_sol, d, r, w, n_ins, rotation)
+
+        elif start is not None:
+            # No model within the time limit: falling back to the greedy packing
+            time_exp = False
+            x_sol, y_sol = start['x'], start['y']
+            height_sol = str(start['height'])
+
+            if output:
+                plot(x_sol, y_sol, d, r, w, n_ins, rotation)
 
         else:
             time_exp = True
 
         # Writing solution
 
-        out_dir = "../out/out_no_rotations"
+        out_dir = os.path.join(SRC_DIR, "../out/output_no_rotations")
         instance_name = "ins-" + str(n_ins)
         out_file = os.path.join(out_dir, instance_name + '-out.txt')
 
-        write_output(w, n, r, d, x_sol, y_sol, height_sol, out_file, elapsed_time, time_exp, rotation)
+        if output:
+            writer.save_output(write_output, w, n, r, d, x_sol, y_sol, height_sol, out_file, elapsed_time, time_exp, rotation)
 
+        return unsort({'height': None if time_exp else int(height_sol), 'x': x_sol, 'y': y_sol, 'dx': r, 'dy': d,
+                       'rotations': None, 'optimal': proven, 'time': elapsed_time, 'build_time': build_time,
+                       'first_solution_time': stream.first_time, 'incumbents': stream.timeline}, sorted_idx)
 
-#=================================================== Running SMT models ===================================================
 
-for n_ins in range(1,41):
+#=================================================== Running SMT models ===================================================
 
-    f = open('../instances/ins-' + str(n_ins) + ".dzn", "r") 
-    lines = f.readlines()
-    w = int(re.findall(r'\d+', lines[0])[0])
-    r = load_data(lines[6])
-    d = load_data(lines[4])
-    n = len(d)
+if __name__ == '__main__':
 
-    # Pre-processing: ordering instances by decreasing area
-    areas = []
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--no-cache', action='store_true', help='solve every instance again instead of using the result cache')
+    args = parser.parse_args()
 
-    for i in range(n):
-        areas.append(d[i]*r[i])
+    # Journal of the sweep (VLSI_JOURNAL), which makes it resumable, see vlsi.journal
+    journal = os.environ.get('VLSI_JOURNAL')
 
-    sorted_idx = np.argsort(areas)[::-1]
+    for n_ins in range(1,41):
 
-    d_sort = []
-    r_sort = []
+        w, r, d, n = get_instance(os.path.join(SRC_DIR, '../instances'), 'ins-' + str(n_ins))
 
-    for i in sorted_idx:
-       d_sort.append(d[i])
-       r_sort.append(r[i])
+        print("Solving instance "+str(n_ins))
 
-    print("Solving instance "+str(n_ins))
+        # Launch no-rotation model
+        journaled_solve(journal, 'SMT', solve_instance, w, r, d, n, n_ins, rotation=False, cache=not args.no_cache)
 
-    # Launch no-rotation model
-    solve_instance(w, r_sort, d_sort, n, n_ins, rotation=False)
+        # Launch rotation model
+        journaled_solve(journal, 'SMT', solve_instance, w, r, d, n, n_ins, rotation=True, cache=not args.no_cache)
 
-    # Launch rotation model
-    solve_instance(w, r_sort, d_sort, n, n_ins, rotation=True)
\ No newline at end of file
+    # Plots spooled during the sweep (VLSI_PLOTS=batch) are rendered all together
+    if writer.plot_mode() == 'batch':
+        writer.render_pending()
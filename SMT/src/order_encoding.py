@@ -0,0 +1,141 @@
+from z3 import And, Or, Not, Implies, Bool, BoolVal, is_true
+
+
+#================================================== Order encoding =================================================================
+
+# Every coordinate v with domain 0..U is represented by the Boolean literals p[e] <=> (v <= e), e = 0..U-1,
+# so that the whole model is propositional and can be handed to the SAT core of z3.
+
+def order_vars(name, upper):
+    return [Bool(f"{name}_le_{e}") for e in range(upper)]
+
+
+def order_lit(p, e):
+    if e < 0:
+        return BoolVal(False)
+    if e >= len(p):
+        return BoolVal(True)
+    return p[e]
+
+
+def order_axioms(p):
+    return [Implies(p[e], p[e+1]) for e in range(len(p)-1)]
+
+
+def decode(model, p):
+    for e in range(len(p)):
+        if is_true(model.evaluate(p[e], model_completion=True)):
+            return e
+    return len(p)
+
+
+def guarded(rot, if_not_rotated, if_rotated):
+
+    # Selecting the constraint matching the orientation of the circuit
+    if rot is None:
+        return [if_not_rotated]
+    return [Implies(Not(rot), if_not_rotated), Implies(rot, if_rotated)]
+
+
+#================================================== Constraints =================================================================
+
+def before(px_i, px_j, lit, size_i):
+
+    # lit -> v_i + size_i <= v_j
+    clauses = [Implies(lit, Not(order_lit(px_j, size_i - 1)))]
+    for e in range(len(px_j) + 1):
+        clauses.append(Implies(And(lit, order_lit(px_j, e + size_i)), order_lit(px_i, e)))
+    return clauses
+
+
+def order_model(w, r, d, n, h_max, rotation, pre):
+
+    rot = [Bool(f"rot{i}") for i in range(n)] if rotation else [None] * n
+
+    # Dimensions of the circuits in the two orientations
+    dims = [(r[i], d[i]) for i in range(n)]
+    min_width = min(min(r), min(d)) if rotation else min(r)
+    min_height = min(min(r), min(d)) if rotation else min(d)
+
+    px = [order_vars(f"x{i}", max(0, w - min_width)) for i in range(n)]
+    py = [order_vars(f"y{i}", max(0, h_max - min_height)) for i in range(n)]
+
+    constraints = []
+
+    for i in range(n):
+        constraints += order_axioms(px[i]) + order_axioms(py[i])
+
+        # x[i] + dx[i] <= w
+        constraints += guarded(rot[i], order_lit(px[i], w - r[i]), order_lit(px[i], w - d[i]))
+
+    # Forced orientations
+    for i, value in pre['fixed_rotation'].items():
+        constraints.append(rot[i] if value else Not(rot[i]))
+
+    # No overlap: every pair is separated horizontally or vertically, only vertically if too wide
+    vertical = set(pre['vertical_pairs'])
+    for i in range(n):
+        for j in range(i+1, n):
+            lr = [Bool(f"lr_{i}_{j}"), Bool(f"lr_{j}_{i}"), Bool(f"ud_{i}_{j}"), Bool(f"ud_{j}_{i}")]
+            if (i, j) in vertical:
+                lr[0] = lr[1] = BoolVal(False)
+            constraints.append(Or(lr))
+
+            for a, b, lit_x, lit_y in ((i, j, lr[0], lr[2]), (j, i, lr[1], lr[3])):
+                width, height = dims[a]
+                if rot[a] is None:
+                    constraints += before(px[a], px[b], lit_x, width)
+                    constraints += before(py[a], py[b], lit_y, height)
+                else:
+                    constraints += before(px[a], px[b], And(lit_x, Not(rot[a])), width)
+                    constraints += before(px[a], px[b], And(lit_x, rot[a]), height)
+                    constraints += before(py[a], py[b], And(lit_y, Not(rot[a])), height)
+                    constraints += before(py[a], py[b], And(lit_y, rot[a]), width)
+
+    # Identical circuits ordered by y: y[a] <= y[b]
+    for a, b in pre['ordered_pairs']:
+        constraints += [Implies(py[b][e], py[a][e]) for e in range(len(py[a]))]
+
+    # Symmetry breaking, as lex in the integer model: x <=lex (w - x - dx)
+    if rotation:
+        prefix = BoolVal(True)
+        for k in range(n):
+            # 2*x[k] <= w - dx[k] and 2*x[k] == w - dx[k], for both orientations
+            le = Or(guarded_pair(rot[k], [order_lit(px[k], (w - size) // 2) for size in dims[k]]))
+            eq = Or(guarded_pair(rot[k], [exactly(px[k], w - size) for size in dims[k]]))
+            constraints.append(Implies(prefix, le))
+            prefix = And(prefix, eq)
+
+    def below(h):
+        # Every circuit ends below height h
+        fits = []
+        for i in range(n):
+            fits += guarded(rot[i], order_lit(py[i], h - d[i]), order_lit(py[i], h - r[i]))
+        return And(fits)
+
+    def solution(model):
+        x_sol = [decode(model, px[i]) for i in range(n)]
+        y_sol = [decode(model, py[i]) for i in range(n)]
+        if rotation:
+            rot_sol = [is_true(model.evaluate(rot[i], model_completion=True)) for i in range(n)]
+        else:
+            rot_sol = [False] * n
+        dx_sol = [d[i] if rot_sol[i] else r[i] for i in range(n)]
+        dy_sol = [r[i] if rot_sol[i] else d[i] for i in range(n)]
+        return x_sol, y_sol, dx_sol, dy_sol, rot_sol
+
+    return constraints, below, solution
+
+
+def guarded_pair(rot, options):
+
+    # options[0] holds when the circuit is not rotated, options[1] when it is
+    return [And(Not(rot), options[0]), And(rot, options[1])]
+
+
+def exactly(p, double):
+
+    # 2*v == double
+    if double % 2 != 0:
+        return BoolVal(False)
+    return And(order_lit(p, double // 2), Not(order_lit(p, double // 2 - 1)))
@@ -0,0 +1,79 @@
+"""Exhaustive references for small instances, to check the fast code against."""
+
+import itertools
+
+import numpy as np
+
+
+def random_instance(rng, w_max=6, n_max=4, d_max=4):
+    w = int(rng.integers(2, w_max + 1))
+    n = int(rng.integers(1, n_max + 1))
+    r = rng.integers(1, w + 1, n).tolist()
+    d = rng.integers(1, d_max + 1, n).tolist()
+    return w, r, d
+
+
+def overlapping_pairs(x, y, dx, dy):
+
+    # Pairs of circuits whose interiors intersect, touching ones excluded
+    return [(i, j) for i, j in itertools.combinations(range(len(x)), 2)
+            if x[i] < x[j] + dx[j] and x[j] < x[i] + dx[i] and y[i] < y[j] + dy[j] and y[j] < y[i] + dy[i]]
+
+
+def valid_placement(w, result, r, d, rotation):
+
+    # Inside the plate, reaching its height, with the dimensions of the instance and without overlaps
+    x, y, dx, dy = result['x'], result['y'], result['dx'], result['dy']
+    shapes = [sorted(shape) if rotation else shape for shape in zip(dx, dy)]
+    return (shapes == [sorted(shape) if rotation else shape for shape in zip(r, d)]
+            and all(x[i] >= 0 and y[i] >= 0 and x[i] + dx[i] <= w for i in range(len(r)))
+            and max(y[i] + dy[i] for i in range(len(r))) == result['height']
+            and not overlapping_pairs(x, y, dx, dy))
+
+
+def fits(w, height, r, d, rotation, pre=None):
+
+    # Backtracking over every cell of the plate, circuits placed in order. With the output of preprocess, the
+    # placements must also satisfy its restrictions, which must not change the optimal height
+    n = len(r)
+    grid = np.zeros((height, w), dtype=bool)
+    placed = [None] * n
+    fixed = pre['fixed_rotation'] if pre else {}
+    vertical = set(pre['vertical_pairs']) if pre else set()
+    ordered = set(pre['ordered_pairs']) if pre else set()
+
+    def allowed(i, y, length):
+        for j in range(i):
+            yj, lj = placed[j]
+            # Side by side is excluded for the vertical pairs
+            if (j, i) in vertical and not (y >= yj + lj or yj >= y + length):
+                return False
+            if (j, i) in ordered and yj > y or (i, j) in ordered and y > yj:
+                return False
+        return True
+
+    def place(i):
+        if i == n:
+            return True
+        shapes = [(r[i], d[i], False), (d[i], r[i], True)] if rotation else [(r[i], d[i], False)]
+        for width, length, rotated in shapes:
+            if fixed.get(i, rotated) != rotated:
+                continue
+            for y in range(height - length + 1):
+                for x in range(w - width + 1):
+                    if not grid[y:y+length, x:x+width].any() and allowed(i, y, length):
+                        grid[y:y+length, x:x+width] = True
+                        placed[i] = (y, length)
+                        if place(i + 1):
+                            return True
+                        grid[y:y+length, x:x+width] = False
+        return False
+
+    return place(0)
+
+
+def optimal_height(w, r, d, rotation, pre=None):
+    height = 1
+    while not fits(w, height, r, d, rotation, pre):
+        height += 1
+    return height
@@ -0,0 +1,60 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+from tests.brute import optimal_height, valid_placement
+from vlsi import instances
+from vlsi.api import main, read_instance, solve
+from vlsi.engines import ROOT_DIR
+
+W, R, D = 6, [3, 3, 2, 4, 2], [3, 2, 4, 2, 3]
+
+
+def test_read_instance(tmp_path, monkeypatch):
+    monkeypatch.setattr(instances, 'CACHE_DIR', str(tmp_path / 'store'))
+    monkeypatch.setattr(instances, '_stores', {})
+
+    assert read_instance((W, R, D)) == ((W, R, D, 5), 0)
+    assert read_instance({'w': str(W), 'r': tuple(R), 'd': D}) == ((W, R, D, 5), 0)
+    assert read_instance(1) == read_instance('1')
+    assert read_instance(1)[0][0] == 8 and read_instance(1)[1] == 1
+
+    path = tmp_path / 'ins-big.dzn'
+    path.write_text('w = 6;\nn = 5;\nr = [3, 3, 2, 4, 2];\nd = [3, 2, 4, 2, 3];\n')
+    assert read_instance(str(path)) == ((W, R, D, 5), 'big')
+
+    with pytest.raises(ValueError):
+        read_instance((W, R, D[:2]))
+
+
+def test_unknown_engine():
+    with pytest.raises(ValueError):
+        solve((W, R, D), engine='SAT')
+
+
+@pytest.mark.parametrize('rotation', [False, True])
+def test_solve(rotation):
+    pytest.importorskip('z3')
+    best = optimal_height(W, R, D, rotation)
+    for instance in ((W, R, D), {'w': W, 'r': R, 'd': D}):
+        result = solve(instance, engine='SMT', rotation=rotation, time_limit=30, cache=False)
+        assert result['optimal'] and result['height'] == best
+        assert valid_placement(W, result, R, D, rotation)
+
+
+def test_command_line(tmp_path, capsys):
+    pytest.importorskip('z3')
+    path = tmp_path / 'ins-1.dzn'
+    path.write_text('w = 6;\nn = 5;\nr = [3, 3, 2, 4, 2];\nd = [3, 2, 4, 2, 3];\n')
+    main([str(path), '--engine', 'SMT', '--time-limit', '30', '--no-cache', '--json'])
+    result = json.loads(capsys.readouterr().out)
+    assert result['height'] == optimal_height(W, R, D, False) and valid_placement(W, result, R, D, False)
+
+
+def test_no_solver_imported():
+    # The engines are only imported by solve
+    code = 'import sys, vlsi, vlsi.api; print(sorted({"z3", "gurobipy", "minizinc", "matplotlib"} & set(sys.modules)))'
+    output = subprocess.run([sys.executable, '-c', code], cwd=ROOT_DIR, capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == '[]'
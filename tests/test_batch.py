@@ -0,0 +1,90 @@
+import multiprocessing as mp
+import os
+import subprocess
+import time
+
+import pytest
+
+from vlsi import instances
+from vlsi.batch import job_cores, make_jobs, parse_range, parse_rotations, run_batch, share_cores
+from vlsi.engines import kill_process_group, own_process_group
+
+
+@pytest.fixture
+def instances_dir(tmp_path, monkeypatch):
+
+    # Two small instances out of the repository, compiled into a temporary store
+    monkeypatch.setattr(instances, 'CACHE_DIR', str(tmp_path / 'store'))
+    folder = tmp_path / 'instances'
+    folder.mkdir()
+    (folder / 'ins-1.dzn').write_text('w = 4;\nn = 3;\nr = [2, 2, 4];\nd = [3, 3, 1];\n')
+    (folder / 'ins-2.dzn').write_text('w = 5;\nn = 4;\nr = [3, 2, 2, 3];\nd = [2, 2, 3, 3];\n')
+    return str(folder)
+
+
+def test_parse_range():
+    assert parse_range(['1-3', '5', '7,9-10']) == [1, 2, 3, 5, 7, 9, 10]
+    assert parse_rotations('both') == (False, True)
+
+
+def test_job_cores():
+    assert job_cores('MIP', 4, {}) == 4
+    assert job_cores('SMT', 4, {'portfolio': 3}) == 3
+    assert job_cores('CP', 4, {'threads': 2}) == 2
+    assert job_cores('CP', 4, {'search': 'probe', 'probes': 3, 'threads': 2}) == 6
+    assert job_cores('CP', 4, {'search': 'probe'}) == 1
+
+
+def test_jobs():
+    jobs = make_jobs([1, 2], ['SMT', 'MIP'], (False, True), time_limit=10, mip_threads=2)
+    assert len(jobs) == 8 and [job['id'] for job in jobs] == list(range(8))
+    assert {(job['approach'], job['cores']) for job in jobs} == {('SMT', 1), ('MIP', 2)}
+
+
+def test_share_cores():
+    # Without --cp-probes, the CP probing jobs split the cores instead of each taking all of them
+    jobs = make_jobs([1, 2, 3], ['CP', 'MIP'], (False,), mip_threads=8, options={'CP': {'search': 'probe'}})
+    share_cores(jobs, 6)
+    assert [job['cores'] for job in jobs] == [2, 6, 2, 6, 2, 6]
+
+
+def test_sweep(instances_dir):
+    jobs = make_jobs([1, 2, 3], ['SMT'], (False, True), time_limit=10, cache=False, verify=True,
+                     instances_dir=instances_dir)
+    records = run_batch(jobs, workers=2, verbose=False)
+
+    assert [record['id'] for record in records] == list(range(6))
+    assert [record['height'] for record in records[:4]] == [4, 4, 5, 5]
+    assert all(record['status'] == 'optimal' for record in records[:4])
+    # A missing instance fails its own jobs only
+    assert [record['status'] for record in records[4:]] == ['error', 'error']
+
+
+def running(pid):
+    try:
+        with open('/proc/{}/stat'.format(pid)) as f:
+            return f.read().split()[2] != 'Z'
+    except FileNotFoundError:
+        return False
+
+
+def _group_leader(queue):
+    own_process_group()
+    child = subprocess.Popen(['sleep', '600'])
+    queue.put(child.pid)
+    time.sleep(600)
+
+
+@pytest.mark.skipif(not os.path.isdir('/proc'), reason='reads the state of the processes from /proc')
+def test_kill_process_group():
+    queue = mp.Queue()
+    process = mp.Process(target=_group_leader, args=(queue,), daemon=True)
+    process.start()
+    child = queue.get(timeout=10)
+
+    kill_process_group(process)
+    assert not process.is_alive()
+
+    # The solver started by the job is gone too, at most a zombie waiting for init
+    time.sleep(0.2)
+    assert not running(child)
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from tests.brute import optimal_height, random_instance
+from vlsi.bounds import lower_bound, lower_bounds
+
+
+@pytest.mark.parametrize('rotation', [False, True])
+def test_bounds_below_the_optimum(rotation):
+    rng = np.random.default_rng(1)
+    for _ in range(150):
+        w, r, d = random_instance(rng)
+        optimum = optimal_height(w, r, d, rotation)
+        bounds = lower_bounds(w, r, d, rotation)
+        assert all(bound <= optimum for bound in bounds.values()), (w, r, d, bounds, optimum)
+
+
+def test_bound_of_a_tiling():
+    # The circuits tile a 6 x 5 plate: the area bound is its height
+    r, d = [6, 2, 4, 2, 2], [1, 4, 2, 2, 2]
+    assert lower_bound(6, r, d, False) == lower_bound(6, r, d, True) == 5
+
+
+def test_individual_bounds():
+    # Two circuits wider than half the plate must be stacked
+    assert lower_bounds(10, [6, 6, 1], [2, 3, 1], False)['wide'] == 5
+    assert lower_bounds(10, [6, 6, 1], [2, 3, 1], False)['tallest'] == 3
+    assert lower_bounds(10, [6, 6, 1], [2, 3, 1], False)['area'] == 4
+
+    # Rotated, the circuits may stand side by side: only the area is left
+    assert lower_bounds(10, [6, 6], [2, 2], True)['wide'] == 0
+    assert lower_bound(10, [6, 6], [2, 2], True) == 3
+
+
+def test_rotation_never_raises_the_bound():
+    rng = np.random.default_rng(2)
+    for _ in range(300):
+        w, r, d = random_instance(rng, w_max=10, n_max=8, d_max=8)
+        assert lower_bound(w, r, d, True) <= lower_bound(w, r, d, False)
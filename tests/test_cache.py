@@ -0,0 +1,88 @@
+import os
+
+from vlsi.cache import cache_key, cached_solve, engine_options, evict, lookup, store
+
+W, R, D = 4, [2, 4, 2], [3, 1, 2]
+RESULT = {'height': 4, 'optimal': False, 'time': 1.5, 'lower_bound': 3, 'x': [0, 0, 2], 'y': [0, 3, 0],
+          'dx': [2, 4, 2], 'dy': [3, 1, 2], 'rotations': None}
+
+
+def solve(w, r, d, n, n_ins, rotation, time_limit=300, output=True, warm_start=True, search='default',
+          on_solution=None):
+    solve.calls.append({'time_limit': time_limit, 'warm_start': warm_start, 'search': search})
+    return dict(RESULT, optimal=True)
+
+
+def save_solution(solution, w, n, n_ins, rotation, elapsed_time):
+    # Output of the engine module of the solve, written on the optimal cache hits
+    save_solution.calls.append((solution['x'], solution['height'], n_ins, elapsed_time))
+
+
+def key(options=None):
+    return cache_key(W, R, D, False, 'CP', 10, options or {'search': 'default'})
+
+
+def test_round_trip_in_another_circuit_order(tmp_path):
+    store(key(), RESULT, R, D, str(tmp_path))
+
+    # The same instance with its circuits in another order shares the entry, with the placement following them
+    order = [2, 0, 1]
+    r, d = [R[i] for i in order], [D[i] for i in order]
+    assert cache_key(W, r, d, False, 'CP', 10, {'search': 'default'}) == key()
+    entry = lookup(key(), r, d, str(tmp_path))
+    for name in ('x', 'y', 'dx', 'dy'):
+        assert entry[name] == [RESULT[name][i] for i in order]
+    assert entry['height'] == 4 and entry['lower_bound'] == 3 and not entry['optimal']
+
+
+def test_store_keeps_the_best_result(tmp_path):
+    store(key(), RESULT, R, D, str(tmp_path))
+    store(key(), dict(RESULT, height=5), R, D, str(tmp_path))
+    assert lookup(key(), R, D, str(tmp_path))['height'] == 4
+    store(key(), dict(RESULT, optimal=True), R, D, str(tmp_path))
+    assert lookup(key(), R, D, str(tmp_path))['optimal']
+    store(key(), dict(RESULT, height=None), R, D, str(tmp_path))
+    assert lookup(key(), R, D, str(tmp_path))['height'] == 4
+
+
+def test_keys_of_options_and_time_limits():
+    assert key({'search': 'lns'}) != key()
+    assert cache_key(W, R, D, True, 'CP', 10, {'search': 'default'}) != key()
+    assert cache_key(W, R, D, False, 'CP', 20, {'search': 'default'}) != key()
+
+    # Defaults filled in, options without influence on the result and warm start incumbents left out
+    assert engine_options(solve, {}) == engine_options(solve, {'search': 'default', 'time_limit': 5})
+    assert engine_options(solve, {'warm_start': dict(RESULT)}) == engine_options(solve, {})
+    assert engine_options(solve, {'warm_start': False}) != engine_options(solve, {})
+
+
+def test_cached_solve(tmp_path):
+    solve.calls = []
+    save_solution.calls = []
+
+    # A non-optimal entry is the warm start of the next run, an optimal one is returned as is
+    key = cache_key(W, R, D, False, 'CP', 10, engine_options(solve, {}))
+    store(key, RESULT, R, D, str(tmp_path))
+    result = cached_solve('CP', solve, W, R, D, 3, 1, False, time_limit=10, cache_dir=str(tmp_path))
+    assert result['optimal'] and solve.calls[0]['warm_start']['height'] == 4
+
+    assert save_solution.calls == []
+
+    # The output of the hit is written from the cached placement, unless the output is turned off
+    result = cached_solve('CP', solve, W, R, D, 3, 1, False, time_limit=10, cache_dir=str(tmp_path))
+    assert result['cached'] and len(solve.calls) == 1
+    assert save_solution.calls == [(RESULT['x'], 4, 1, RESULT['time'])]
+
+    cached_solve('CP', solve, W, R, D, 3, 1, False, time_limit=10, output=False, cache_dir=str(tmp_path))
+    assert len(solve.calls) == 1 and len(save_solution.calls) == 1
+
+
+def test_evict_least_recently_used(tmp_path):
+    keys = [key({'search': str(i)}) for i in range(4)]
+    for i, k in enumerate(keys):
+        store(k, RESULT, R, D, str(tmp_path))
+        path = os.path.join(str(tmp_path), k[:2], k + '.json')
+        os.utime(path, (i, i))
+
+    evict(str(tmp_path), max_entries=2)
+    assert [lookup(k, R, D, str(tmp_path)) is not None for k in keys] == [False, False, True, True]
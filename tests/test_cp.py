@@ -0,0 +1,84 @@
+import shutil
+from types import SimpleNamespace
+
+import pytest
+
+from tests.brute import optimal_height, valid_placement
+from vlsi.incumbents import IncumbentStream
+
+pytest.importorskip('minizinc')
+needs_minizinc = pytest.mark.skipif(shutil.which('minizinc') is None, reason='MiniZinc is not installed')
+
+W, R, D = 6, [3, 3, 2, 4, 2], [3, 2, 4, 2, 3]
+
+
+@pytest.fixture
+def engine():
+    from CP.src import CP
+    return CP
+
+
+@needs_minizinc
+@pytest.mark.parametrize('rotation', [False, True])
+def test_flatzinc_matches_the_model(engine, rotation, tmp_path, monkeypatch):
+    monkeypatch.setattr(engine, 'FLATZINC_DIR', str(tmp_path))
+    best = optimal_height(W, R, D, rotation)
+
+    # Compiled on the first run, reused by the second one
+    for _ in range(2):
+        result = engine.solve_instance(W, R, D, len(R), 0, rotation, time_limit=30, output=False, warm_start=False,
+                                       flatzinc=True)
+        assert result['optimal'] and result['height'] == best
+        assert valid_placement(W, result, R, D, rotation)
+    assert len(list(tmp_path.glob('*.ozn'))) == 1
+
+
+def test_solution_placement(engine):
+    # The solutions of the no-rotation model have no dx, dy or rotation
+    solution = SimpleNamespace(height=5, x=[0, 3], y=[0, 0])
+    assert engine.solution_placement(solution, False, [3, 2], [5, 4]) == \
+        {'height': 5, 'x': [0, 3], 'y': [0, 0], 'dx': [3, 2], 'dy': [5, 4], 'rotations': None}
+
+    solution = SimpleNamespace(height=5, x=[0, 3], y=[0, 0], dx=[3, 4], dy=[5, 2], rotation=[False, True])
+    assert engine.solution_placement(solution, True, [3, 2], [5, 4])['dx'] == [3, 4]
+
+
+@pytest.mark.parametrize('rotation', [False, True])
+def test_lns_neighbourhoods(engine, rotation, monkeypatch):
+    calls = []
+
+    def solve_model(solver, path, rotation, r, d, data, constraints, start, stream, time_limit, options, *args,
+                    **kwargs):
+        # Solutions shaped as the ones of the models, the first neighbourhood lowers the height by one
+        calls.append((data, constraints))
+        if len(calls) > 1:
+            return None, engine.Status.UNKNOWN
+        values = {'height': start['height'] - 1, 'x': start['x'], 'y': start['y']}
+        if rotation:
+            values.update(dx=start['dx'], dy=start['dy'], rotation=start['rotations'])
+        return SimpleNamespace(**values), engine.Status.SATISFIED
+
+    monkeypatch.setattr(engine, 'solve_model', solve_model)
+    monkeypatch.setattr(engine, 'LNS_STEP', 0.5)
+    start = {'height': 9, 'x': [0, 3, 0], 'y': [0, 0, 5], 'dx': [3, 3, 2], 'dy': [5, 4, 4],
+             'rotations': [False, False, False] if rotation else None}
+    solution, status = engine.lns_search(None, 'model.mzn', rotation, 6, 3, [3, 3, 2], [5, 4, 4], [], start, 4, None,
+                                         IncumbentStream(), 1.5, {}, 0, 'none')
+
+    # The second neighbourhood starts from the first one, and must lower its height
+    assert solution.height == 8 and status == engine.Status.SATISFIED and len(calls) >= 2
+    data, constraints = calls[1]
+    assert 'constraint height <= 7;' in constraints
+    assert ('start_rotation' in data) == rotation
+    assert any(c.startswith('constraint rotation[') for c in constraints) == rotation
+
+
+@needs_minizinc
+@pytest.mark.parametrize('rotation', [False, True])
+@pytest.mark.parametrize('search', ['lns', 'probe'])
+def test_searches_are_optimal(engine, rotation, search):
+    best = optimal_height(W, R, D, rotation)
+    for warm_start in (True, False):
+        result = engine.solve_instance(W, R, D, len(R), 0, rotation, time_limit=30, output=False,
+                                       warm_start=warm_start, search=search, probes=2)
+        assert result['height'] == best and valid_placement(W, result, R, D, rotation)
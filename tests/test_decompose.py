@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from tests.brute import random_instance, valid_placement
+from vlsi import heuristics
+from vlsi.bounds import lower_bound
+from vlsi.decompose import drop, make_bands, solve_instance, stack
+
+
+def test_bands_of_similar_heights():
+    rng = np.random.default_rng(0)
+    for _ in range(100):
+        w, r, d = random_instance(rng, w_max=10, n_max=40, d_max=10)
+        for rotation in (False, True):
+            bands = make_bands(w, r, d, rotation, max_circuits=6)
+            assert sorted(i for band in bands for i in band) == list(range(len(r)))
+            assert all(0 < len(band) <= 6 for band in bands)
+
+            # Bands of decreasing heights
+            height = [max(r[i], d[i]) if rotation else d[i] for i in range(len(r))]
+            assert all(min(height[i] for i in upper) >= max(height[i] for i in lower)
+                       for upper, lower in zip(bands, bands[1:]))
+
+
+def test_drop_keeps_a_valid_packing():
+    rng = np.random.default_rng(1)
+    for _ in range(200):
+        w, r, d = random_instance(rng, w_max=8, n_max=8)
+
+        # Every circuit on a row of its own, at a random x
+        x = [int(rng.integers(0, w - r[i] + 1)) for i in range(len(r))]
+        y = np.concatenate([[0], np.cumsum(d)[:-1]]).tolist()
+        new_y = drop(x, y, r, d).tolist()
+        result = {'height': max(new_y[i] + d[i] for i in range(len(r))), 'x': x, 'y': new_y, 'dx': r, 'dy': d}
+        assert valid_placement(w, result, r, d, False)
+        assert all(new_y[i] <= y[i] for i in range(len(r)))
+
+        # Every circuit lies on the floor or on a circuit below it
+        for i in range(len(r)):
+            assert new_y[i] == 0 or any(new_y[j] + d[j] == new_y[i] and x[j] < x[i] + r[i] and x[i] < x[j] + r[j]
+                                        for j in range(len(r)))
+
+
+def test_drop_fills_a_gap():
+    # A narrow circuit left above a lower neighbour comes down next to the tall one
+    assert drop([0, 2], [0, 3], [2, 2], [3, 1]).tolist() == [0, 0]
+
+
+@pytest.mark.parametrize('rotation', [False, True])
+def test_stacked_bands(rotation):
+    rng = np.random.default_rng(2)
+    for _ in range(50):
+        w, r, d = random_instance(rng, w_max=10, n_max=30, d_max=8)
+        bands = make_bands(w, r, d, rotation, max_circuits=5)
+        results = [heuristics.greedy_pack(w, [r[i] for i in band], [d[i] for i in band], rotation) for band in bands]
+        packing = stack(w, len(r), rotation, bands, results)
+        assert valid_placement(w, packing, r, d, rotation)
+        assert packing['height'] <= sum(result['height'] for result in results)
+
+
+@pytest.mark.parametrize('rotation', [False, True])
+def test_decomposition(rotation):
+    pytest.importorskip('z3')
+    rng = np.random.default_rng(3)
+    w, r, d = 10, rng.integers(1, 6, 20).tolist(), rng.integers(1, 7, 20).tolist()
+    result = solve_instance(w, r, d, len(r), 0, rotation, approach='SMT', time_limit=20, max_circuits=6, workers=2,
+                            output=False, cache=False)
+    assert valid_placement(w, result, r, d, rotation)
+    assert len(result['bands']) >= 4 and result['lower_bound'] == lower_bound(w, r, d, rotation)
+    assert result['height'] <= heuristics.greedy_pack(w, r, d, rotation)['height']
+    assert result['optimal'] == (result['height'] <= result['lower_bound'])
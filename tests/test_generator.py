@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from tests.brute import optimal_height
+from vlsi.bounds import lower_bound, lower_bounds
+from vlsi.generator import cut_range, generate, guillotine, read_optimum, write_dzn
+
+
+@pytest.mark.parametrize('n, w, height', [(1, 5, 5), (10, 8, 8), (100, 30, 40), (500, 60, 60)])
+def test_guillotine_tiles_the_plate(n, w, height):
+    r, d = guillotine(w, height, n, seed=n)
+    assert len(r) == len(d) == n
+    assert sum(r[i] * d[i] for i in range(n)) == w * height
+    assert min(r) >= 1 and min(d) >= 1 and max(r) <= w and max(d) <= height
+
+
+def test_guillotine_is_deterministic():
+    assert guillotine(20, 20, 30, seed=3) == guillotine(20, 20, 30, seed=3)
+    assert guillotine(20, 20, 30, seed=3) != guillotine(20, 20, 30, seed=4)
+
+
+def test_guillotine_rejects_too_many_circuits():
+    with pytest.raises(ValueError):
+        guillotine(2, 2, 5)
+
+
+def test_aspect_ratio():
+    w, r, d, height = generate(200, 60, seed=0, max_aspect=3.0)
+    aspects = np.maximum(r, d) / np.minimum(r, d)
+    assert aspects.max() <= 3.0
+
+
+@pytest.mark.parametrize('rotation', [False, True])
+def test_generated_height_is_optimal(rotation):
+    for seed in range(20):
+        w, r, d, height = generate(4, 4, 5, seed=seed)
+        assert optimal_height(w, r, d, rotation) == height
+
+
+@pytest.mark.parametrize('rotation', [False, True])
+def test_bounds_of_generated_instances(rotation):
+    # The circuits tile a w x H plate: the area bound is H and no bound may exceed it
+    for seed in range(10):
+        w, r, d, height = generate(30, 12, 15, seed=seed)
+        assert lower_bounds(w, r, d, rotation)['area'] == height
+        assert lower_bound(w, r, d, rotation) == height
+
+
+def test_cut_range():
+    assert cut_range(1, 5, 4.0, 0.2) is None
+    low, high = cut_range(10, 10, 4.0, 0.2)
+    assert 2 <= low <= high <= 8
+
+
+def test_written_instance(tmp_path):
+    w, r, d, height = generate(12, 10, 7, seed=1)
+    write_dzn(str(tmp_path / 'ins-1.dzn'), w, r, d, height, seed=1)
+    assert read_optimum(str(tmp_path / 'ins-1.dzn')) == 7
+    assert read_optimum(str(tmp_path / 'missing.dzn')) is None
+    with open(str(tmp_path / 'ins-1.dzn')) as f:
+        assert 'n = 12;' in f.read()
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from tests.brute import optimal_height, random_instance, valid_placement
+from vlsi.heuristics import greedy_pack, initial_packing
+from vlsi.preprocessing import preprocess
+
+
+@pytest.mark.parametrize('rotation', [False, True])
+def test_greedy_packing_is_valid_and_above_the_optimum(rotation):
+    rng = np.random.default_rng(3)
+    for _ in range(150):
+        w, r, d = random_instance(rng)
+        packing = greedy_pack(w, r, d, rotation)
+        assert valid_placement(w, packing, r, d, rotation)
+        assert packing['height'] >= optimal_height(w, r, d, rotation)
+
+
+@pytest.mark.parametrize('rotation', [False, True])
+def test_warm_start_satisfies_the_symmetry_breaking(rotation):
+    rng = np.random.default_rng(4)
+    for _ in range(200):
+        w, r, d = random_instance(rng, w_max=10, n_max=12, d_max=6)
+        # Duplicated circuits, so that the identical groups are not empty
+        r, d = r + r[:2], d + d[:2]
+        pre = preprocess(w, r, d, rotation)
+        start = initial_packing(w, r, d, rotation, pre)
+
+        assert valid_placement(w, start, r, d, rotation)
+        assert start['height'] * w >= sum(r[i] * d[i] for i in range(len(r)))
+        assert all(start['y'][a] <= start['y'][b] for a, b in pre['ordered_pairs'])
+        assert start['x'] <= [w - start['x'][i] - start['dx'][i] for i in range(len(r))]
+
+
+def test_warm_start_options():
+    w, r, d = 4, [2, 2, 4], [3, 3, 1]
+    pre = preprocess(w, r, d, False)
+    assert initial_packing(w, r, d, False, pre, False) is None
+    assert initial_packing(w, r, d, False, pre)['height'] == 4
+
+    # A known packing only replaces a higher greedy one
+    stacked = {'height': 7, 'x': [0, 0, 0], 'y': [0, 3, 6], 'dx': [2, 2, 4], 'dy': [3, 3, 1], 'rotations': None}
+    assert initial_packing(w, r, d, False, pre, stacked)['height'] == 4
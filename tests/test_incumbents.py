@@ -0,0 +1,70 @@
+import multiprocessing as mp
+
+import pytest
+
+from vlsi.incumbents import IncumbentStream, primal_gap, primal_integral
+
+
+def test_only_improving_heights_are_streamed():
+    received = []
+    stream = IncumbentStream(received.append, start_time=0.0)
+    for height in (9, 9, 7, 8, 5):
+        stream.emit(height, [0], [0], [1], [height])
+    assert [height for _, height in stream.timeline] == [9, 7, 5]
+    assert [incumbent['height'] for incumbent in received] == [9, 7, 5]
+    assert stream.best == 5 and stream.first_time == stream.timeline[0][0]
+
+
+def test_placement_back_in_the_order_of_the_instance():
+    received = []
+    # The engine works on the circuits 2, 0, 1 of the instance
+    stream = IncumbentStream(received.append, order=[2, 0, 1])
+    stream.emit(4, [0, 1, 2], [3, 4, 5], [1, 1, 1], [2, 2, 2], [1, 0, 0])
+    incumbent = received[0]
+    assert incumbent['x'] == [1, 2, 0] and incumbent['y'] == [4, 5, 3]
+    assert incumbent['rotations'] == [False, False, True]
+
+
+def test_callback_stops_and_bound_is_shared():
+    bound = mp.Value('i', 0)
+    stream = IncumbentStream(lambda incumbent: incumbent['height'] <= 6, bound=bound)
+    assert not stream.emit(8, [0], [0], [1], [8])
+    assert bound.value == 8
+    assert stream.emit(6, [0], [0], [1], [6])
+    assert bound.value == 6
+
+    # A lower height of another engine is kept
+    bound.value = 3
+    IncumbentStream(bound=bound).emit(5, [0], [0], [1], [5])
+    assert bound.value == 3
+
+
+def test_primal_integral():
+    assert primal_gap(None, 10) == 1.0
+    assert primal_gap(10, 10) == 0.0
+    assert primal_gap(8, 10) == pytest.approx(0.2)
+
+    # Gap 1 until the first incumbent at 2, then 0.5 until 6, then 0
+    timeline = [(2.0, 20), (6.0, 10)]
+    assert primal_integral(timeline, 10, 10) == pytest.approx(2 + 0.5*4)
+
+    # Incumbents found after the time limit don't count
+    assert primal_integral([(12.0, 10)], 10, 10) == pytest.approx(10)
+    assert primal_integral([], 10, 10) == pytest.approx(10)
+    assert primal_integral([(0.0, 10)], 10, 10) == 0.0
+
+
+def test_engine_streams_its_incumbents():
+    SMT = pytest.importorskip('SMT.src.SMT')
+    w, r, d = 6, [3, 3, 2, 4, 2], [3, 2, 4, 2, 3]
+    received = []
+    result = SMT.solve_instance(w, r, d, len(r), 0, False, time_limit=30, output=False, warm_start=False,
+                                on_solution=received.append)
+
+    # Strictly improving heights ending on the returned one, with the timeline returned by the engine
+    heights = [incumbent['height'] for incumbent in received]
+    assert heights == sorted(heights, reverse=True) and len(set(heights)) == len(heights)
+    assert heights[-1] == result['height']
+    assert [height for _, height in result['incumbents']] == heights
+    last = received[-1]
+    assert max(last['y'][i] + last['dy'][i] for i in range(len(r))) == result['height']
@@ -0,0 +1,58 @@
+import glob
+import os
+
+import pytest
+
+from vlsi import instances
+from vlsi.engines import ROOT_DIR
+from vlsi.instances import get_instance, open_store, parse_dzn, read_dzn
+
+
+@pytest.fixture(autouse=True)
+def store_dir(tmp_path, monkeypatch):
+    # Stores compiled into a temporary folder, and not shared with the other tests of the process
+    monkeypatch.setattr(instances, 'CACHE_DIR', str(tmp_path / 'store'))
+    monkeypatch.setattr(instances, '_stores', {})
+
+
+def test_parse_dzn():
+    text = """% generated instance
+    n = 3;   d = [3,
+                  3, 1];  % heights
+    w = 4;
+    r = array1d(1..3, [2, 2, 4]);
+    """
+    assert parse_dzn(text) == {'n': 3, 'd': [3, 3, 1], 'w': 4, 'r': [2, 2, 4]}
+
+
+def test_read_dzn_errors(tmp_path):
+    path = tmp_path / 'bad.dzn'
+    path.write_text('w = 4; n = 2; r = [1, 2];')
+    with pytest.raises(ValueError, match='missing d'):
+        read_dzn(str(path))
+    path.write_text('w = 4; n = 3; r = [1, 2]; d = [1, 1];')
+    with pytest.raises(ValueError, match='n = 3'):
+        read_dzn(str(path))
+
+
+def test_repository_instances():
+    folder = os.path.join(ROOT_DIR, 'CP', 'instances')
+    for path in glob.glob(os.path.join(folder, '*.dzn')):
+        name = os.path.basename(path)[:-4]
+        assert get_instance(folder, name) == read_dzn(path)
+
+
+def test_store_is_rebuilt_when_a_file_changes(tmp_path):
+    folder = tmp_path / 'instances'
+    folder.mkdir()
+    (folder / 'ins-1.dzn').write_text('w = 4; n = 3; r = [2, 2, 4]; d = [3, 3, 1];')
+    (folder / 'ins-2.dzn').write_text('w = 5; n = 1; r = [5]; d = [2];')
+    assert get_instance(str(folder), 'ins-2') == (5, [5], [2], 1)
+    assert os.path.exists(os.path.join(instances.cache_path(str(folder)), 'manifest.json'))
+
+    (folder / 'ins-2.dzn').write_text('w = 6; n = 2; r = [3, 3]; d = [1, 2];')
+    (folder / 'ins-3.dzn').write_text('w = 2; n = 1; r = [1]; d = [1];')
+    store = open_store(str(folder), refresh=True)
+    assert sorted(store['index']) == ['ins-1', 'ins-2', 'ins-3']
+    assert get_instance(str(folder), 'ins-1') == (4, [2, 2, 4], [3, 3, 1], 3)
+    assert get_instance(str(folder), 'ins-2') == (6, [3, 3], [1, 2], 2)
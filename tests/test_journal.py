@@ -0,0 +1,114 @@
+import json
+import multiprocessing as mp
+
+import pytest
+
+from vlsi.journal import finished, job_key, journaled_solve, main, read_journal
+from vlsi.jsonl import append
+
+W, R, D = 4, [2, 4, 2], [3, 1, 3]
+PLACEMENTS = {
+    5: {'x': [0, 0, 2], 'y': [0, 4, 1], 'dx': [2, 4, 2], 'dy': [3, 1, 3], 'rotations': None},
+    4: {'x': [0, 0, 2], 'y': [0, 3, 0], 'dx': [2, 4, 2], 'dy': [3, 1, 3], 'rotations': None},
+}
+
+
+class Killed(Exception):
+    pass
+
+
+def solve(w, r, d, n, n_ins, rotation, time_limit=300, warm_start=True, on_solution=None):
+
+    # Streams its incumbents down to the height it is allowed to reach, then is killed or completes
+    solve.calls.append(warm_start)
+    for height in (5, 4):
+        if height >= solve.reach:
+            on_solution(dict(PLACEMENTS[height], height=height, time=0.1))
+    if solve.killed:
+        raise Killed()
+    return dict(PLACEMENTS[solve.reach], height=solve.reach, optimal=solve.reach == 4, lower_bound=4, time=1.0)
+
+
+@pytest.fixture
+def journal(tmp_path):
+    solve.calls, solve.reach, solve.killed = [], 4, False
+    return str(tmp_path / 'sweep.jsonl')
+
+
+def run(journal, time_limit=10):
+    return journaled_solve(journal, 'CP', solve, W, R, D, 3, 1, False, time_limit=time_limit, cache=False)
+
+
+def test_interrupted_job_resumes_from_its_best_incumbent(journal):
+    solve.killed = True
+    with pytest.raises(Killed):
+        run(journal)
+
+    job = read_journal(journal)[job_key('CP', solve, W, R, D, False, {})]
+    assert job['runs'] == 1 and 'running' in job and job['done'] is None
+    assert job['best']['height'] == 4
+
+    solve.killed = False
+    result = run(journal)
+    assert result['optimal'] and solve.calls[1]['height'] == 4
+    assert solve.calls[1]['x'] == PLACEMENTS[4]['x']
+
+
+def test_finished_jobs_are_not_run_again(journal):
+    assert run(journal)['optimal']
+    assert run(journal, time_limit=100)['journaled']
+    assert len(solve.calls) == 1
+
+
+def test_longer_time_limit_continues_a_feasible_job(journal):
+    solve.reach = 5
+    run(journal)
+    assert run(journal)['journaled']
+
+    solve.reach = 4
+    assert run(journal, time_limit=20)['optimal']
+    assert len(solve.calls) == 2 and solve.calls[1]['height'] == 5
+
+
+def test_truncated_last_line(journal):
+    append(journal, {'event': 'start', 'key': 'a', 'name': 'job'})
+    append(journal, {'event': 'incumbent', 'key': 'a', 'height': 7})
+    with open(journal, 'a') as f:
+        f.write('{"event": "done", "key"')
+    job = read_journal(journal)['a']
+    assert job['best']['height'] == 7 and job['done'] is None
+
+
+def test_finished():
+    done = {'time_limit': 10, 'result': {'height': 5, 'optimal': False, 'lower_bound': 4}}
+    assert finished({'done': done}, 10) and not finished({'done': done}, 20)
+    assert finished({'done': dict(done, result={'height': 4, 'optimal': False, 'lower_bound': 4})}, 20)
+    assert not finished({'done': None}, 1)
+
+
+def append_many(path, k):
+    for i in range(200):
+        append(path, {'writer': k, 'i': i, 'padding': 'x' * 500})
+
+
+def test_concurrent_appends(tmp_path):
+    path = str(tmp_path / 'shared.jsonl')
+    processes = [mp.Process(target=append_many, args=(path, k)) for k in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    # Whole lines only, none lost
+    with open(path) as f:
+        records = [json.loads(line) for line in f]
+    assert sorted((record['writer'], record['i']) for record in records) == [(k, i) for k in range(4)
+                                                                             for i in range(200)]
+
+
+def test_summary(journal, capsys):
+    solve.reach = 5
+    run(journal)
+    main([journal])
+    line = capsys.readouterr().out.splitlines()[1]
+    assert line.split()[-4:] == ['5', '4', '10', 'feasible']
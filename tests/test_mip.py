@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from tests.brute import optimal_height, random_instance, valid_placement
+
+gp = pytest.importorskip('gurobipy')
+
+
+@pytest.fixture(scope='module')
+def engine():
+    # Any licence, the size-limited one included, solves these instances
+    try:
+        gp.Model().dispose()
+    except gp.GurobiError as e:
+        pytest.skip('no Gurobi licence: {}'.format(e))
+    from MIP.src import MIP
+    return MIP
+
+
+@pytest.mark.parametrize('rotation', [False, True])
+def test_matrix_model_is_optimal(engine, rotation):
+    rng = np.random.default_rng(8)
+    for _ in range(15):
+        w, r, d = random_instance(rng)
+        result = engine.solve_instance(w, r, d, len(r), 0, rotation, time_limit=20, threads=1, output=False,
+                                       warm_start=False)
+        assert result['optimal'] and result['height'] == optimal_height(w, r, d, rotation), (w, r, d)
+        assert valid_placement(w, result, r, d, rotation)
+
+
+@pytest.mark.parametrize('rotation', [False, True])
+def test_lazy_model_is_optimal(engine, rotation):
+    rng = np.random.default_rng(9)
+    for _ in range(15):
+        w, r, d = random_instance(rng)
+        result = engine.solve_instance(w, r, d, len(r), 0, rotation, time_limit=20, threads=1, output=False,
+                                       warm_start=False, lazy=True)
+        assert result['optimal'] and result['height'] == optimal_height(w, r, d, rotation), (w, r, d)
+        assert valid_placement(w, result, r, d, rotation)
+
+
+def test_lazy_model_has_fewer_rows(engine):
+    # Same binaries (callbacks can't add columns), the no-overlap rows only come when violated
+    w, r, d = 5, [3, 2, 2, 3], [2, 2, 3, 3]
+    full = engine.solve_instance(w, r, d, 4, 0, True, time_limit=20, threads=1, output=False, warm_start=False)
+    lazy = engine.solve_instance(w, r, d, 4, 0, True, time_limit=20, threads=1, output=False, warm_start=False,
+                                 lazy=True)
+    assert lazy['height'] == full['height']
+    assert lazy['profile']['model']['binary_variables'] == full['profile']['model']['binary_variables']
+    assert lazy['profile']['model']['constraints'] < full['profile']['model']['constraints']
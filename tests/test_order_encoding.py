@@ -0,0 +1,45 @@
+import itertools
+
+import numpy as np
+import pytest
+from z3 import BoolVal, Not, Solver, sat
+
+from SMT.src.order_encoding import before, decode, order_axioms, order_lit, order_vars
+from SMT.src.SMT import solve_instance
+from tests.brute import optimal_height, random_instance, valid_placement
+
+
+def fix(p, value):
+    # v == value in the order encoding
+    return [order_lit(p, value), Not(order_lit(p, value - 1))]
+
+
+def test_decode():
+    p = order_vars('v', 5)
+    for value in range(6):
+        solver = Solver()
+        solver.add(order_axioms(p) + fix(p, value))
+        assert solver.check() == sat and decode(solver.model(), p) == value
+
+
+def test_before():
+    # lit -> v_i + size <= v_j, for every pair of values of the domain
+    for size, upper in ((1, 3), (2, 4), (3, 4)):
+        p_i, p_j = order_vars('i', upper), order_vars('j', upper)
+        for v_i, v_j in itertools.product(range(upper + 1), repeat=2):
+            solver = Solver()
+            solver.add(order_axioms(p_i) + order_axioms(p_j) + fix(p_i, v_i) + fix(p_j, v_j))
+            solver.add(before(p_i, p_j, BoolVal(True), size))
+            assert (solver.check() == sat) == (v_i + size <= v_j), (size, upper, v_i, v_j)
+
+
+@pytest.mark.parametrize('rotation', [False, True])
+@pytest.mark.parametrize('search', ['bisection', 'linear'])
+def test_order_backend_is_optimal(rotation, search):
+    rng = np.random.default_rng(6)
+    for _ in range(15):
+        w, r, d = random_instance(rng)
+        result = solve_instance(w, r, d, len(r), 0, rotation, time_limit=20, output=False, backend='order',
+                                search=search, warm_start=False)
+        assert result['optimal'] and result['height'] == optimal_height(w, r, d, rotation), (w, r, d)
+        assert valid_placement(w, result, r, d, rotation)
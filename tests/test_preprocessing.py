@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from tests.brute import optimal_height, random_instance
+from vlsi.preprocessing import forced_orientations, identical_groups, preprocess, vertical_pairs
+
+
+def test_forced_orientations():
+    # Square, too tall to rotate, too wide not to rotate, free
+    assert forced_orientations(5, [2, 1, 7, 2], [2, 6, 3, 3]) == {0: False, 1: False, 2: True}
+
+
+def test_vertical_pairs():
+    assert vertical_pairs(5, [3, 3, 2, 1]) == [(0, 1)]
+    # With rotations the narrowest orientation decides
+    assert preprocess(5, [3, 3], [2, 4], True)['vertical_pairs'] == []
+    assert preprocess(5, [3, 3], [2, 4], False)['vertical_pairs'] == [(0, 1)]
+
+
+def test_identical_groups():
+    r, d = [2, 3, 2, 2, 1], [3, 2, 3, 3, 1]
+    assert identical_groups(r, d, False) == [[0, 2, 3]]
+    assert identical_groups(r, d, True) == [[0, 1, 2, 3]]
+    assert preprocess(4, r, d, False)['ordered_pairs'] == [(0, 2), (2, 3)]
+
+
+@pytest.mark.parametrize('rotation', [False, True])
+def test_preprocessing_keeps_the_optimum(rotation):
+    rng = np.random.default_rng(5)
+    for _ in range(60):
+        w, r, d = random_instance(rng, n_max=3)
+        # Duplicated circuits, so that the identical groups are not empty
+        r, d = r + r[:1], d + d[:1]
+        pre = preprocess(w, r, d, rotation)
+        assert optimal_height(w, r, d, rotation, pre) == optimal_height(w, r, d, rotation), (w, r, d, pre)
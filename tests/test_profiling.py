@@ -0,0 +1,119 @@
+import cProfile
+import contextvars
+import json
+import threading
+import tracemalloc
+
+import pytest
+
+from vlsi import profiling
+from vlsi.cache import engine_options
+
+
+@pytest.fixture(autouse=True)
+def settings(tmp_path, monkeypatch):
+    # No profile file or Python hook unless a test configures one
+    monkeypatch.delenv('VLSI_PROFILE', raising=False)
+    monkeypatch.delenv('VLSI_PROFILE_PYTHON', raising=False)
+    monkeypatch.setattr(profiling, '_settings', {'path': None, 'python': None})
+    monkeypatch.setattr(profiling, 'PROFILES_DIR', str(tmp_path / 'profiles'))
+
+
+def run(w, r, d, n, n_ins, rotation, time_limit=300, seed=None, fail=False):
+
+    # A fake engine going through the phases of a run
+    profiling.lap('preprocess')
+    sum(i * i for i in range(10000))
+    # Failing while building, with the Python hooks still running
+    if fail:
+        raise RuntimeError('model too large')
+    profiling.lap('build')
+    profiling.record(model={'variables': 10}, solver={'nodes': 5, 'status': 'a'})
+    profiling.record(model={'variables': 12}, solver={'nodes': 7, 'status': 'b'})
+    profiling.lap('solve')
+    profiling.lap('solve')
+    return {'height': 4, 'optimal': True}
+
+
+solve = profiling.instrument('CP')(run)
+
+
+def test_run_profile():
+    result = solve(4, [2, 2], [2, 2], 2, 7, False, time_limit=10)
+    profile = result['profile']
+    assert (profile['approach'], profile['instance'], profile['n'], profile['time_limit']) == ('CP', 7, 2, 10)
+    assert profile['height'] == 4 and profile['optimal']
+
+    # Phases in order, repeated ones added up, the model of the last call and the statistics summed
+    assert list(profile['phases']) == ['preprocess', 'build', 'solve', 'output']
+    assert sum(phase['wall'] for phase in profile['phases'].values()) == pytest.approx(profile['wall'])
+    assert profile['model'] == {'variables': 12}
+    assert profile['solver'] == {'nodes': 12, 'status': 'b'}
+
+    assert profile['peak_rss_mb'] is None or profile['peak_rss_mb'] > 0
+    assert profile['lifetime_peak_rss_mb'] > 0 and profile['children_lifetime_peak_rss_mb'] >= 0
+
+
+def test_signature_kept_for_the_cache():
+    assert engine_options(solve, {'seed': 3}) == engine_options(run, {'seed': 3}) == {'seed': 3, 'fail': False}
+
+
+def test_hooks_outside_of_a_run():
+    profiling.lap('build')
+    profiling.record(solver={'nodes': 1})
+
+
+def test_records_of_threads():
+    def member():
+        profiling.record(solver={'conflicts': 1})
+
+    @profiling.instrument('SMT')
+    def portfolio(w, r, d, n, n_ins, rotation, time_limit=300):
+        # Only the threads run in a copy of the context see the profile of the run
+        threads = [threading.Thread(target=contextvars.copy_context().run, args=(member,)) for _ in range(3)]
+        threads.append(threading.Thread(target=member))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return {'height': None}
+
+    assert portfolio(4, [2], [2], 1, 1, False)['profile']['solver'] == {'conflicts': 3}
+
+
+def test_profile_file(tmp_path):
+    path = str(tmp_path / 'profile.jsonl')
+    profiling.configure(path)
+    solve(4, [2, 2], [2, 2], 2, 1, False)
+    solve(4, [2, 2], [2, 2], 2, 2, True)
+    with open(path) as f:
+        runs = [json.loads(line) for line in f]
+    assert [(run['instance'], run['rotation']) for run in runs] == [(1, False), (2, True)]
+
+    with pytest.raises(ValueError):
+        profiling.configure(python='perf')
+
+
+def test_cprofile():
+    profiling.configure(python='cprofile')
+    python = solve(4, [2, 2], [2, 2], 2, 1, False)['profile']['python']
+    assert python['functions'] and any('run' in function['function'] for function in python['functions'])
+
+    # Stopped after a failed run too: another profiler can start
+    with pytest.raises(RuntimeError):
+        solve(4, [2, 2], [2, 2], 2, 1, False, fail=True)
+    profiler = cProfile.Profile()
+    profiler.enable()
+    profiler.disable()
+
+
+def test_tracemalloc():
+    profiling.configure(python='tracemalloc')
+    python = solve(4, [2, 2], [2, 2], 2, 1, False)['profile']['python']
+    assert python['peak_mb'] >= 0 and python['allocations']
+    assert not tracemalloc.is_tracing()
+
+    # Stopped after a failed run too
+    with pytest.raises(RuntimeError):
+        solve(4, [2, 2], [2, 2], 2, 1, False, fail=True)
+    assert not tracemalloc.is_tracing()
@@ -0,0 +1,86 @@
+import os
+import threading
+import time
+
+import pytest
+
+from tests.brute import valid_placement
+from vlsi import instances
+from vlsi.engines import ROOT_DIR
+from vlsi.generator import generate
+from vlsi.instances import read_dzn
+from vlsi.service import SolveService, make_request, make_server, request
+
+pytest.importorskip('z3')
+
+W, R, D = 6, [3, 3, 2, 4, 2], [3, 2, 4, 2, 3]
+
+
+def test_make_request(tmp_path, monkeypatch):
+    monkeypatch.setattr(instances, 'CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(instances, '_stores', {})
+
+    job = make_request({'w': W, 'r': R, 'd': D, 'approach': 'SMT', 'options': {'output': True, 'search': 'linear'}})
+    assert job == {'w': W, 'r': R, 'd': D, 'approach': 'SMT', 'rotation': False, 'time_limit': 300,
+                   'options': {'search': 'linear'}, 'cache': True}
+
+    w, r, d, n = read_dzn(os.path.join(ROOT_DIR, 'CP', 'instances', 'ins-1.dzn'))
+    job = make_request({'instance': 1, 'rotation': True})
+    assert (job['w'], job['r'], job['d'], job['approach'], job['rotation']) == (w, r, d, 'MIP', True)
+
+    with pytest.raises(ValueError):
+        make_request({'w': W, 'r': R, 'd': D[:2]})
+    with pytest.raises(ValueError):
+        make_request({'w': W, 'r': R, 'd': D, 'approach': 'SMT'}, approaches=('MIP',))
+
+
+@pytest.fixture(scope='module')
+def service(tmp_path_factory):
+    # One warm SMT worker behind a Unix socket
+    service = SolveService(workers=1, approaches=('SMT',), grace=1)
+    socket_path = str(tmp_path_factory.mktemp('service') / 'vlsi.sock')
+    server = make_server(service, socket_path=socket_path)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield service, socket_path
+    server.shutdown()
+    server.server_close()
+    service.close()
+
+
+def test_solve_over_http(service):
+    service, socket_path = service
+    for rotation in (False, True):
+        view = request('POST', '/solve', {'w': W, 'r': R, 'd': D, 'approach': 'SMT', 'rotation': rotation,
+                                          'time_limit': 30, 'cache': False}, socket_path=socket_path)
+        assert view['status'] == 'done' and view['n'] == len(R)
+        assert valid_placement(W, view['result'], R, D, rotation) and view['result']['optimal']
+
+    health = request('GET', '/health', socket_path=socket_path)
+    assert health['workers'] == health['ready'] == 1 and health['busy'] == 0
+
+    with pytest.raises(RuntimeError):
+        request('GET', '/jobs/12345', socket_path=socket_path)
+    with pytest.raises(RuntimeError):
+        request('POST', '/solve', {'w': W, 'r': R}, socket_path=socket_path)
+
+
+def test_cancel(service):
+    service, socket_path = service
+    w, r, d, height = generate(80, 20, seed=0)
+    body = {'w': w, 'r': r, 'd': d, 'approach': 'SMT', 'rotation': True, 'time_limit': 120, 'cache': False}
+
+    # A queued job is cancelled at once, a running one is stopped or its worker killed after the grace period
+    running = service.submit(body)
+    queued = service.submit(body)
+    assert service.cancel(queued)['status'] == 'cancelled'
+    while service.get(running)['status'] == 'queued':
+        time.sleep(0.1)
+    start = time.time()
+    request('DELETE', '/jobs/{}'.format(running), socket_path=socket_path)
+    assert service.wait(running, 30)['status'] == 'cancelled'
+    assert time.time() - start < 30
+
+    # The worker, or the one replacing it, solves the next jobs
+    view = service.wait(service.submit({'w': W, 'r': R, 'd': D, 'approach': 'SMT', 'cache': False}), 60)
+    assert view['status'] == 'done' and view['result']['height'] is not None
@@ -0,0 +1,31 @@
+import pytest
+
+from tests.brute import optimal_height, valid_placement
+
+z3 = pytest.importorskip('z3')
+
+W, R, D = 6, [3, 3, 2, 4, 2], [3, 2, 4, 2, 3]
+
+
+def solve_instance(*args, **kwargs):
+    from SMT.src.SMT import solve_instance
+    return solve_instance(*args, **kwargs)
+
+
+@pytest.mark.parametrize('backend, search, portfolio', [('int', 'optimize', 1), ('int', 'bisection', 1),
+                                                        ('int', 'bisection', 2), ('order', 'bisection', 1)])
+def test_seed_stays_in_its_solvers(backend, search, portfolio):
+    for rotation in (False, True):
+        result = solve_instance(W, R, D, len(R), 0, rotation, time_limit=30, output=False, warm_start=False, seed=7,
+                                backend=backend, search=search, portfolio=portfolio)
+        assert result['height'] == optimal_height(W, R, D, rotation) and valid_placement(W, result, R, D, rotation)
+
+    # The global parameters of z3 are left to the other solvers of the process
+    assert z3.get_param('smt.random_seed') == '0' and z3.get_param('sat.random_seed') == '0'
+
+
+def test_portfolio_statistics_reach_the_profile():
+    result = solve_instance(W, R, D, len(R), 0, True, time_limit=30, output=False, warm_start=False, search='bisection',
+                            portfolio=2)
+    solver = result['profile']['solver']
+    assert solver and all(isinstance(value, (int, float, str)) for value in solver.values())
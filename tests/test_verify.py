@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from tests.brute import overlapping_pairs
+from vlsi import instances
+from vlsi.verify import check_file, check_folder, check_placement, find_overlap
+
+
+def arrays(*values):
+    return [np.asarray(v, dtype=np.int64) for v in values]
+
+
+def test_touching_circuits_dont_overlap():
+    # Side by side, stacked and corner to corner
+    x, y, dx, dy = arrays([0, 2, 0, 2], [0, 0, 3, 3], [2, 2, 2, 2], [3, 3, 2, 2])
+    assert find_overlap(x, y, dx, dy) is None
+
+
+@pytest.mark.parametrize('placement', [
+    ([0, 1], [0, 1], [2, 2], [2, 2]),           # corners
+    ([0, 1], [0, 0], [3, 1], [3, 1]),           # nested
+    ([0, 2], [1, 0], [5, 1], [1, 5]),           # crossing
+    ([0, 0], [0, 0], [1, 1], [1, 1]),           # identical
+])
+def test_overlapping_circuits(placement):
+    overlap = find_overlap(*arrays(*placement))
+    assert overlap is not None and sorted(overlap) == [0, 1]
+
+
+def test_find_overlap_matches_brute_force():
+    rng = np.random.default_rng(0)
+    for _ in range(2000):
+        n = int(rng.integers(1, 8))
+        x, y = rng.integers(0, 6, n), rng.integers(0, 6, n)
+        dx, dy = rng.integers(1, 4, n), rng.integers(1, 4, n)
+        overlap = find_overlap(x, y, dx, dy)
+        pairs = overlapping_pairs(x.tolist(), y.tolist(), dx.tolist(), dy.tolist())
+        if pairs:
+            assert overlap is not None and tuple(sorted(overlap)) in pairs
+        else:
+            assert overlap is None
+
+
+def test_check_placement():
+    r, d = [2, 2, 4], [3, 3, 1]
+    assert check_placement(4, 4, [0, 2, 0], [0, 0, 3], [2, 2, 4], [3, 3, 1], r, d) == []
+
+    violations = check_placement(4, 4, [0, 1, 0], [0, 0, 3], [2, 2, 4], [3, 3, 1], r, d)
+    assert violations == ['circuits 1 and 2 overlap']
+    assert check_placement(4, 5, [0, 2, 0], [0, 0, 3], [2, 2, 4], [3, 3, 1], r, d) == \
+        ['height 5 but the highest circuit ends at 4']
+    assert check_placement(3, 4, [0, 2, 0], [0, 0, 3], [2, 2, 4], [3, 3, 1], r, d)
+
+
+def test_check_placement_with_rotations():
+    # The second circuit is rotated
+    r, d = [2, 1], [3, 4]
+    assert check_placement(6, 3, [0, 2], [0, 0], [2, 4], [3, 1], r, d, True, [False, True]) == []
+    assert check_placement(6, 3, [0, 2], [0, 0], [2, 4], [3, 1], r, d, False)
+
+
+def test_check_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(instances, 'CACHE_DIR', str(tmp_path / 'store'))
+    monkeypatch.setattr(instances, '_stores', {})
+    instances_dir, out_dir = tmp_path / 'instances', tmp_path / 'out'
+    instances_dir.mkdir()
+    out_dir.mkdir()
+    (instances_dir / 'ins-1.dzn').write_text('w = 4;\nn = 3;\nr = [2, 2, 4];\nd = [3, 3, 1];\n')
+
+    (out_dir / 'ins-1-out.txt').write_text('4 4\n3\n2 3 0 0 \n2 3 2 0 \n4 1 0 3 \n----------\n==========\n0.1')
+    assert check_file(str(out_dir / 'ins-1-out.txt'), str(instances_dir)) == []
+
+    # Rotated circuits are flagged in the file, the output files of the subfolders are checked too
+    (out_dir / 'rotations').mkdir()
+    rotated = out_dir / 'rotations' / 'ins-1-out.txt'
+    rotated.write_text('4 6\n3\n2 3 0 0 Not rotated\n3 2 0 3 Rotated\n4 1 0 5 Not rotated\n')
+    (out_dir / 'ins-9-out.txt').write_text('Time expired')
+    reports = check_folder(str(out_dir), str(instances_dir))
+    assert reports[str(out_dir / 'ins-1-out.txt')] == [] and reports[str(rotated)] == []
+    assert reports[str(out_dir / 'ins-9-out.txt')][0].startswith('unreadable')
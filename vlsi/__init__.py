@@ -0,0 +1,13 @@
+"""Shared tooling for the CP, SMT and MIP approaches to the VLSI problem.
+
+``vlsi.solve`` solves an instance with any engine (see ``vlsi.api``). It is
+imported on first use, so ``import vlsi`` loads no solver and no NumPy.
+"""
+
+
+def __getattr__(name):
+
+    if name == 'solve':
+        from vlsi.api import solve
+        return solve
+    raise AttributeError("module 'vlsi' has no attribute '{}'".format(name))
@@ -0,0 +1,52 @@
+"""Command line of the package, one command per tool:
+
+    $ python -m vlsi solve 12 --engine SMT --rotation
+    $ python -m vlsi verify CP/out SMT/out MIP/out --quiet
+    $ python -m vlsi batch --instances 1-40 --approaches CP SMT
+
+The module of a command is only imported when the command is run, so e.g.
+``verify`` starts without loading any solver or matplotlib.
+"""
+
+import importlib
+import sys
+
+# Command: module whose main() runs it, description
+COMMANDS = {
+    'solve': ('vlsi.api', 'solve one instance with one engine'),
+    'batch': ('vlsi.batch', 'solve a sweep of instances in parallel'),
+    'benchmark': ('vlsi.benchmark', 'benchmark the engines, optionally against a baseline'),
+    'portfolio': ('vlsi.portfolio', 'race the three engines on the same instances'),
+    'decompose': ('vlsi.decompose', 'solve large instances by decomposition into bands'),
+    'service': ('vlsi.service', 'run or query the local solve service'),
+    'journal': ('vlsi.journal', 'summarize the jobs of a sweep journal'),
+    'verify': ('vlsi.verify', 'check output files against their instances'),
+    'generate': ('vlsi.generator', 'generate instances of known optimal height'),
+    'instances': ('vlsi.instances', 'compile instances folders into the binary cache'),
+    'plots': ('vlsi.writer', 'render the plots spooled in batch plot mode'),
+}
+
+
+def usage():
+    lines = ['usage: python -m vlsi <command> [options]', '', 'commands:']
+    lines += ['  {:<11} {}'.format(command, description) for command, (_, description) in COMMANDS.items()]
+    lines += ['', "'python -m vlsi <command> --help' describes the options of a command"]
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] in ('-h', '--help'):
+        print(usage())
+        return
+    if argv[0] not in COMMANDS:
+        sys.exit("unknown command '{}'\n\n{}".format(argv[0], usage()))
+
+    command = argv.pop(0)
+    sys.argv[0] = 'python -m vlsi ' + command
+    importlib.import_module(COMMANDS[command][0]).main(argv)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""Library entry point: one ``solve`` function for all the engines.
+
+An instance is given as the number of an instance of the repository, the path
+of a ``.dzn`` file, a ``(w, r, d)`` tuple or a dict with ``w``, ``r`` and
+``d``, and solved by the ``solve_instance`` of the chosen engine:
+
+    >>> from vlsi import solve
+    >>> result = solve(12, engine='SMT', rotation=True, time_limit=60)
+    >>> result['height'], result['optimal']
+
+Only the modules of the engine actually used are imported: z3 for SMT,
+gurobipy for MIP, minizinc for CP, and matplotlib only when plots are drawn.
+No output file is written unless ``output=True``.
+
+Usage (from the repository root):
+
+    $ python -m vlsi solve 12 --engine SMT --rotation --time-limit 60
+    $ python -m vlsi solve large.dzn --engine decompose --json
+"""
+
+import argparse
+import json
+import os
+
+from vlsi.cache import cached_solve
+from vlsi.engines import APPROACHES, load_engine, load_instance
+from vlsi.instances import read_dzn
+
+ENGINES = APPROACHES + ('decompose',)
+
+
+#================================================== Instances =================================================================
+
+def read_instance(instance):
+
+    # (w, r, d, n) and the name of the instance, whatever the way it is given
+    if isinstance(instance, int):
+        return load_instance(instance), instance
+    if isinstance(instance, str):
+        if instance.isdigit():
+            return load_instance(int(instance)), int(instance)
+        name = os.path.splitext(os.path.basename(instance))[0]
+        return read_dzn(instance), name[4:] if name.startswith('ins-') else name
+    if isinstance(instance, dict):
+        w, r, d = instance['w'], instance['r'], instance['d']
+    else:
+        w, r, d = instance
+
+    r, d = [int(v) for v in r], [int(v) for v in d]
+    if len(r) != len(d):
+        raise ValueError("r has {} values but d has {}".format(len(r), len(d)))
+    return (int(w), r, d, len(r)), 0
+
+
+#================================================== Solving =================================================================
+
+def solve(instance, engine='MIP', rotation=False, time_limit=300, output=False, cache=True, **options):
+
+    if engine not in ENGINES:
+        raise ValueError("Unknown engine '{}', expected one of {}".format(engine, ', '.join(ENGINES)))
+
+    (w, r, d, n), n_ins = read_instance(instance)
+
+    if engine == 'decompose':
+        from vlsi import decompose
+        return decompose.solve_instance(w, r, d, n, n_ins, rotation, time_limit=time_limit, output=output,
+                                        cache=cache, **options)
+
+    solve_instance = load_engine(engine).solve_instance
+    if cache:
+        return cached_solve(engine, solve_instance, w, r, d, n, n_ins, rotation, time_limit=time_limit, output=output,
+                            **options)
+    return solve_instance(w, r, d, n, n_ins, rotation, time_limit=time_limit, output=output, **options)
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Solve a VLSI instance with one of the engines.')
+    parser.add_argument('instance', help='instance number of the repository or .dzn file')
+    parser.add_argument('--engine', choices=ENGINES, default='MIP')
+    parser.add_argument('--rotation', action='store_true', help='allow the circuits to be rotated')
+    parser.add_argument('--time-limit', type=int, default=300, help='time limit, in seconds')
+    parser.add_argument('--seed', type=int, default=None, help='random seed of the solver')
+    parser.add_argument('--output', action='store_true', help='write the output file and the plot of the engine')
+    parser.add_argument('--no-cache', action='store_true', help='solve the instance even if its result is cached')
+    parser.add_argument('--json', action='store_true', help='print the whole result as JSON')
+    args = parser.parse_args(argv)
+
+    options = {'seed': args.seed} if args.seed is not None and args.engine != 'decompose' else {}
+    result = solve(args.instance, args.engine, args.rotation, args.time_limit, args.output, not args.no_cache,
+                   **options)
+
+    if args.json:
+        print(json.dumps(result, default=lambda value: value.tolist() if hasattr(value, 'tolist') else str(value)))
+    else:
+        print('height {}{}, {:.2f} s'.format(result['height'], ' (optimal)' if result.get('optimal') else '',
+                                             result.get('time') or 0))
+        for i in range(len(result.get('x') or [])):
+            rotated = ' rotated' if result.get('rotations') and result['rotations'][i] else ''
+            print('{} {} {} {}{}'.format(result['dx'][i], result['dy'][i], result['x'][i], result['y'][i], rotated))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,350 @@
+"""Parallel batch runner for instance sweeps.
+
+Every (instance, approach, rotation) combination becomes a job that calls the
+``solve_instance`` function of the corresponding engine in its own process.
+Jobs are scheduled over a budget of cores: single-threaded engines (chuffed, z3)
+take one core, Gurobi and the parallel MiniZinc solvers take as many cores as
+the threads they are given, and the SMT portfolio one core per z3 instance.
+
+Usage (from the repository root):
+
+    $ python -m vlsi.batch --instances 1-40 --approaches CP SMT --workers 8
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import time
+from multiprocessing.connection import wait
+
+from vlsi.cache import cached_solve
+from vlsi.engines import APPROACHES, kill_process_group, load_engine, load_instance, own_process_group
+from vlsi.instances import get_instance
+from vlsi.journal import journaled_solve
+from vlsi import profiling
+from vlsi import writer
+from vlsi.verify import check_result
+
+
+#================================================== Jobs =================================================================
+
+def make_jobs(instances, approaches=APPROACHES, rotations=(False, True), time_limit=300, mip_threads=1, options=None,
+              cache=True, verify=False, instances_dir=None, journal=None):
+
+    # Engine-specific keyword arguments of solve_instance, e.g. {'SMT': {'search': 'bisection'}}
+    options = options or {}
+    jobs = []
+
+    for n_ins in instances:
+        for approach in approaches:
+            for rotation in rotations:
+                jobs.append({
+                    'id': len(jobs),
+                    'n_ins': n_ins,
+                    'approach': approach,
+                    'rotation': rotation,
+                    'time_limit': time_limit,
+                    'cores': job_cores(approach, mip_threads, options.get(approach, {})),
+                    'options': dict(options.get(approach, {})),
+                    'cache': cache,
+                    'verify': verify,
+                    'instances_dir': instances_dir,
+                    'journal': journal,
+                })
+
+    return jobs
+
+
+def job_cores(approach, mip_threads, options):
+
+    # Gurobi threads, MiniZinc threads (of every parallel height probe) or members of the z3 portfolio
+    if approach == 'MIP':
+        return mip_threads
+    if options.get('search') == 'probe':
+        return (options.get('probes') or 1) * (options.get('threads') or 1)
+    return options.get('threads') or options.get('portfolio') or 1
+
+
+def job_name(job):
+    return '{} ins-{} {}'.format(job['approach'], job['n_ins'], 'rotation' if job['rotation'] else 'no rotation')
+
+
+def run_job(job):
+
+    engine = load_engine(job['approach'])
+    kwargs = {'time_limit': job['time_limit']}
+
+    # Instances of another folder (e.g. generated ones) don't overwrite the output files of the repository
+    if job.get('instances_dir'):
+        w, r, d, n = get_instance(job['instances_dir'], 'ins-' + str(job['n_ins']))
+        kwargs['output'] = False
+    else:
+        w, r, d, n = load_instance(job['n_ins'], job['approach'])
+
+    if job['approach'] == 'MIP':
+        kwargs['threads'] = job['cores']
+    kwargs.update(job.get('options', {}))
+    if job['approach'] == 'CP' and kwargs.get('search') == 'probe':
+        kwargs['probes'] = max(1, job['cores'] // (kwargs.get('threads') or 1))
+    elif job['approach'] == 'CP' and kwargs.get('threads'):
+        kwargs['threads'] = job['cores']
+
+    start = time.time()
+    if job.get('journal'):
+        result = journaled_solve(job['journal'], job['approach'], engine.solve_instance, w, r, d, n, job['n_ins'],
+                                 job['rotation'], cache=job.get('cache', True), name=job_name(job), **kwargs)
+    elif job.get('cache', True):
+        result = cached_solve(job['approach'], engine.solve_instance, w, r, d, n, job['n_ins'], job['rotation'], **kwargs)
+    else:
+        result = engine.solve_instance(w, r, d, n, job['n_ins'], job['rotation'], **kwargs)
+
+    # Duration of the whole call, process start-up excluded
+    result = dict(result, elapsed=time.time() - start)
+
+    # An invalid placement fails the job
+    if job.get('verify'):
+        violations = check_result(result, w, r, d, job['rotation'])
+        if violations:
+            result['error'] = 'invalid solution: ' + '; '.join(violations)
+    return result
+
+
+def _worker(job, conn):
+
+    own_process_group()
+    try:
+        result = run_job(job)
+    except Exception as e:
+        result = {'height': None, 'optimal': False, 'error': repr(e)}
+
+    # The process exits without running atexit handlers: pending output files and plots are written before the job is
+    # reported finished, so that the parent never counts or kills it while they are still being written
+    try:
+        writer.flush()
+    except Exception as e:
+        result = dict(result, error='output: ' + repr(e))
+
+    conn.send(result)
+    conn.close()
+
+
+def job_status(result):
+
+    if result.get('error'):
+        return 'error'
+    if result.get('height') is None:
+        return 'unsolved'
+    if result.get('optimal'):
+        return 'optimal'
+    return 'feasible'
+
+
+#================================================== Scheduler =================================================================
+
+def share_cores(jobs, workers):
+
+    # CP probe jobs without a number of probes split the budget between them instead of each taking all of it
+    probing = [job for job in jobs if job['approach'] == 'CP' and job['options'].get('search') == 'probe'
+               and not job['options'].get('probes')]
+    for job in probing:
+        job['cores'] = max(1, workers // len(probing)) * (job['options'].get('threads') or 1)
+
+    for job in jobs:
+        job['cores'] = max(1, min(job['cores'], workers))
+
+
+def run_batch(jobs, workers=None, grace=30, verbose=True):
+
+    # The core budget is shared by all the running jobs
+    workers = workers or os.cpu_count()
+    share_cores(jobs, workers)
+
+    pending = list(jobs)
+    running = {}
+    records = {}
+    free = workers
+    start = time.time()
+
+    def finish(job, result, wall_time):
+        record = dict(job, **result)
+        record['status'] = job_status(record)
+        record['wall_time'] = wall_time
+        records[job['id']] = record
+        if verbose:
+            print('[{}/{}] {}: {}{} (height {}, {:.2f} s)'.format(
+                len(records), len(jobs), job_name(job), record['status'],
+                ', cached' if record.get('cached') else ', journaled' if record.get('journaled') else '',
+                record.get('height'), wall_time))
+
+    try:
+        while pending or running:
+
+            # Launching every pending job that fits into the free cores, in submission order
+            for job in list(pending):
+                if job['cores'] <= free:
+                    recv_conn, send_conn = mp.Pipe(duplex=False)
+                    process = mp.Process(target=_worker, args=(job, send_conn), daemon=True)
+                    process.start()
+                    send_conn.close()
+                    running[recv_conn] = (job, process, time.time())
+                    pending.remove(job)
+                    free -= job['cores']
+
+            # Collecting the completed jobs: a closed pipe without a result means the worker crashed
+            for conn in wait(list(running), timeout=0.5):
+                job, process, started = running.pop(conn)
+                try:
+                    result = conn.recv()
+                except EOFError:
+                    result = None
+                conn.close()
+                process.join()
+                if result is None:
+                    result = {'height': None, 'optimal': False, 'error': 'exit code {}'.format(process.exitcode)}
+                free += job['cores']
+                finish(job, result, time.time() - started)
+
+            # Killing the jobs that exceeded their wall-clock limit
+            for conn, (job, process, started) in list(running.items()):
+                wall_time = time.time() - started
+                if wall_time > job['time_limit'] + grace:
+                    kill_process_group(process)
+                    conn.close()
+                    del running[conn]
+                    free += job['cores']
+                    finish(job, {'height': None, 'optimal': False, 'error': 'killed after {:.0f} s'.format(wall_time)},
+                           wall_time)
+    finally:
+        # Interrupted sweep: the jobs and their solvers run in their own process groups, out of reach of the terminal
+        for conn, (job, process, started) in running.items():
+            kill_process_group(process)
+            conn.close()
+
+    records = [records[job['id']] for job in jobs]
+
+    if verbose:
+        print_summary(records, time.time() - start)
+
+    return records
+
+
+def print_summary(records, elapsed):
+
+    print('')
+    print('{:<6} {:<12} {:>5} {:>8} {:>9} {:>9} {:>7} {:>11}'.format(
+        'Engine', 'Mode', 'Jobs', 'Optimal', 'Feasible', 'Unsolved', 'Errors', 'Solve time'))
+
+    groups = {}
+    for record in records:
+        groups.setdefault((record['approach'], record['rotation']), []).append(record)
+
+    for (approach, rotation), group in groups.items():
+        statuses = [record['status'] for record in group]
+        print('{:<6} {:<12} {:>5} {:>8} {:>9} {:>9} {:>7} {:>10.1f}s'.format(
+            approach, 'rotation' if rotation else 'no rotation', len(group),
+            statuses.count('optimal'), statuses.count('feasible'), statuses.count('unsolved'),
+            statuses.count('error'), sum(record['wall_time'] for record in group)))
+
+    print('')
+    print('Sweep completed in {:.1f} s'.format(elapsed))
+
+
+#================================================== Command line =================================================================
+
+def parse_range(values):
+
+    # Accepting both single instances and ranges, e.g. "1 3 5-10"
+    instances = []
+    for value in values:
+        for part in value.split(','):
+            if '-' in part:
+                first, last = part.split('-')
+                instances.extend(range(int(first), int(last) + 1))
+            elif part:
+                instances.append(int(part))
+    return instances
+
+
+def build_parser():
+
+    parser = argparse.ArgumentParser(description='Solve a sweep of VLSI instances in parallel.')
+    parser.add_argument('--instances', nargs='+', default=['1-40'], help='instance numbers or ranges, e.g. 1-10 15')
+    parser.add_argument('--instances-dir', default=None,
+                        help='folder of the .dzn instances, e.g. generated ones (default: the folders of the engines)')
+    parser.add_argument('--approaches', nargs='+', default=list(APPROACHES), choices=APPROACHES)
+    parser.add_argument('--rotations', choices=['no', 'yes', 'both'], default='both')
+    parser.add_argument('--workers', type=int, default=None, help='number of cores to use (default: all)')
+    parser.add_argument('--time-limit', type=int, default=300, help='solver time limit per job, in seconds')
+    parser.add_argument('--grace', type=int, default=30, help='extra seconds before a job is killed')
+    parser.add_argument('--mip-threads', type=int, default=1, help='threads (and cores) given to every Gurobi job')
+    parser.add_argument('--no-warm-start', action='store_true', help='do not start the engines from a greedy packing')
+    parser.add_argument('--plots', choices=writer.PLOT_MODES, default='batch',
+                        help='render the plots in the background of every job, all together after the sweep, or never')
+    parser.add_argument('--no-cache', action='store_true', help='solve every job even if its result is cached')
+    parser.add_argument('--journal', default=None,
+                        help='journal of the sweep: finished jobs are skipped, unfinished ones continue from their incumbent')
+    parser.add_argument('--profile', default=None,
+                        help='JSON lines file receiving the timings, memory, model size and solver statistics of every run')
+    parser.add_argument('--profile-python', choices=profiling.PYTHON_HOOKS, default=None,
+                        help='profile the Python model-building code of every run with cProfile or tracemalloc')
+    parser.add_argument('--verify', action='store_true', help='check the placement returned by every job')
+    parser.add_argument('--mip-lazy', action='store_true', help='add the MIP no-overlap constraints lazily')
+    parser.add_argument('--cp-solver', default='chuffed',
+                        help='MiniZinc solver of the CP engine, e.g. chuffed, gecode or cp-sat')
+    parser.add_argument('--cp-threads', type=int, default=None,
+                        help='threads (and cores) given to every CP job, for the solvers supporting them')
+    parser.add_argument('--cp-flatzinc', action='store_true',
+                        help='compile every CP instance to FlatZinc once and reuse it in later runs')
+    parser.add_argument('--cp-search', choices=['default', 'area', 'height', 'lns', 'probe'], default='default',
+                        help='CP search: the one of the model, circuits by decreasing area or height, LNS, or parallel '
+                             'height probes')
+    parser.add_argument('--cp-probes', type=int, default=None,
+                        help='heights probed at once by every CP job with --cp-search probe (default: the cores of --workers split between these jobs)')
+    parser.add_argument('--cp-restart', choices=['none', 'luby', 'geometric'], default='none',
+                        help='restart policy of the CP search')
+    parser.add_argument('--smt-search', choices=['optimize', 'linear', 'bisection'], default='optimize',
+                        help='height search of the SMT engine')
+    parser.add_argument('--smt-portfolio', type=int, default=1,
+                        help='differently configured z3 instances racing on every SMT job (and cores it takes)')
+    parser.add_argument('--smt-backend', choices=['int', 'order'], default='int',
+                        help='SMT encoding: integer arithmetic or propositional order encoding')
+    return parser
+
+
+def parse_rotations(value):
+    return {'no': (False,), 'yes': (True,), 'both': (False, True)}[value]
+
+
+def engine_options(args):
+
+    # Keyword arguments of solve_instance for every engine, from the command line
+    options = {approach: {'warm_start': not args.no_warm_start} for approach in APPROACHES}
+    options['SMT'].update(search=args.smt_search, backend=args.smt_backend, portfolio=args.smt_portfolio)
+    options['CP'].update(solver=args.cp_solver, threads=args.cp_threads, flatzinc=args.cp_flatzinc, search=args.cp_search,
+                         restart=args.cp_restart, probes=args.cp_probes)
+    options['MIP'].update(lazy=args.mip_lazy)
+    return options
+
+
+def main(argv=None):
+
+    args = build_parser().parse_args(argv)
+    rotations = parse_rotations(args.rotations)
+    options = engine_options(args)
+
+    jobs = make_jobs(parse_range(args.instances), args.approaches, rotations, args.time_limit, args.mip_threads, options,
+                     not args.no_cache, args.verify, args.instances_dir, args.journal)
+    # Inherited by the jobs, whatever the start method of their processes
+    os.environ['VLSI_PLOTS'] = args.plots
+    if args.profile:
+        os.environ['VLSI_PROFILE'] = os.path.abspath(args.profile)
+    if args.profile_python:
+        os.environ['VLSI_PROFILE_PYTHON'] = args.profile_python
+    run_batch(jobs, args.workers, args.grace)
+
+    if args.plots == 'batch':
+        writer.render_pending(args.workers)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,292 @@
+"""Reproducible benchmark of the CP, SMT and MIP engines.
+
+Every (instance, approach, rotation) combination is solved in several trials,
+trial k using the random seed ``seed + k`` for the solver, through the batch
+runner with the result cache and the output files disabled. For every run the
+benchmark records:
+
+* the time spent building the model and the time to the first solution, as
+  reported by the engine (the greedy warm start counts as a first solution);
+* the time to the optimum, i.e. the time its last incumbent was found when
+  optimality is proven, and the timeout rate over the runs that didn't fail;
+  runs ending with an error (crash, kill, invalid placement) are counted
+  apart;
+* the final height against the best known one, i.e. the optimal height of the
+  generated instances (``vlsi.generator``) or else the lowest height found by
+  any run or stored in the baseline, and against the lower bound;
+* the search strategy, for the engines having several (the CP ones), which
+  also splits the summary;
+* the primal integral of the incumbents streamed by the engine, which rewards
+  finding good solutions early.
+
+The runs and a summary per engine and mode are written as JSON and/or CSV. A
+previous JSON file can be given as baseline: heights, proofs of optimality and
+median times are compared instance by instance and the regressions are listed,
+with a non-zero exit status if there are any.
+
+Usage (from the repository root):
+
+    $ python -m vlsi.benchmark --instances 1-20 --approaches SMT MIP --trials 3 --time-limit 60 \\
+          --json benchmark.json --baseline benchmarks/baseline.json
+"""
+
+import csv
+import json
+import os
+import statistics
+import sys
+
+from vlsi import bounds
+from vlsi.batch import build_parser, engine_options, make_jobs, parse_range, parse_rotations, run_batch
+from vlsi.engines import load_instance
+from vlsi.generator import read_optimum
+from vlsi.incumbents import primal_integral
+from vlsi.instances import get_instance
+
+COLUMNS = ('instance', 'approach', 'strategy', 'rotation', 'trial', 'seed', 'status', 'height', 'best_known', 'lower_bound', 'gap',
+           'optimal', 'timeout', 'error', 'build_time', 'first_solution_time', 'time_to_optimum', 'primal_integral', 'elapsed',
+           'wall_time')
+
+
+#================================================== Runs =================================================================
+
+def make_trials(instances, approaches, rotations, time_limit, mip_threads, options, trials=3, seed=0, verify=False,
+                instances_dir=None):
+
+    jobs = []
+    for trial in range(trials):
+        trial_options = {approach: dict(options.get(approach, {}), seed=seed + trial, output=False)
+                         for approach in approaches}
+        for job in make_jobs(instances, approaches, rotations, time_limit, mip_threads, trial_options, cache=False,
+                             verify=verify, instances_dir=instances_dir):
+            job.update(id=len(jobs), trial=trial, seed=seed + trial)
+            jobs.append(job)
+    return jobs
+
+
+def key(run):
+    return run['approach'], run['rotation'], run['instance'], run.get('strategy')
+
+
+def best_heights(runs, baseline=None):
+
+    # Lowest height found for every (instance, rotation) by any run, here or in the baseline
+    best = {}
+    for run in list(runs) + list((baseline or {}).get('runs', [])):
+        if run.get('height') is not None:
+            instance = (run['instance'], run['rotation'])
+            best[instance] = min(best.get(instance, run['height']), run['height'])
+    return best
+
+
+def make_runs(records, baseline=None):
+
+    lower, optimum = {}, {}
+    runs = []
+    for record in records:
+        instance = (record['n_ins'], record['rotation'])
+        if instance not in lower:
+            if record.get('instances_dir'):
+                w, r, d, n = get_instance(record['instances_dir'], 'ins-' + str(record['n_ins']))
+                optimum[instance] = read_optimum(os.path.join(record['instances_dir'], 'ins-{}.dzn'.format(record['n_ins'])))
+            else:
+                w, r, d, n = load_instance(record['n_ins'])
+            lower[instance] = bounds.lower_bound(w, r, d, record['rotation'])
+
+        optimal = record['status'] == 'optimal'
+        error = record['status'] == 'error'
+        # The optimum is found with the last incumbent, the rest of the run only proves it
+        incumbents = record.get('incumbents')
+        found = incumbents[-1][0] if incumbents else record.get('elapsed')
+        runs.append({
+            'instance': record['n_ins'],
+            'approach': record['approach'],
+            'strategy': record.get('strategy'),
+            'rotation': record['rotation'],
+            'trial': record['trial'],
+            'seed': record['seed'],
+            'status': record['status'],
+            'height': record.get('height'),
+            'lower_bound': lower[instance],
+            'optimal': optimal,
+            'timeout': not optimal and not error,
+            'error': error,
+            'build_time': record.get('build_time'),
+            'first_solution_time': record.get('first_solution_time'),
+            'time_to_optimum': found if optimal else None,
+            'elapsed': record.get('elapsed'),
+            'wall_time': record['wall_time'],
+            'incumbents': record.get('incumbents'),
+            'time_limit': record['time_limit'],
+        })
+
+    # The optimum of a generated instance is the ground truth, whatever the runs found
+    best = best_heights(runs, baseline)
+    best.update((instance, height) for instance, height in optimum.items() if height is not None)
+    for run in runs:
+        run['best_known'] = best.get((run['instance'], run['rotation']))
+        if run['height'] is not None:
+            run['gap'] = (run['height'] - run['best_known']) / run['best_known']
+        else:
+            run['gap'] = None
+
+        # Incumbent timeline only used for the integral
+        incumbents, time_limit = run.pop('incumbents'), run.pop('time_limit')
+        if incumbents is not None and run['best_known'] is not None:
+            run['primal_integral'] = primal_integral(incumbents, time_limit, run['best_known'])
+        else:
+            run['primal_integral'] = None
+
+    return runs
+
+
+def mean(values):
+    values = [value for value in values if value is not None]
+    return statistics.mean(values) if values else None
+
+
+def median(values):
+    values = [value for value in values if value is not None]
+    return statistics.median(values) if values else None
+
+
+def summarize(runs):
+
+    groups = {}
+    for run in runs:
+        groups.setdefault((run['approach'], run.get('strategy'), run['rotation']), []).append(run)
+
+    summary = []
+    for (approach, strategy, rotation), group in groups.items():
+        # Failed runs say nothing about the engine solving the instance in time
+        completed = [run for run in group if not run['error']]
+        summary.append({
+            'approach': approach,
+            'strategy': strategy,
+            'rotation': rotation,
+            'runs': len(group),
+            'optimal': sum(run['optimal'] for run in group),
+            'unsolved': sum(run['height'] is None for run in completed),
+            'errors': len(group) - len(completed),
+            'timeout_rate': sum(run['timeout'] for run in completed) / len(completed) if completed else None,
+            'mean_gap': mean(run['gap'] for run in group),
+            'median_build_time': median(run['build_time'] for run in group),
+            'median_first_solution_time': median(run['first_solution_time'] for run in group),
+            'median_time_to_optimum': median(run['time_to_optimum'] for run in group),
+            'mean_primal_integral': mean(run['primal_integral'] for run in group),
+            'median_elapsed': median(run['elapsed'] for run in group),
+        })
+    return summary
+
+
+#================================================== Baseline =================================================================
+
+def compare(runs, baseline, tolerance=1.2, min_seconds=1.0):
+
+    # Per (approach, rotation, instance): best height, proven optimality and median time over the trials
+    def aggregate(runs):
+        groups = {}
+        for run in runs:
+            if not run.get('error'):
+                groups.setdefault(key(run), []).append(run)
+        return {k: {'height': min((run['height'] for run in group if run['height'] is not None), default=None),
+                    'optimal': any(run['optimal'] for run in group),
+                    'elapsed': median(run['elapsed'] for run in group)}
+                for k, group in groups.items()}
+
+    current = aggregate(runs)
+    previous = aggregate(baseline['runs'])
+
+    regressions = []
+    for k in sorted(set(current) & set(previous), key=str):
+        now, before = current[k], previous[k]
+        name = '{} ins-{} {}'.format(k[0] if k[3] is None else k[0] + ' ' + k[3], k[2], 'rotation' if k[1] else 'no rotation')
+
+        if before['height'] is not None and (now['height'] is None or now['height'] > before['height']):
+            regressions.append('{}: height {} -> {}'.format(name, before['height'], now['height']))
+        elif before['optimal'] and not now['optimal']:
+            regressions.append('{}: optimality no longer proven'.format(name))
+        elif before['elapsed'] is not None and now['elapsed'] is not None and \
+                now['elapsed'] > tolerance * before['elapsed'] and now['elapsed'] - before['elapsed'] > min_seconds:
+            regressions.append('{}: {:.2f} s -> {:.2f} s'.format(name, before['elapsed'], now['elapsed']))
+
+    return regressions
+
+
+#================================================== Output =================================================================
+
+def write_json(path, settings, runs, summary):
+    with open(path, 'w') as f:
+        json.dump({'settings': settings, 'runs': runs, 'summary': summary}, f, indent=2)
+
+
+def write_csv(path, runs):
+    with open(path, 'w', newline='') as f:
+        csv_writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        csv_writer.writeheader()
+        csv_writer.writerows(runs)
+
+
+def print_report(summary):
+
+    def fmt(value):
+        return '{:.2f}'.format(value) if value is not None else '-'
+
+    print('')
+    print('{:<16} {:<12} {:>5} {:>8} {:>8} {:>8} {:>8} {:>8} {:>8} {:>8} {:>8}'.format(
+        'Engine', 'Mode', 'Runs', 'Errors', 'Optimal', 'Timeout', 'Gap', 'Build', 'First', 'Optimum', 'Integral'))
+    for row in summary:
+        engine = row['approach'] if row['strategy'] is None else '{} {}'.format(row['approach'], row['strategy'])
+        print('{:<16} {:<12} {:>5} {:>8} {:>8} {:>8} {:>8} {:>8} {:>8} {:>8} {:>8}'.format(
+            engine, 'rotation' if row['rotation'] else 'no rotation', row['runs'], row['errors'], row['optimal'],
+            '{:.0%}'.format(row['timeout_rate']) if row['timeout_rate'] is not None else '-', fmt(row['mean_gap']), fmt(row['median_build_time']),
+            fmt(row['median_first_solution_time']), fmt(row['median_time_to_optimum']),
+            fmt(row['mean_primal_integral'])))
+
+
+def main(argv=None):
+
+    parser = build_parser()
+    parser.description = 'Benchmark the CP, SMT and MIP engines on VLSI instances.'
+    parser.set_defaults(workers=1, time_limit=60)
+    parser.add_argument('--trials', type=int, default=3, help='runs of every job, with consecutive seeds')
+    parser.add_argument('--seed', type=int, default=0, help='random seed of the first trial')
+    parser.add_argument('--json', default=None, help='file receiving the runs and the summary as JSON')
+    parser.add_argument('--csv', default=None, help='file receiving the runs as CSV')
+    parser.add_argument('--baseline', default=None, help='JSON file of a previous benchmark to compare with')
+    parser.add_argument('--tolerance', type=float, default=1.2,
+                        help='slowdown over the baseline reported as a regression')
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+
+    jobs = make_trials(parse_range(args.instances), args.approaches, parse_rotations(args.rotations), args.time_limit,
+                       args.mip_threads, engine_options(args), args.trials, args.seed, args.verify,
+                       args.instances_dir)
+    records = run_batch(jobs, args.workers, args.grace, verbose=False)
+
+    runs = make_runs(records, baseline)
+    summary = summarize(runs)
+    print_report(summary)
+
+    settings = {name: value for name, value in vars(args).items() if name not in ('json', 'csv', 'baseline')}
+    if args.json:
+        write_json(args.json, settings, runs, summary)
+    if args.csv:
+        write_csv(args.csv, runs)
+
+    if baseline is not None:
+        regressions = compare(runs, baseline, args.tolerance)
+        print('')
+        print('{} regressions against {}'.format(len(regressions), args.baseline))
+        for regression in regressions:
+            print('  ' + regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
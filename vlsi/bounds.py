@@ -0,0 +1,98 @@
+"""Lower bounds on the height of the plate.
+
+The models only knew the area bound ``area_min // w``. Here several classical
+strip packing bounds are computed and the largest is used as ``h_min``:
+
+* the area bound;
+* the tallest circuit;
+* circuits wider than half the plate, which can only be stacked;
+* dual feasible functions applied to the widths: the Fekete-Schepers family
+  u^(k) and the Martello-Toth family f0^l. A dual feasible function maps the
+  widths so that circuits fitting side by side still fit after the mapping,
+  hence the transformed area is a valid bound as well.
+
+With rotations every circuit contributes with its cheapest allowed orientation,
+which keeps every bound valid whatever orientation the solution picks.
+"""
+
+import numpy as np
+
+
+def orientations(w, r, d, rotation):
+
+    # (width, height) pairs allowed for every circuit, as two n x 2 arrays (padded with the first orientation)
+    r = np.asarray(r, dtype=np.int64)
+    d = np.asarray(d, dtype=np.int64)
+
+    widths = np.stack([r, d], axis=1)
+    heights = np.stack([d, r], axis=1)
+
+    if not rotation:
+        return widths[:, :1], heights[:, :1]
+
+    # Orientations wider than the plate are not allowed
+    rotated_fits = d <= w
+    widths[:, 1] = np.where(rotated_fits, d, r)
+    heights[:, 1] = np.where(rotated_fits, r, d)
+    return widths, heights
+
+
+def ceil_div(a, b):
+    return -(-a // b)
+
+
+def area_bound(w, widths, heights):
+    return int(ceil_div((widths * heights).min(axis=1).sum(), w))
+
+
+def tallest_bound(widths, heights):
+    return int(heights.min(axis=1).max())
+
+
+def wide_bound(w, widths, heights):
+
+    # Circuits wider than w/2 in every allowed orientation can't sit side by side
+    wide = (2 * widths > w).all(axis=1)
+    if not wide.any():
+        return 0
+    return int(heights[wide].min(axis=1).sum())
+
+
+def fekete_schepers_bound(w, widths, heights, k_max=20):
+
+    # u^(k)(x) = x if (k+1)x/w is integer, floor((k+1)x/w)/k otherwise; scaled by k*w to stay integer
+    best = 0
+    for k in range(1, k_max + 1):
+        integer = ((k + 1) * widths) % w == 0
+        scaled = np.where(integer, k * widths, ((k + 1) * widths // w) * w)
+        best = max(best, ceil_div(int((scaled * heights).min(axis=1).sum()), k * w))
+    return best
+
+
+def martello_toth_bound(w, widths, heights):
+
+    # f0^l(x) = w if x > w - l, x if l <= x <= w - l, 0 if x < l, for every l in 1..w/2
+    lambdas = np.arange(1, w // 2 + 1).reshape(-1, 1, 1)
+    if lambdas.size == 0:
+        return 0
+
+    mapped = np.where(widths > w - lambdas, w, np.where(widths >= lambdas, widths, 0))
+    totals = (mapped * heights).min(axis=2).sum(axis=1)
+    return int(ceil_div(int(totals.max()), w))
+
+
+def lower_bounds(w, r, d, rotation):
+
+    widths, heights = orientations(w, r, d, rotation)
+
+    return {
+        'area': area_bound(w, widths, heights),
+        'tallest': tallest_bound(widths, heights),
+        'wide': wide_bound(w, widths, heights),
+        'fekete_schepers': fekete_schepers_bound(w, widths, heights),
+        'martello_toth': martello_toth_bound(w, widths, heights),
+    }
+
+
+def lower_bound(w, r, d, rotation):
+    return max(lower_bounds(w, r, d, rotation).values())
@@ -0,0 +1,194 @@
+"""Content-addressed cache of the results, so that identical instances are never solved twice.
+
+A result is stored under a hash of everything that determines it: the plate
+width, the multiset of circuits (their order doesn't matter), the rotation
+flag, the engine with its options, the source of the model (the engine folder
+and the shared ``vlsi`` modules it depends on) and the time limit.
+
+Placements are stored in a canonical order of the circuits and mapped back to
+the order of the instance being solved. Optimal results are returned without
+calling any solver, their output files being written from the cached
+placement by the ``save_solution`` function of the engine, while non-optimal
+ones are given to the engine as a warm start, so that a new run can only
+improve on them.
+
+The least recently used entries are evicted when the cache holds more than
+``MAX_ENTRIES`` results or more than ``MAX_BYTES`` bytes.
+"""
+
+import glob
+import hashlib
+import inspect
+import json
+import os
+
+from vlsi.engines import ROOT_DIR
+
+CACHE_DIR = os.path.join(ROOT_DIR, '.cache', 'results')
+MAX_ENTRIES = 10000
+MAX_BYTES = 256 * 2**20
+
+# Shared modules changing the results of every engine
+SHARED_SOURCES = ('bounds.py', 'heuristics.py', 'preprocessing.py')
+
+# Options with no effect on the result itself
+IGNORED_OPTIONS = ('time_limit', 'bound', 'output', 'threads', 'probes', 'write_lp', 'flatzinc', 'on_solution')
+
+PLACEMENT = ('x', 'y', 'dx', 'dy', 'rotations')
+
+_versions = {}
+
+
+#================================================== Keys =================================================================
+
+def model_version(approach):
+
+    if approach not in _versions:
+        src_dir = os.path.join(ROOT_DIR, approach, 'src')
+        sources = sorted(glob.glob(os.path.join(src_dir, '*.py')) + glob.glob(os.path.join(src_dir, '*.mzn')))
+        sources += [os.path.join(ROOT_DIR, 'vlsi', name) for name in SHARED_SOURCES]
+
+        digest = hashlib.sha256()
+        for path in sources:
+            digest.update(os.path.basename(path).encode())
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+        _versions[approach] = digest.hexdigest()
+
+    return _versions[approach]
+
+
+def engine_options(solve, kwargs):
+
+    # Options of the engine with their defaults filled in, so that implicit and explicit defaults share their entries
+    options = {}
+    for name, parameter in inspect.signature(solve).parameters.items():
+        if parameter.default is not inspect.Parameter.empty and name not in IGNORED_OPTIONS:
+            options[name] = kwargs.get(name, parameter.default)
+
+    # An incumbent given as warm start (e.g. by the journal) is only a starting point: the entry is the one of a warm
+    # started run, whatever the incumbent
+    if isinstance(options.get('warm_start'), dict):
+        options['warm_start'] = True
+    return options
+
+
+def cache_key(w, r, d, rotation, approach, time_limit, options):
+
+    content = {
+        'w': w,
+        'circuits': sorted([r[i], d[i]] for i in range(len(r))),
+        'rotation': bool(rotation),
+        'engine': approach,
+        'options': options,
+        'model': model_version(approach),
+        'time_limit': time_limit,
+    }
+    return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def canonical_order(r, d):
+    return sorted(range(len(r)), key=lambda i: (r[i], d[i]))
+
+
+#================================================== Storage =================================================================
+
+def entry_path(key, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, key[:2], key + '.json')
+
+
+def lookup(key, r, d, cache_dir=CACHE_DIR):
+
+    path = entry_path(key, cache_dir)
+    try:
+        with open(path, 'r') as f:
+            entry = json.load(f)
+        # Marking the entry as recently used
+        os.utime(path)
+    except (OSError, ValueError):
+        return None
+
+    # Placements back to the order of the circuits of this instance
+    result = dict(entry)
+    for name in PLACEMENT:
+        if entry.get(name) is not None:
+            values = [None] * len(r)
+            for k, i in enumerate(canonical_order(r, d)):
+                values[i] = entry[name][k]
+            result[name] = values
+    return result
+
+
+def store(key, result, r, d, cache_dir=CACHE_DIR, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+
+    if result.get('height') is None:
+        return
+
+    # Keeping the best of the stored result and the new one
+    previous = lookup(key, r, d, cache_dir)
+    if previous is not None and not (result['height'] < previous['height'] or
+                                     (result.get('optimal') and not previous['optimal'])):
+        return
+
+    order = canonical_order(r, d)
+    entry = {'height': result['height'], 'optimal': bool(result.get('optimal')), 'time': result.get('time')}
+    if result.get('lower_bound') is not None:
+        entry['lower_bound'] = result['lower_bound']
+    for name in PLACEMENT:
+        if result.get(name) is not None:
+            entry[name] = [result[name][i] for i in order]
+
+    path = entry_path(key, cache_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.{}.tmp'.format(os.getpid())
+    with open(tmp_path, 'w') as f:
+        json.dump(entry, f, default=int)
+    os.replace(tmp_path, path)
+
+    evict(cache_dir, max_entries, max_bytes)
+
+
+def evict(cache_dir=CACHE_DIR, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+
+    entries = []
+    for path in glob.glob(os.path.join(cache_dir, '*', '*.json')):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    # Least recently used first
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    while entries and (len(entries) > max_entries or total > max_bytes):
+        _, size, path = entries.pop(0)
+        total -= size
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+#================================================== Cached solving =================================================================
+
+def cached_solve(approach, solve, w, r, d, n, n_ins, rotation, time_limit=300, cache_dir=CACHE_DIR, **kwargs):
+
+    key = cache_key(w, r, d, rotation, approach, time_limit, engine_options(solve, kwargs))
+    cached = lookup(key, r, d, cache_dir)
+
+    if cached is not None and cached['optimal']:
+        # The output file and plot of the engine are written from the cached placement, as a solve would have done
+        save_solution = getattr(inspect.getmodule(solve), 'save_solution', None)
+        if save_solution is not None and kwargs.get('output', True) and cached.get('x') is not None:
+            save_solution(cached, w, n, n_ins, rotation, cached['time'])
+        return dict(cached, cached=True)
+
+    # A previous non-optimal result is the incumbent to improve on, unless a lower one is given
+    known = kwargs.get('warm_start', True)
+    if cached is not None and known and (not isinstance(known, dict) or cached['height'] < known['height']):
+        kwargs['warm_start'] = cached
+
+    result = solve(w, r, d, n, n_ins, rotation, time_limit=time_limit, **kwargs)
+    store(key, result, r, d, cache_dir)
+    return result
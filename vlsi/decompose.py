@@ -0,0 +1,194 @@
+"""Decomposition mode for instances with hundreds of circuits.
+
+The monolithic models have a disjunction per pair of circuits, so they don't
+scale much beyond the instances of the repository. In decomposition mode:
+
+1. the circuits are sorted by height and cut into bands of similar-height
+   circuits, at most ``max_circuits`` each and no wider in total than a whole
+   number of rows of the plate;
+2. every band is a strip packing instance of its own, with the plate width,
+   solved by the ``solve_instance`` of an engine, all the bands in parallel
+   (through the result cache, so identical bands are only solved once);
+3. the packings of the bands are stacked, tallest circuits at the bottom, and
+   repaired by dropping every circuit as low as the circuits below it allow;
+4. the greedy skyline packing of the whole instance is kept instead if it is
+   lower.
+
+The result has the format of the engines, with the heights of the bands. Its
+optimality is only known when it reaches the lower bound of the instance.
+
+Usage (from the repository root):
+
+    $ python -m vlsi.decompose --instances 30-40 --approach MIP --max-circuits 15 --workers 4
+    $ python -m vlsi.decompose --files large.dzn --approach CP --time-limit 600
+"""
+
+import argparse
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from vlsi import bounds, heuristics
+from vlsi.batch import parse_range, parse_rotations
+from vlsi.cache import cached_solve
+from vlsi.engines import APPROACHES, ROOT_DIR, load_engine, load_instance
+from vlsi.instances import read_dzn
+from vlsi.output import write_result
+
+OUT_DIR = os.path.join(ROOT_DIR, 'decomposition', 'out')
+
+
+#================================================== Bands =================================================================
+
+def make_bands(w, r, d, rotation, max_circuits=25):
+
+    # Circuits by decreasing height (longest side with rotations), cut into bands of similar heights. A band is
+    # closed before its widths exceed a whole number of rows of the plate, so that its packing has little waste
+    height = np.maximum(r, d) if rotation else np.asarray(d)
+    width = np.minimum(r, d) if rotation else np.asarray(r)
+    order = np.argsort(-height, kind='stable').tolist()
+
+    per_row = max(1.0, w / width.mean())
+    rows = max(1, int(max_circuits // per_row))
+
+    bands, band, used = [], [], 0
+    for i in order:
+        if band and (used + width[i] > rows * w or len(band) == max_circuits):
+            bands.append(band)
+            band, used = [], 0
+        band.append(i)
+        used += width[i]
+    bands.append(band)
+    return bands
+
+
+def solve_band(approach, w, r, d, rotation, time_limit, options, cache=True):
+
+    engine = load_engine(approach)
+    kwargs = dict(options, output=False)
+    if cache:
+        result = cached_solve(approach, engine.solve_instance, w, r, d, len(r), 0, rotation, time_limit=time_limit,
+                              **kwargs)
+    else:
+        result = engine.solve_instance(w, r, d, len(r), 0, rotation, time_limit=time_limit, **kwargs)
+
+    # A band left without solution falls back to the greedy packing
+    if result.get('height') is None:
+        result = dict(heuristics.greedy_pack(w, r, d, rotation), optimal=False)
+    return result
+
+
+#================================================== Repair =================================================================
+
+def drop(x, y, dx, dy):
+
+    # Every circuit, from the lowest, goes down onto the highest circuit already dropped below its x range
+    x, y, dx, dy = (np.asarray(v, dtype=np.int64) for v in (x, y, dx, dy))
+    new_y = np.zeros_like(y)
+    dropped = np.zeros(len(x), dtype=bool)
+
+    for i in np.lexsort((x, y)).tolist():
+        below = dropped & (x < x[i] + dx[i]) & (x[i] < x + dx)
+        new_y[i] = (new_y[below] + dy[below]).max() if below.any() else 0
+        dropped[i] = True
+
+    return new_y
+
+
+def stack(w, n, rotation, bands, results):
+
+    # Bands one above the other, in the order of the circuits of the instance
+    x, y, dx, dy = (np.zeros(n, dtype=np.int64) for _ in range(4))
+    rot = np.zeros(n, dtype=bool)
+
+    base = 0
+    for band, result in zip(bands, results):
+        x[band] = result['x']
+        y[band] = np.asarray(result['y']) + base
+        dx[band] = result['dx']
+        dy[band] = result['dy']
+        if rotation:
+            rot[band] = result['rotations']
+        base += result['height']
+
+    y = drop(x, y, dx, dy)
+    return {
+        'height': int((y + dy).max()),
+        'x': x.tolist(),
+        'y': y.tolist(),
+        'dx': dx.tolist(),
+        'dy': dy.tolist(),
+        'rotations': rot.tolist() if rotation else None,
+    }
+
+
+#================================================== Solving =================================================================
+
+def solve_instance(w, r, d, n, n_ins, rotation, approach='MIP', time_limit=300, max_circuits=25, workers=None,
+                   output=True, cache=True, **options):
+
+    start = time.time()
+    bands = make_bands(w, r, d, rotation, max_circuits)
+
+    # The time limit is shared by the rounds of bands solved in parallel
+    workers = workers or os.cpu_count()
+    band_limit = max(1, int(time_limit / math.ceil(len(bands) / workers)))
+    if approach == 'MIP':
+        options.setdefault('threads', 1)
+
+    with ProcessPoolExecutor(min(workers, len(bands))) as pool:
+        futures = [pool.submit(solve_band, approach, w, [r[i] for i in band], [d[i] for i in band], rotation,
+                               band_limit, options, cache)
+                   for band in bands]
+        results = [future.result() for future in futures]
+
+    packing = stack(w, n, rotation, bands, results)
+
+    # The greedy packing of the whole instance, when the decomposition doesn't beat it
+    greedy = heuristics.greedy_pack(w, r, d, rotation)
+    if greedy['height'] < packing['height']:
+        packing = greedy
+
+    lower_bound = bounds.lower_bound(w, r, d, rotation)
+    result = dict(packing, optimal=packing['height'] <= lower_bound, lower_bound=lower_bound,
+                  time=time.time() - start, bands=[result['height'] for result in results])
+
+    if output:
+        out_dir = os.path.join(OUT_DIR, 'out_rotations' if rotation else 'out_no_rotations')
+        write_result(result, w, os.path.join(out_dir, 'ins-' + str(n_ins) + '-out.txt'), rotation)
+
+    return result
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Solve large VLSI instances by decomposition into bands.')
+    parser.add_argument('--instances', nargs='*', default=[], help='instance numbers or ranges, e.g. 1-10 15')
+    parser.add_argument('--files', nargs='*', default=[], help='.dzn files of other instances')
+    parser.add_argument('--approach', choices=APPROACHES, default='MIP', help='engine solving the bands')
+    parser.add_argument('--rotations', choices=['no', 'yes', 'both'], default='both')
+    parser.add_argument('--time-limit', type=int, default=300, help='time limit per instance, in seconds')
+    parser.add_argument('--max-circuits', type=int, default=25, help='circuits per band')
+    parser.add_argument('--workers', type=int, default=None, help='bands solved in parallel (default: all cores)')
+    parser.add_argument('--no-cache', action='store_true', help='solve every band even if its result is cached')
+    args = parser.parse_args(argv)
+
+    instances = [(n_ins, load_instance(n_ins)) for n_ins in parse_range(args.instances)]
+    for path in args.files:
+        name = os.path.splitext(os.path.basename(path))[0]
+        instances.append((name[4:] if name.startswith('ins-') else name, read_dzn(path)))
+
+    for name, (w, r, d, n) in instances:
+        for rotation in parse_rotations(args.rotations):
+            result = solve_instance(w, r, d, n, name, rotation, args.approach, args.time_limit, args.max_circuits,
+                                    args.workers, cache=not args.no_cache)
+            print('ins-{} ({}): height {} with {} bands, lower bound {}, {:.2f} s{}'.format(
+                name, 'rotation' if rotation else 'no rotation', result['height'], len(result['bands']),
+                result['lower_bound'], result['time'], ' (optimal)' if result['optimal'] else ''))
+
+
+if __name__ == '__main__':
+    main()
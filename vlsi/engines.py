@@ -0,0 +1,44 @@
+"""Access to the CP, SMT and MIP engines from outside their ``src`` folders."""
+
+import importlib
+import os
+import signal
+
+from vlsi.instances import load_instance
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APPROACHES = ('CP', 'SMT', 'MIP')
+
+
+def load_engine(approach):
+
+    if approach not in APPROACHES:
+        raise ValueError("Unknown approach '{}', expected one of {}".format(approach, ', '.join(APPROACHES)))
+
+    # Each engine is a script living in <approach>/src next to its auxiliary files, a module of the repository
+    return importlib.import_module('{0}.src.{0}'.format(approach))
+
+
+#================================================== Engine processes =================================================================
+
+def own_process_group():
+
+    # Called first in a process running an engine: the solver processes it starts (minizinc and the solver below it)
+    # join its group, so that they are stopped together with it
+    if hasattr(os, 'setpgrp'):
+        os.setpgrp()
+
+
+def kill_process_group(process, grace=1):
+
+    # The engine process and its solvers: terminated first, so that minizinc can clean up, then killed
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.killpg(process.pid, sig)
+        except (ProcessLookupError, PermissionError, AttributeError):
+            # Not in its own group yet (or not on POSIX): only the process itself
+            if process.is_alive() and sig == signal.SIGTERM:
+                process.terminate()
+            elif process.is_alive():
+                process.kill()
+        process.join(grace if sig == signal.SIGTERM else None)
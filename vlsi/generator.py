@@ -0,0 +1,138 @@
+"""Synthetic instances with a known optimal height, for scaling tests.
+
+A ``w`` x ``H`` rectangle is cut recursively by guillotine cuts until it is
+made of ``n`` circuits: at every step a rectangle is picked with probability
+proportional to its area and cut across its long side, at a position drawn
+uniformly in the middle ``1 - 2*balance`` of the side and such that both
+halves keep an aspect ratio of at most ``max_aspect`` when the integer sides
+allow it (the short side is cut when the long one can't be). The circuits tile
+the plate exactly, so their area bound is ``H`` and the optimal height is
+``H``, with or without rotations.
+
+The instances are written in the ``.dzn`` format of the repository, shuffled,
+with the optimal height and the generation settings in a comment:
+
+    $ python -m vlsi.generator synthetic/instances --counts 50 100 500 1000 --width 60 --seed 0
+
+which writes ``ins-1.dzn`` to ``ins-4.dzn``, to be solved with ``--instances-dir``
+in ``vlsi.batch`` and ``vlsi.benchmark``.
+"""
+
+import argparse
+import os
+import re
+
+import numpy as np
+
+
+#================================================== Cutting =================================================================
+
+def cut_range(side, other, max_aspect, balance):
+
+    # Positions of a cut across the side leaving halves between other / max_aspect and other * max_aspect long:
+    # both halves if possible, else only the first one (the second being cut further later), None without any
+    if side < 2:
+        return None
+    shortest = max(1, int(np.ceil(other / max_aspect)))
+    longest = min(side - 1, int(np.floor(other * max_aspect)))
+    low = max(shortest, side - longest, int(np.ceil(balance * side)))
+    high = min(longest, side - shortest, int(np.floor((1 - balance) * side)))
+    if low > high:
+        # The balance is dropped before the aspect ratio
+        low, high = max(shortest, side - longest), min(longest, side - shortest)
+    if low > high:
+        low, high = shortest, longest
+    return (low, high) if low <= high else None
+
+
+def guillotine(w, height, n, seed=0, max_aspect=4.0, balance=0.2):
+
+    if n > w * height:
+        raise ValueError("A {}x{} plate can't be cut into {} circuits".format(w, height, n))
+
+    rng = np.random.default_rng(seed)
+    widths, heights = [w], [height]
+
+    while len(widths) < n:
+        # A rectangle which can still be cut, with probability proportional to its area
+        sizes = np.array([widths, heights])
+        area = sizes[0] * sizes[1] * (sizes.max(axis=0) > 1)
+        k = int(rng.choice(len(area), p=area / area.sum()))
+        width, length = widths[k], heights[k]
+
+        # Cut positions keeping both halves within the aspect ratio, across the long side first
+        across = {True: cut_range(width, length, max_aspect, balance), False: cut_range(length, width, max_aspect, balance)}
+        vertical = rng.random() < 0.5 if width == length else width > length
+        if across[vertical] is None and across[not vertical] is not None:
+            vertical = not vertical
+        low, high = across[vertical] or (1, (width if vertical else length) - 1)
+        cut = int(rng.integers(low, high + 1))
+
+        if vertical:
+            widths[k], heights[k] = cut, length
+            widths.append(width - cut)
+            heights.append(length)
+        else:
+            widths[k], heights[k] = width, cut
+            widths.append(width)
+            heights.append(length - cut)
+
+    # Shuffled, so that the order of the circuits doesn't give the tiling away
+    order = rng.permutation(n)
+    return [widths[i] for i in order], [heights[i] for i in order]
+
+
+def generate(n, w, height=None, seed=0, max_aspect=4.0, balance=0.2):
+    height = height or w
+    r, d = guillotine(w, height, n, seed, max_aspect, balance)
+    return w, r, d, height
+
+
+#================================================== Files =================================================================
+
+def write_dzn(path, w, r, d, height, **settings):
+
+    header = '% optimal height: {}\n'.format(height)
+    if settings:
+        header += '% generated with ' + ', '.join('{}={}'.format(k, v) for k, v in settings.items()) + '\n'
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(header)
+        f.write('w = {};\n\nn = {};\n\nd = {};\n\nr = {};'.format(w, len(r), list(d), list(r)))
+
+
+def read_optimum(path):
+
+    # Optimal height written by the generator, None for other instances
+    try:
+        with open(path, 'r') as f:
+            match = re.search(r'% optimal height: (\d+)', f.read())
+    except OSError:
+        return None
+    return int(match.group(1)) if match else None
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Generate VLSI instances with a known optimal height.')
+    parser.add_argument('folder', help='folder receiving ins-1.dzn, ins-2.dzn, ...')
+    parser.add_argument('--counts', nargs='+', type=int, required=True, help='number of circuits of every instance')
+    parser.add_argument('--width', type=int, default=60, help='plate width')
+    parser.add_argument('--height', type=int, default=None, help='optimal height (default: the width)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed of the first instance, then seed + 1, ...')
+    parser.add_argument('--max-aspect', type=float, default=4.0, help='largest aspect ratio left uncut')
+    parser.add_argument('--balance', type=float, default=0.2, help='cuts fall in [balance, 1 - balance] of the side')
+    parser.add_argument('--first', type=int, default=1, help='number of the first instance')
+    args = parser.parse_args(argv)
+
+    for k, n in enumerate(args.counts):
+        seed = args.seed + k
+        w, r, d, height = generate(n, args.width, args.height, seed, args.max_aspect, args.balance)
+        path = os.path.join(args.folder, 'ins-{}.dzn'.format(args.first + k))
+        write_dzn(path, w, r, d, height, n=n, seed=seed, max_aspect=args.max_aspect, balance=args.balance)
+        print('{}: {} circuits, w = {}, optimal height {}'.format(path, n, w, height))
+
+
+if __name__ == '__main__':
+    main()
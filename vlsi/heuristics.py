@@ -0,0 +1,127 @@
+"""Fast constructive heuristic used to warm-start the engines.
+
+Circuits are placed one at a time on a skyline (the current top of every
+column of the plate), each at the lowest position where it fits, leftmost
+first, trying both orientations when rotations are allowed. Several circuit
+orders are tried, deterministic ones first and then randomized restarts, and
+the lowest packing is kept.
+
+A known packing, such as an incumbent kept in the result cache, can be given to
+the engines instead of ``True`` as their ``warm_start``: the lower of it and of
+the greedy packing is used.
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def skyline_pack(w, r, d, order, rotation=False):
+
+    n = len(r)
+    skyline = np.zeros(w, dtype=np.int64)
+
+    x = np.zeros(n, dtype=np.int64)
+    y = np.zeros(n, dtype=np.int64)
+    dx = np.asarray(r, dtype=np.int64).copy()
+    dy = np.asarray(d, dtype=np.int64).copy()
+    rot = np.zeros(n, dtype=bool)
+
+    for i in order:
+
+        orientations = [(r[i], d[i], False)]
+        if rotation and r[i] != d[i] and d[i] <= w:
+            orientations.append((d[i], r[i], True))
+
+        best = None
+        for width, height, rotated in orientations:
+            if width > w:
+                continue
+            # Base of the circuit for every admissible x: the highest column below it
+            bases = sliding_window_view(skyline, width).max(axis=1)
+            pos = int(np.argmin(bases))
+            candidate = (bases[pos] + height, bases[pos], pos, width, height, rotated)
+            if best is None or candidate < best:
+                best = candidate
+
+        top, base, pos, width, height, rotated = best
+        skyline[pos:pos+width] = top
+        x[i], y[i], dx[i], dy[i], rot[i] = pos, base, width, height, rotated
+
+    return {
+        'height': int(skyline.max()),
+        'x': x.tolist(),
+        'y': y.tolist(),
+        'dx': dx.tolist(),
+        'dy': dy.tolist(),
+        'rotations': rot.tolist() if rotation else None,
+    }
+
+
+def greedy_pack(w, r, d, rotation=False, restarts=20, seed=0):
+
+    r_arr = np.asarray(r)
+    d_arr = np.asarray(d)
+
+    # Decreasing height, area, width and longest side
+    orders = [
+        np.argsort(-d_arr, kind='stable'),
+        np.argsort(-(d_arr * r_arr), kind='stable'),
+        np.argsort(-r_arr, kind='stable'),
+        np.argsort(-np.maximum(d_arr, r_arr), kind='stable'),
+    ]
+
+    # Randomized restarts: decreasing height with noisy keys
+    rng = np.random.default_rng(seed)
+    for _ in range(restarts):
+        orders.append(np.argsort(-(d_arr * rng.uniform(0.7, 1.3, len(d_arr))), kind='stable'))
+
+    # Packing without rotating anything is also valid when rotations are allowed
+    best = None
+    for order in orders:
+        for rotate in ((True, False) if rotation else (False,)):
+            packing = skyline_pack(w, r, d, order, rotate)
+            if best is None or packing['height'] < best['height']:
+                best = packing
+
+    if rotation and best['rotations'] is None:
+        best['rotations'] = [False] * len(r)
+
+    return best
+
+
+def break_symmetries(packing, w, r, d, pre):
+
+    # Identical circuits take their placements in increasing y, as required by the models
+    for group in pre['groups']:
+        placements = sorted((packing['y'][i], packing['x'][i], packing['dx'][i], packing['dy'][i]) for i in group)
+        for i, (y, x, dx, dy) in zip(group, placements):
+            packing['x'][i], packing['y'][i], packing['dx'][i], packing['dy'][i] = x, y, dx, dy
+            if packing['rotations'] is not None:
+                packing['rotations'][i] = dx != r[i]
+
+    # Mirroring the packing if needed to satisfy x <=lex (w - x - dx)
+    mirrored = [w - packing['x'][i] - packing['dx'][i] for i in range(len(r))]
+    if mirrored < packing['x']:
+        packing['x'] = mirrored
+
+    return packing
+
+
+def warm_start(w, r, d, rotation, pre, restarts=20, seed=0):
+    return break_symmetries(greedy_pack(w, r, d, rotation, restarts, seed), w, r, d, pre)
+
+
+def initial_packing(w, r, d, rotation, pre, warm_start=True):
+
+    # warm_start: False for no start, True for the greedy packing, or a known packing to improve on
+    if not warm_start:
+        return None
+
+    start = break_symmetries(greedy_pack(w, r, d, rotation), w, r, d, pre)
+    if isinstance(warm_start, dict) and warm_start['height'] < start['height']:
+        known = {key: list(warm_start[key]) for key in ('x', 'y', 'dx', 'dy')}
+        known['height'] = warm_start['height']
+        known['rotations'] = [bool(v) for v in warm_start['rotations']] if rotation else None
+        start = break_symmetries(known, w, r, d, pre)
+
+    return start
@@ -0,0 +1,98 @@
+"""Anytime incumbent streams shared by the CP, SMT and MIP engines.
+
+Every engine takes an ``on_solution`` callback and reports each improving
+solution as soon as it is found: the greedy warm start, then the intermediate
+solutions of MiniZinc, the incumbents of Gurobi (``MIPSOL`` callback) or the
+satisfiable height probes of the incremental SMT search. The callback receives
+a dict with the time since the call, the height and the placement in the order
+of the instance, and may return ``True`` to stop the solve early, e.g. when a
+latency budget is exhausted; the engine then returns its best incumbent. The
+greedy warm start is reported before the solver starts and can't stop it.
+
+Given the shared ``bound`` of a portfolio, the stream also publishes every
+improving height to the other engines.
+
+The ``(time, height)`` timeline of the incumbents is also returned by every
+engine under ``'incumbents'``, from which ``primal_integral`` measures how fast
+an engine converges.
+"""
+
+from timeit import default_timer as timer
+
+
+def publish_height(bound, height):
+
+    # Lowering the height shared by the engines of a portfolio (0 while none has a solution)
+    if bound is None:
+        return
+    with bound.get_lock():
+        if bound.value == 0 or height < bound.value:
+            bound.value = height
+
+
+class IncumbentStream:
+
+    def __init__(self, callback=None, order=None, start_time=None, bound=None):
+
+        # order: position in the instance of every circuit, for engines working on a permutation of the circuits
+        self.callback = callback
+        self.order = order
+        self.bound = bound
+        self.start_time = timer() if start_time is None else start_time
+        self.timeline = []
+
+    @property
+    def best(self):
+        return self.timeline[-1][1] if self.timeline else None
+
+    @property
+    def first_time(self):
+        return self.timeline[0][0] if self.timeline else None
+
+    def emit(self, height, x, y, dx, dy, rotations=None):
+
+        # Only improving heights are streamed. True when the callback asks to stop the solve
+        height = int(height)
+        if self.best is not None and height >= self.best:
+            return False
+
+        elapsed = timer() - self.start_time
+        self.timeline.append((elapsed, height))
+        publish_height(self.bound, height)
+        if self.callback is None:
+            return False
+
+        incumbent = {'time': elapsed, 'height': height, 'x': x, 'y': y, 'dx': dx, 'dy': dy, 'rotations': rotations}
+        for key in ('x', 'y', 'dx', 'dy', 'rotations'):
+            values = incumbent[key]
+            if values is not None:
+                values = [bool(v) for v in values] if key == 'rotations' else [int(v) for v in values]
+                if self.order is not None:
+                    unsorted = [None] * len(values)
+                    for k, i in enumerate(self.order):
+                        unsorted[i] = values[k]
+                    values = unsorted
+                incumbent[key] = values
+
+        return bool(self.callback(incumbent))
+
+
+def primal_gap(height, best_known):
+
+    # 1 without any solution, |h - h*| / max(h, h*) otherwise
+    if height is None:
+        return 1.0
+    return abs(height - best_known) / max(height, best_known)
+
+
+def primal_integral(timeline, time_limit, best_known):
+
+    # Integral over [0, time_limit] of the primal gap of the incumbent at every time
+    integral = 0.0
+    previous_time, previous_height = 0.0, None
+    for time, height in timeline:
+        time = min(time, time_limit)
+        integral += primal_gap(previous_height, best_known) * (time - previous_time)
+        previous_time, previous_height = time, height
+    integral += primal_gap(previous_height, best_known) * max(0.0, time_limit - previous_time)
+    return integral
@@ -0,0 +1,179 @@
+"""Instance store shared by the CP, SMT and MIP runners.
+
+The ``.dzn`` files are parsed by assignment name rather than by line number, so
+comments, blank lines, reordered assignments, arrays split over several lines
+and ``array1d(1..n, [...])`` wrappers are all accepted.
+
+A whole instances folder is compiled once into a binary cache of NumPy arrays
+(the widths of the plates, the offsets of every instance and the concatenated
+``r`` and ``d`` of all circuits) and the arrays are memory-mapped afterwards:
+reading an instance only slices them. The cache is rebuilt automatically when
+a ``.dzn`` file is added, removed or modified.
+
+Usage (from the repository root):
+
+    $ python -m vlsi.instances CP/instances
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.path.join(ROOT_DIR, '.cache', 'instances')
+
+ARRAYS = ('w', 'offsets', 'r', 'd')
+
+# Stores already loaded by this process, by instances folder
+_stores = {}
+
+
+#================================================== Parsing =================================================================
+
+def parse_dzn(text):
+
+    # name = value; assignments, comments removed. Arrays become lists, scalars integers
+    text = re.sub(r'%[^\n]*', '', text)
+    values = {}
+
+    for name, value in re.findall(r'([A-Za-z_]\w*)\s*=\s*([^;]*);', text):
+        if '[' in value:
+            items = value[value.index('[')+1:value.rindex(']')]
+            values[name] = [int(v) for v in re.findall(r'-?\d+', items)]
+        else:
+            values[name] = int(value.strip())
+
+    return values
+
+
+def read_dzn(path):
+
+    with open(path, 'r') as f:
+        values = parse_dzn(f.read())
+
+    missing = [name for name in ('w', 'r', 'd') if name not in values]
+    if missing:
+        raise ValueError("{}: missing {}".format(path, ', '.join(missing)))
+
+    w, r, d = values['w'], values['r'], values['d']
+    n = values.get('n', len(d))
+    if not (len(r) == len(d) == n):
+        raise ValueError("{}: n = {} but r has {} and d has {} values".format(path, n, len(r), len(d)))
+
+    return w, r, d, n
+
+
+#================================================== Binary cache =================================================================
+
+def signature(instances_dir):
+
+    # Name, size and modification time of every .dzn file, sorted by name
+    files = []
+    for entry in os.scandir(instances_dir):
+        if entry.name.endswith('.dzn') and entry.is_file():
+            stat = entry.stat()
+            files.append([entry.name[:-4], stat.st_size, stat.st_mtime_ns])
+    return sorted(files)
+
+
+def cache_path(instances_dir):
+    key = hashlib.sha1(os.path.abspath(instances_dir).encode()).hexdigest()[:16]
+    return os.path.join(CACHE_DIR, key)
+
+
+def compile_instances(instances_dir, files):
+
+    cache_dir = cache_path(instances_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    w, lengths, r, d = [], [0], [], []
+    for name, _, _ in files:
+        w_i, r_i, d_i, n_i = read_dzn(os.path.join(instances_dir, name + '.dzn'))
+        w.append(w_i)
+        lengths.append(n_i)
+        r += r_i
+        d += d_i
+
+    arrays = {
+        'w': np.array(w, dtype=np.int64),
+        'offsets': np.cumsum(lengths, dtype=np.int64),
+        'r': np.array(r, dtype=np.int64),
+        'd': np.array(d, dtype=np.int64),
+    }
+
+    # Written under temporary names first so that concurrent readers never see a partial file
+    suffix = '.{}.tmp'.format(os.getpid())
+    for name, array in arrays.items():
+        path = os.path.join(cache_dir, name + '.npy')
+        with open(path + suffix, 'wb') as f:
+            np.save(f, array)
+        os.replace(path + suffix, path)
+
+    manifest = os.path.join(cache_dir, 'manifest.json')
+    with open(manifest + suffix, 'w') as f:
+        json.dump({'instances_dir': os.path.abspath(instances_dir), 'files': files}, f)
+    os.replace(manifest + suffix, manifest)
+
+
+def open_store(instances_dir, refresh=False):
+
+    instances_dir = os.path.abspath(instances_dir)
+    if instances_dir in _stores and not refresh:
+        return _stores[instances_dir]
+
+    cache_dir = cache_path(instances_dir)
+    files = signature(instances_dir)
+
+    try:
+        with open(os.path.join(cache_dir, 'manifest.json'), 'r') as f:
+            fresh = json.load(f)['files'] == files
+    except (OSError, ValueError, KeyError):
+        fresh = False
+
+    if not fresh:
+        compile_instances(instances_dir, files)
+
+    store = {name: np.load(os.path.join(cache_dir, name + '.npy'), mmap_mode='r') for name in ARRAYS}
+    store['index'] = {name: k for k, (name, _, _) in enumerate(files)}
+    _stores[instances_dir] = store
+    return store
+
+
+#================================================== Loading =================================================================
+
+def instance_arrays(store, name):
+
+    # Zero-copy views on the memory-mapped arrays
+    k = store['index'][name]
+    start, end = store['offsets'][k], store['offsets'][k+1]
+    return int(store['w'][k]), store['r'][start:end], store['d'][start:end]
+
+
+def get_instance(instances_dir, name):
+
+    w, r, d = instance_arrays(open_store(instances_dir), name)
+    return w, r.tolist(), d.tolist(), len(r)
+
+
+def load_instance(n_ins, approach='CP'):
+    return get_instance(os.path.join(ROOT_DIR, approach, 'instances'), 'ins-' + str(n_ins))
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Compile folders of .dzn instances into the binary cache.')
+    parser.add_argument('folders', nargs='+', help='folders containing .dzn files')
+    args = parser.parse_args(argv)
+
+    for folder in args.folders:
+        store = open_store(folder, refresh=True)
+        print('{}: {} instances, {} circuits -> {}'.format(
+            folder, len(store['index']), len(store['r']), cache_path(folder)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""Run journal making sweeps resumable and continuable with a larger budget.
+
+A journal is an append-only JSON lines file. For every job, identified by the
+engine and its options, the instance and the rotation flag but not the time
+limit, it records the start of every run, each improving incumbent as soon as
+the engine streams it, and the final result with its lower bound and the time
+limit it was given. Every line is written by a single system call as soon as it
+is known, so a sweep killed at any point keeps all the incumbents found so far.
+
+When a sweep is run again with the same journal:
+
+* jobs already finished with proven optimality, with a height matching their
+  lower bound, or with a time limit at least as large, are not run again: the
+  journaled result is returned;
+* the other jobs (interrupted, or finished with a smaller time limit) start
+  from their best journaled incumbent, given to the engine as its warm start.
+
+Usage (from the repository root):
+
+    $ python -m vlsi.batch --instances 1-40 --journal sweep.jsonl --time-limit 300
+    $ python -m vlsi.batch --instances 1-40 --journal sweep.jsonl --time-limit 1200
+    $ VLSI_JOURNAL=sweep.jsonl python -m SMT.src.SMT
+    $ python -m vlsi.journal sweep.jsonl
+"""
+
+import argparse
+import json
+import time
+
+from vlsi.cache import cache_key, cached_solve, engine_options
+from vlsi.jsonl import append
+
+PLACEMENT = ('x', 'y', 'dx', 'dy', 'rotations')
+
+
+#================================================== Records =================================================================
+
+def job_key(approach, solve, w, r, d, rotation, kwargs):
+    # The key of the result cache, whatever the time limit
+    return cache_key(w, r, d, rotation, approach, None, engine_options(solve, kwargs))
+
+
+def read_journal(path):
+
+    # State of every job: best incumbent, last finished run and number of runs
+    jobs = {}
+    try:
+        with open(path, 'r') as f:
+            lines = f.readlines()
+    except FileNotFoundError:
+        return jobs
+
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            # Last line of a journal killed while writing it
+            continue
+
+        job = jobs.setdefault(record['key'], {'name': record.get('name'), 'best': None, 'done': None, 'runs': 0})
+        if record['event'] == 'start':
+            job['runs'] += 1
+            job['name'] = record.get('name') or job['name']
+            job['running'] = record
+        elif record['event'] == 'incumbent':
+            if job['best'] is None or record['height'] < job['best']['height']:
+                job['best'] = record
+        elif record['event'] == 'done':
+            job['done'] = record
+            job.pop('running', None)
+            result = record['result']
+            if result.get('height') is not None and (job['best'] is None or result['height'] <= job['best']['height']):
+                job['best'] = dict(result, event='incumbent', key=record['key'])
+
+    return jobs
+
+
+def finished(job, time_limit):
+
+    # Nothing left to gain from running the job again with this time limit
+    done = job.get('done')
+    if done is None:
+        return False
+    result = done['result']
+    if result.get('optimal'):
+        return True
+    if result.get('height') is not None and result.get('lower_bound') is not None and \
+            result['height'] <= result['lower_bound']:
+        return True
+    return done['time_limit'] >= time_limit
+
+
+#================================================== Solving =================================================================
+
+def journaled_solve(path, approach, solve, w, r, d, n, n_ins, rotation, time_limit=300, cache=True, name=None,
+                    **kwargs):
+
+    # Without a journal, the plain cached solve of the runners
+    if not path:
+        if cache:
+            return cached_solve(approach, solve, w, r, d, n, n_ins, rotation, time_limit=time_limit, **kwargs)
+        return solve(w, r, d, n, n_ins, rotation, time_limit=time_limit, **kwargs)
+
+    key = job_key(approach, solve, w, r, d, rotation, kwargs)
+    job = read_journal(path).get(key)
+
+    if job is not None and finished(job, time_limit):
+        return dict(job['done']['result'], journaled=True)
+
+    # Continuing from the best incumbent of the previous runs
+    if job is not None and job['best'] is not None and kwargs.get('warm_start', True):
+        kwargs['warm_start'] = {k: job['best'][k] for k in ('height',) + PLACEMENT}
+
+    name = name or '{} ins-{} {}'.format(approach, n_ins, 'rotation' if rotation else 'no rotation')
+    append(path, {'event': 'start', 'key': key, 'name': name, 'time_limit': time_limit, 'date': time.time()})
+
+    callback = kwargs.pop('on_solution', None)
+
+    def on_solution(incumbent):
+        append(path, dict(incumbent, event='incumbent', key=key))
+        return callback(incumbent) if callback is not None else False
+
+    if cache:
+        result = cached_solve(approach, solve, w, r, d, n, n_ins, rotation, time_limit=time_limit,
+                              on_solution=on_solution, **kwargs)
+    else:
+        result = solve(w, r, d, n, n_ins, rotation, time_limit=time_limit, on_solution=on_solution, **kwargs)
+
+    stored = {k: result.get(k) for k in ('height', 'optimal', 'lower_bound', 'time') + PLACEMENT}
+    append(path, {'event': 'done', 'key': key, 'name': name, 'time_limit': time_limit, 'date': time.time(),
+                  'result': stored})
+    return result
+
+
+#================================================== Command line =================================================================
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Summarize the jobs of a sweep journal.')
+    parser.add_argument('journal', help='JSON lines journal written by vlsi.batch --journal or VLSI_JOURNAL')
+    args = parser.parse_args(argv)
+
+    jobs = read_journal(args.journal)
+    print('{:<32} {:>5} {:>7} {:>10} {:>11}  {}'.format('Job', 'Runs', 'Height', 'Bound', 'Time limit', 'Status'))
+    for job in sorted(jobs.values(), key=lambda job: job['name'] or ''):
+        done = job['done']
+        result = done['result'] if done else {}
+        if 'running' in job:
+            status = 'interrupted'
+        elif result.get('optimal'):
+            status = 'optimal'
+        else:
+            status = 'feasible' if result.get('height') is not None else 'unsolved'
+        print('{:<32} {:>5} {:>7} {:>10} {:>11}  {}'.format(
+            job['name'], job['runs'], job['best']['height'] if job['best'] else '-',
+            result.get('lower_bound') if result.get('lower_bound') is not None else '-',
+            done['time_limit'] if done else '-', status))
+
+
+if __name__ == '__main__':
+    main()
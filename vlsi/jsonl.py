@@ -0,0 +1,20 @@
+"""Append-only JSON lines files shared by concurrent processes.
+
+Used by the journal of the sweeps, the plot spool of the writer and the
+profiles of the runs. It depends on the standard library only, so that any
+module can import it without pulling in the rest of the package.
+"""
+
+import json
+import os
+
+
+def append(path, record):
+
+    # One write per line, so that concurrent jobs appending to the same file never interleave
+    line = (json.dumps(record, default=lambda value: value.tolist() if hasattr(value, 'tolist') else str(value)) + '\n')
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line.encode())
+    finally:
+        os.close(fd)
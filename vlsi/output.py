@@ -0,0 +1,33 @@
+"""Output files in the format shared by the CP, SMT and MIP engines."""
+
+import os
+
+
+def write_output(width, n_circuits, dx, dy, x_sol, y_sol, height, output_file, elapsed_time, rotation, rotations=None):
+
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+
+    with open(output_file, 'w+') as out_file:
+
+        out_file.write('{} {}\n'.format(width, height))
+        out_file.write('{}\n'.format(n_circuits))
+
+        for i in range(n_circuits):
+            out_file.write('{} {} {} {} '.format(dx[i], dy[i], x_sol[i], y_sol[i]))
+
+            if rotation:
+                if(rotations[i]):
+                    out_file.write('Rotated\n')
+                else:
+                    out_file.write('Not rotated\n')
+            else:
+                out_file.write('\n')
+
+        out_file.write("----------\n==========\n")
+
+        out_file.write('{}'.format(elapsed_time))
+
+
+def write_result(result, width, output_file, rotation):
+    write_output(width, len(result['x']), result['dx'], result['dy'], result['x'], result['y'], result['height'],
+                 output_file, result['time'], rotation, result.get('rotations'))
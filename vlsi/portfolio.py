@@ -0,0 +1,142 @@
+"""Portfolio racing mode: CP, SMT and MIP on the same instance at the same time.
+
+The engines run in parallel processes and share the best height found so far
+through a ``multiprocessing.Value``: every engine reads it as an upper bound on
+the height when it builds its model and publishes each of its incumbents into
+it. The SMT height search and the CP LNS and height probes read it again
+between their solver calls, and Gurobi stops as soon as its dual bound reaches
+it.
+
+As soon as a height is proven optimal (by an engine closing its own search, or
+by a lower bound matching the best height found by any engine) the remaining
+engines are cancelled and one canonical output file is written. Every engine
+runs in its own process group, so that cancelling it also stops the solver
+processes it started.
+
+Usage (from the repository root):
+
+    $ python -m vlsi.portfolio --instances 1-10 --rotations both
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import time
+from multiprocessing.connection import wait
+
+from vlsi import bounds
+from vlsi.batch import parse_range, parse_rotations
+from vlsi.engines import APPROACHES, ROOT_DIR, kill_process_group, load_engine, load_instance, own_process_group
+from vlsi.output import write_result
+
+OUT_DIR = os.path.join(ROOT_DIR, 'portfolio', 'out')
+
+
+def _racer(approach, w, r, d, n, n_ins, rotation, time_limit, kwargs, bound, conn):
+
+    own_process_group()
+    try:
+        engine = load_engine(approach)
+        result = engine.solve_instance(w, r, d, n, n_ins, rotation, time_limit=time_limit, bound=bound, output=False,
+                                       **kwargs)
+    except Exception as e:
+        result = {'height': None, 'optimal': False, 'error': repr(e)}
+
+    conn.send(result)
+    conn.close()
+
+
+def race(w, r, d, n, n_ins, rotation, approaches=APPROACHES, time_limit=300, mip_threads=None, grace=30,
+         output=True, verbose=True):
+
+    bound = mp.Value('i', 0)
+    running = {}
+    start = time.time()
+
+    for approach in approaches:
+        kwargs = {'threads': mip_threads} if approach == 'MIP' else {}
+        recv_conn, send_conn = mp.Pipe(duplex=False)
+        process = mp.Process(target=_racer, daemon=True,
+                             args=(approach, w, r, d, n, n_ins, rotation, time_limit, kwargs, bound, send_conn))
+        process.start()
+        send_conn.close()
+        running[recv_conn] = (approach, process)
+
+    best = None
+    lower_bound = bounds.lower_bound(w, r, d, rotation)
+
+    try:
+        while running and (best is None or best['height'] > lower_bound):
+
+            if time.time() - start > time_limit + grace:
+                break
+
+            for conn in wait(list(running), timeout=0.5):
+                approach, process = running.pop(conn)
+                try:
+                    result = conn.recv()
+                except EOFError:
+                    result = {'height': None, 'optimal': False, 'error': 'exit code {}'.format(process.exitcode)}
+                conn.close()
+                process.join()
+
+                if verbose:
+                    print('{} finished: height {}{}'.format(
+                        approach, result.get('height'), ' (optimal)' if result.get('optimal') else ''))
+
+                if result.get('height') is not None:
+                    if best is None or result['height'] < best['height']:
+                        best = dict(result, engine=approach)
+                        with bound.get_lock():
+                            if bound.value == 0 or best['height'] < bound.value:
+                                bound.value = best['height']
+                    if result.get('optimal'):
+                        lower_bound = max(lower_bound, result['height'])
+                lower_bound = max(lower_bound, result.get('lower_bound') or 0)
+
+    finally:
+        # Cancelling the engines that are still running, with the solver processes they started (the MiniZinc
+        # solvers of CP): every racer runs in its own process group
+        for conn, (approach, process) in running.items():
+            kill_process_group(process)
+            conn.close()
+            if verbose:
+                print('{} cancelled'.format(approach))
+
+    if best is None:
+        return None
+
+    best['optimal'] = best['height'] <= lower_bound
+    best['time'] = time.time() - start
+
+    if output:
+        out_dir = os.path.join(OUT_DIR, 'out_rotations' if rotation else 'out_no_rotations')
+        write_result(best, w, os.path.join(out_dir, 'ins-' + str(n_ins) + '-out.txt'), rotation)
+
+    return best
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Race the CP, SMT and MIP engines on VLSI instances.')
+    parser.add_argument('--instances', nargs='+', default=['1-40'], help='instance numbers or ranges, e.g. 1-10 15')
+    parser.add_argument('--approaches', nargs='+', default=list(APPROACHES), choices=APPROACHES)
+    parser.add_argument('--rotations', choices=['no', 'yes', 'both'], default='both')
+    parser.add_argument('--time-limit', type=int, default=300, help='time limit per instance, in seconds')
+    parser.add_argument('--mip-threads', type=int, default=None, help='threads given to Gurobi')
+    args = parser.parse_args(argv)
+
+    for n_ins in parse_range(args.instances):
+        w, r, d, n = load_instance(n_ins)
+        for rotation in parse_rotations(args.rotations):
+            print('Solving instance {} ({})'.format(n_ins, 'rotation' if rotation else 'no rotation'))
+            best = race(w, r, d, n, n_ins, rotation, args.approaches, args.time_limit, args.mip_threads)
+            if best is None:
+                print('No solution found')
+            else:
+                print('Height {} by {} in {:.2f} s{}'.format(
+                    best['height'], best['engine'], best['time'], ' (optimal)' if best['optimal'] else ''))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Instance preprocessing shared by the CP, SMT and MIP models.
+
+Three simplifications are derived from the instance data alone:
+
+* pairs of circuits that can never sit side by side because their widths add up
+  to more than the plate width: only the vertical no-overlap disjuncts remain;
+* orientations that are forced when rotations are allowed: squares gain nothing
+  from rotating, a circuit taller than the plate width can't be rotated and one
+  wider than the plate must be;
+* groups of identical circuits, whose permutation symmetry is broken by ordering
+  their y coordinates. The ordering only involves y, so it stays compatible with
+  the horizontal mirror symmetry breaking (lex on x) used by the models: sorting
+  the copies by y first and mirroring afterwards never changes their y.
+"""
+
+
+def forced_orientations(w, r, d):
+
+    fixed = {}
+    for i in range(len(r)):
+        if r[i] == d[i] or d[i] > w:
+            fixed[i] = False
+        elif r[i] > w:
+            fixed[i] = True
+    return fixed
+
+
+def min_widths(r, d, rotation, fixed):
+
+    widths = []
+    for i in range(len(r)):
+        if not rotation or i in fixed:
+            widths.append(d[i] if fixed.get(i) else r[i])
+        else:
+            widths.append(min(r[i], d[i]))
+    return widths
+
+
+def vertical_pairs(w, widths):
+
+    n = len(widths)
+    return [(i, j) for i in range(n) for j in range(i+1, n) if widths[i] + widths[j] > w]
+
+
+def identical_groups(r, d, rotation):
+
+    # With rotations a circuit and its rotated copy are interchangeable too
+    groups = {}
+    for i in range(len(r)):
+        key = tuple(sorted((r[i], d[i]))) if rotation else (r[i], d[i])
+        groups.setdefault(key, []).append(i)
+    return [group for group in groups.values() if len(group) > 1]
+
+
+def preprocess(w, r, d, rotation):
+
+    fixed = forced_orientations(w, r, d) if rotation else {}
+    groups = identical_groups(r, d, rotation)
+
+    return {
+        'vertical_pairs': vertical_pairs(w, min_widths(r, d, rotation, fixed)),
+        'fixed_rotation': fixed,
+        'groups': groups,
+        # Consecutive copies of identical circuits, to be constrained by y[a] <= y[b]
+        'ordered_pairs': [(group[k], group[k+1]) for group in groups for k in range(len(group)-1)],
+    }
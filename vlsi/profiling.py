@@ -0,0 +1,254 @@
+"""Per-phase timing and memory instrumentation of the engines.
+
+The ``solve_instance`` of every engine is wrapped by ``instrument``, and marks
+the end of each phase of a run with ``lap``:
+
+* ``preprocess``: pair pruning, lower bound and greedy warm start;
+* ``build``: construction of the model (the Python loops of the SMT
+  constraints, the gurobipy calls, the data of the MiniZinc instance);
+* ``solve``: the solver itself, MiniZinc flattening included;
+* ``extract``: reading the solution back;
+* ``output``: output file and plot submission, until the call returns.
+
+Every phase gets its wall-clock and CPU time (of all the threads of the
+process). A run also records the CPU time of its child processes (the MiniZinc
+solvers), the size of the model and the statistics of the solver (nodes,
+conflicts, failures, ...), reported by the engines with ``record``.
+
+The peak RSS of the run itself is measured on Linux by resetting the
+high-water mark of the process when the run starts (``/proc/self/clear_refs``),
+so that runs in a warm service or batch worker don't inherit the peak of an
+earlier one. The peaks of the whole process and of its largest child process,
+from ``getrusage``, are only known over the lifetime of the process and are
+reported as such.
+
+The record of a run is returned under ``profile`` by ``solve_instance`` and,
+when a path is configured, appended to it as a JSON line. Optionally, the
+Python code of the ``preprocess`` and ``build`` phases is profiled by cProfile
+(with the 15 slowest functions in the record and the whole profile saved under
+``.cache/profiles``) or tracemalloc (peak and top allocation sites).
+
+The settings are taken from ``configure`` or from the ``VLSI_PROFILE`` and
+``VLSI_PROFILE_PYTHON`` environment variables, inherited by the worker
+processes of ``vlsi.batch``:
+
+    $ VLSI_PROFILE=profile.jsonl VLSI_PROFILE_PYTHON=cprofile python -m MIP.src.MIP
+    $ python -m vlsi.batch --instances 1-10 --profile profile.jsonl --profile-python tracemalloc
+"""
+
+import contextvars
+import cProfile
+import functools
+import inspect
+import os
+import pstats
+import resource
+import time
+import threading
+import tracemalloc
+
+from vlsi.jsonl import append
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROFILES_DIR = os.path.join(ROOT_DIR, '.cache', 'profiles')
+
+PYTHON_HOOKS = ('cprofile', 'tracemalloc')
+
+_settings = {'path': None, 'python': None}
+
+# Profile of the run in progress in this context, None outside of the engines. The threads of an engine only see it
+# when run in a copy of the context of the call (contextvars.copy_context().run)
+_current = contextvars.ContextVar('profile', default=None)
+
+
+def configure(path=None, python=None):
+
+    if python is not None and python not in PYTHON_HOOKS:
+        raise ValueError("Unknown Python hook '{}', expected one of {}".format(python, ', '.join(PYTHON_HOOKS)))
+    _settings['path'] = path
+    _settings['python'] = python
+
+
+def settings():
+    return (_settings['path'] or os.environ.get('VLSI_PROFILE'),
+            _settings['python'] or os.environ.get('VLSI_PROFILE_PYTHON') or None)
+
+
+def reset_peak_rss():
+
+    # Linux only: the high-water mark (VmHWM) starts again from the current RSS
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss():
+    # VmHWM of the process, in megabytes
+    with open('/proc/self/status', 'r') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) / 1024
+    return None
+
+
+def children_usage():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+#================================================== Runs =================================================================
+
+class RunProfile:
+
+    def __init__(self, approach, python=None):
+
+        self.approach = approach
+        self.phases = {}
+        self.model = {}
+        self.solver = {}
+        self.python = {}
+        # Statistics recorded by the threads of a run, e.g. the members of the SMT portfolio
+        self.lock = threading.Lock()
+        self.start_wall = self.last_wall = time.perf_counter()
+        self.start_cpu = self.last_cpu = time.process_time()
+        self.start_children = children_usage()
+        self.measured_rss = reset_peak_rss()
+
+        # Python profiling of the model-building code, up to the end of the build phase
+        self.hook = python
+        self.profiler = None
+        if python == 'cprofile':
+            self.profiler = cProfile.Profile()
+            try:
+                self.profiler.enable()
+            except ValueError:
+                # Another profiler is already running
+                self.profiler, self.hook = None, None
+        elif python == 'tracemalloc' and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        elif python == 'tracemalloc':
+            self.hook = None
+
+    def lap(self, phase):
+
+        # The time since the previous lap is added to the phase, so repeated phases (e.g. LNS) accumulate
+        wall, cpu = time.perf_counter(), time.process_time()
+        times = self.phases.setdefault(phase, {'wall': 0.0, 'cpu': 0.0})
+        times['wall'] += wall - self.last_wall
+        times['cpu'] += cpu - self.last_cpu
+        self.last_wall, self.last_cpu = wall, cpu
+
+        if phase == 'build':
+            self.stop_python()
+
+    def record(self, model=None, solver=None):
+
+        # Numeric solver statistics add up over the solver calls of a run, the model is the last one
+        with self.lock:
+            self.model.update(model or {})
+            for key, value in (solver or {}).items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool) and key in self.solver:
+                    self.solver[key] += value
+                else:
+                    self.solver[key] = value
+
+    def stop_python(self, top=15):
+
+        if self.hook == 'cprofile' and self.profiler is not None:
+            self.profiler.disable()
+            os.makedirs(PROFILES_DIR, exist_ok=True)
+            path = os.path.join(PROFILES_DIR, '{}-{}-{}.prof'.format(self.approach, os.getpid(), int(time.time()*1000)))
+            self.profiler.dump_stats(path)
+            stats = pstats.Stats(self.profiler).stats
+            slowest = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:top]
+            self.python = {
+                'profile': path,
+                'functions': [{'function': '{}:{}({})'.format(*function), 'calls': calls, 'time': own,
+                               'cumulative': cumulative}
+                              for function, (_, calls, own, cumulative, _) in slowest],
+            }
+            self.profiler = None
+
+        elif self.hook == 'tracemalloc' and tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.python = {
+                'peak_mb': peak / 2**20,
+                'allocations': [{'line': str(stat.traceback[0]), 'size_mb': stat.size / 2**20, 'count': stat.count}
+                                for stat in snapshot.statistics('lineno')[:top]],
+            }
+
+        self.hook = None
+
+    def finish(self):
+
+        self.lap('output')
+        self.stop_python()
+        usage, children = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+        return {
+            'phases': self.phases,
+            'wall': self.last_wall - self.start_wall,
+            'cpu': self.last_cpu - self.start_cpu,
+            'children_cpu': children_usage() - self.start_children,
+            'peak_rss_mb': peak_rss() if self.measured_rss else None,
+            # ru_maxrss is in kilobytes on Linux, the peak since the process (or its largest child) started
+            'lifetime_peak_rss_mb': usage.ru_maxrss / 1024,
+            'children_lifetime_peak_rss_mb': children.ru_maxrss / 1024,
+            'model': self.model,
+            'solver': self.solver,
+            'python': self.python,
+        }
+
+
+#================================================== Engine hooks =================================================================
+
+def lap(phase):
+    profile = _current.get()
+    if profile is not None:
+        profile.lap(phase)
+
+
+def record(model=None, solver=None):
+    profile = _current.get()
+    if profile is not None:
+        profile.record(model, solver)
+
+
+def instrument(approach):
+
+    # Decorator of solve_instance, keeping its signature (the result cache reads its options)
+    def decorate(solve):
+        signature = inspect.signature(solve)
+
+        @functools.wraps(solve)
+        def wrapper(*args, **kwargs):
+            path, python = settings()
+            profile = RunProfile(approach, python)
+            token = _current.set(profile)
+            try:
+                result = solve(*args, **kwargs)
+            finally:
+                _current.reset(token)
+                # cProfile or tracemalloc must not keep running in the process after a failed run
+                profile.stop_python()
+
+            call = signature.bind(*args, **kwargs)
+            call.apply_defaults()
+            arguments = call.arguments
+            run = {'approach': approach, 'instance': arguments['n_ins'], 'rotation': bool(arguments['rotation']),
+                   'n': arguments['n'], 'time_limit': arguments['time_limit'], 'height': result.get('height'),
+                   'optimal': result.get('optimal'), 'date': time.time()}
+            run.update(profile.finish())
+
+            # A single write per record, as in the journal, for the jobs of a sweep sharing the file
+            if path:
+                append(path, run)
+            return dict(result, profile=run)
+
+        return wrapper
+
+    return decorate
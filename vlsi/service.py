@@ -0,0 +1,537 @@
+"""Local solve service keeping the engines warm between requests.
+
+Every run of a script pays the import of z3, gurobipy, minizinc, numpy and
+matplotlib. The service pays it once: a pool of worker processes imports the
+engines at start-up and then solves the jobs submitted over HTTP, on a TCP port
+or a Unix socket, so a small request only costs a round trip.
+
+Jobs are queued in submission order and dispatched to the first idle worker.
+A queued job is cancelled at once; a running one is stopped at its next
+incumbent (the engine then returns the best placement found so far), and its
+worker is killed with the solver processes of the job and replaced if it
+hasn't stopped after ``grace`` seconds.
+
+Endpoints, all answering JSON:
+
+* ``POST /solve``: a job with either ``w``, ``r`` and ``d`` or the number of an
+  ``instance`` of the repository, and optionally ``approach`` (default MIP),
+  ``rotation``, ``time_limit``, ``options`` (keyword arguments of the
+  ``solve_instance`` of the engine), ``cache`` and ``wait``. The answer is the
+  finished job, or only its id with ``"wait": false``;
+* ``GET /jobs/<id>``: the state of a job, waiting up to ``?wait=<seconds>`` for
+  it to finish;
+* ``DELETE /jobs/<id>``: cancels a job;
+* ``GET /health``: the workers and the queue.
+
+Usage (from the repository root):
+
+    $ python -m vlsi.service serve --port 8765 --workers 4
+    $ python -m vlsi.service serve --socket /tmp/vlsi.sock --approaches SMT MIP
+    $ python -m vlsi.service solve --instance 12 --approach SMT --rotation --socket /tmp/vlsi.sock
+"""
+
+import argparse
+import collections
+import http.client
+import itertools
+import json
+import multiprocessing as mp
+import os
+import re
+import signal
+import socket
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing.connection import wait
+from urllib.parse import parse_qs, urlparse
+
+from vlsi.cache import cached_solve
+from vlsi.engines import APPROACHES, kill_process_group, load_engine, load_instance, own_process_group
+from vlsi.instances import read_dzn
+
+DEFAULT_PORT = 8765
+
+# Fresh interpreters for the workers: the service runs threads, which don't survive a fork
+CONTEXT = mp.get_context('spawn')
+
+# Finished jobs kept for GET /jobs/<id>
+RETENTION = 1000
+
+
+#================================================== Workers =================================================================
+
+def _worker(conn, cancel, approaches):
+
+    # In its own process group, so that a killed worker takes the solver processes of its job along
+    own_process_group()
+
+    # Engines imported once and for all. An engine failing to import only fails its own jobs
+    engines = {}
+    for approach in approaches:
+        try:
+            engines[approach] = load_engine(approach)
+        except Exception as e:
+            engines[approach] = e
+    conn.send({'ready': True})
+
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+
+        try:
+            engine = engines[job['approach']]
+            if isinstance(engine, Exception):
+                raise engine
+            result = solve_job(engine, job, cancel)
+        except Exception as e:
+            result = {'height': None, 'optimal': False, 'error': repr(e)}
+        conn.send(result)
+
+
+def solve_job(engine, job, cancel):
+
+    # The cancel flag stops the engine at its next incumbent
+    kwargs = dict(job['options'], time_limit=job['time_limit'], output=False,
+                  on_solution=lambda incumbent: bool(cancel.value))
+    w, r, d, rotation = job['w'], job['r'], job['d'], job['rotation']
+
+    start = time.time()
+    if job['cache']:
+        result = cached_solve(job['approach'], engine.solve_instance, w, r, d, len(r), 0, rotation, **kwargs)
+    else:
+        result = engine.solve_instance(w, r, d, len(r), 0, rotation, **kwargs)
+    return dict(result, elapsed=time.time() - start)
+
+
+class Worker:
+
+    def __init__(self, approaches):
+
+        self.cancel = CONTEXT.Value('b', 0)
+        self.conn, child_conn = CONTEXT.Pipe()
+        self.process = CONTEXT.Process(target=_worker, args=(child_conn, self.cancel, approaches), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+        self.ready = False
+        self.job = None
+        self.cancelled_at = None
+
+    def start(self, job):
+        self.cancel.value = 0
+        self.cancelled_at = None
+        self.job = job
+        self.conn.send(job['request'])
+
+    def stop(self):
+        self.cancel.value = 1
+        self.cancelled_at = time.time()
+
+    def kill(self):
+        kill_process_group(self.process)
+        self.conn.close()
+
+    def close(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.kill()
+
+
+#================================================== Service =================================================================
+
+def make_request(body, approaches=APPROACHES):
+
+    # Job of a POST /solve body, with the instance given inline or by number
+    if 'instance' in body:
+        w, r, d, n = load_instance(int(body['instance']))
+    else:
+        w, r, d = int(body['w']), [int(v) for v in body['r']], [int(v) for v in body['d']]
+        if len(r) != len(d) or not r:
+            raise ValueError('r and d must be non-empty and of the same length')
+
+    approach = body.get('approach', 'MIP')
+    if approach not in approaches:
+        raise ValueError("Unknown approach '{}', expected one of {}".format(approach, ', '.join(approaches)))
+
+    options = dict(body.get('options') or {})
+    for name in ('output', 'on_solution', 'time_limit'):
+        options.pop(name, None)
+
+    return {'w': w, 'r': r, 'd': d, 'approach': approach, 'rotation': bool(body.get('rotation', False)),
+            'time_limit': int(body.get('time_limit', 300)), 'options': options, 'cache': bool(body.get('cache', True))}
+
+
+class SolveService:
+
+    def __init__(self, workers=None, approaches=APPROACHES, grace=5):
+
+        self.approaches = tuple(approaches)
+        self.grace = grace
+        self.workers = [Worker(self.approaches) for _ in range(workers or os.cpu_count())]
+
+        self.jobs = collections.OrderedDict()
+        self.queue = collections.deque()
+        self.ids = itertools.count(1)
+        self.condition = threading.Condition()
+        self.closed = False
+
+        # Woken up by every submission and cancellation, instead of polling
+        self.wakeup_recv, self.wakeup_send = CONTEXT.Pipe(duplex=False)
+        self.thread = threading.Thread(target=self.dispatch, daemon=True)
+        self.thread.start()
+
+    def submit(self, body):
+
+        request = make_request(body, self.approaches)
+        with self.condition:
+            job_id = next(self.ids)
+            self.jobs[job_id] = {'id': job_id, 'status': 'queued', 'request': request, 'submitted': time.time(),
+                                 'started': None, 'finished': None, 'result': None, 'cancelled': False}
+            self.queue.append(job_id)
+        self.wake()
+        return job_id
+
+    def get(self, job_id):
+        with self.condition:
+            return self.view(self.jobs[job_id])
+
+    def wait(self, job_id, timeout=None):
+
+        with self.condition:
+            job = self.jobs[job_id]
+            self.condition.wait_for(lambda: job['finished'] is not None, timeout)
+            return self.view(job)
+
+    def cancel(self, job_id):
+
+        with self.condition:
+            job = self.jobs[job_id]
+            if job['finished'] is None:
+                job['cancelled'] = True
+                if job['status'] == 'queued':
+                    self.queue.remove(job_id)
+                    self.finish(job, {'height': None, 'optimal': False})
+                else:
+                    for worker in self.workers:
+                        if worker.job is job and worker.cancelled_at is None:
+                            worker.stop()
+            view = self.view(job)
+        self.wake()
+        return view
+
+    def health(self):
+
+        with self.condition:
+            return {
+                'workers': len(self.workers),
+                'ready': sum(worker.ready for worker in self.workers),
+                'busy': sum(worker.job is not None for worker in self.workers),
+                'queued': len(self.queue),
+                'approaches': list(self.approaches),
+            }
+
+    def close(self):
+
+        with self.condition:
+            self.closed = True
+        self.wake()
+        self.thread.join()
+        for worker in self.workers:
+            worker.close()
+
+    def view(self, job):
+
+        request = job['request']
+        view = {'id': job['id'], 'status': job['status'], 'approach': request['approach'],
+                'rotation': request['rotation'], 'n': len(request['r']), 'time_limit': request['time_limit']}
+        if job['started'] is not None:
+            view['queue_time'] = job['started'] - job['submitted']
+        if job['finished'] is not None:
+            view['total_time'] = job['finished'] - job['submitted']
+            view['result'] = job['result']
+        return view
+
+    def finish(self, job, result):
+
+        # Called with the condition held
+        job['result'] = result
+        job['finished'] = time.time()
+        if job['cancelled']:
+            job['status'] = 'cancelled'
+        elif result.get('error'):
+            job['status'] = 'error'
+        else:
+            job['status'] = 'done'
+
+        # Only the most recent finished jobs are kept
+        finished = [k for k, other in self.jobs.items() if other['finished'] is not None]
+        for k in finished[:max(0, len(finished) - RETENTION)]:
+            del self.jobs[k]
+
+        self.condition.notify_all()
+
+    def wake(self):
+        try:
+            self.wakeup_send.send_bytes(b'')
+        except OSError:
+            pass
+
+    def replace(self, worker):
+        self.workers[self.workers.index(worker)] = Worker(self.approaches)
+        worker.kill()
+
+    def dispatch(self):
+
+        while True:
+            with self.condition:
+                if self.closed:
+                    break
+
+                # Queued jobs to the idle workers, in submission order
+                for worker in self.workers:
+                    if worker.ready and worker.job is None and self.queue:
+                        job = self.jobs[self.queue.popleft()]
+                        job['status'] = 'running'
+                        job['started'] = time.time()
+                        worker.start(job)
+
+                # Workers still running a cancelled job after the grace period are replaced
+                for worker in list(self.workers):
+                    if worker.cancelled_at is not None and time.time() - worker.cancelled_at > self.grace:
+                        self.finish(worker.job, {'height': None, 'optimal': False,
+                                                 'error': 'killed {} s after its cancellation'.format(self.grace)})
+                        self.replace(worker)
+
+                workers = {worker.conn: worker for worker in self.workers}
+
+            ready = wait(list(workers) + [self.wakeup_recv], timeout=0.5)
+
+            with self.condition:
+                for conn in ready:
+                    if conn is self.wakeup_recv:
+                        while self.wakeup_recv.poll():
+                            self.wakeup_recv.recv_bytes()
+                        continue
+
+                    worker = workers[conn]
+                    if worker not in self.workers:
+                        continue
+                    try:
+                        message = conn.recv()
+                    except (EOFError, OSError):
+                        # Crashed worker: its job fails and a new worker takes its place
+                        if worker.job is not None:
+                            self.finish(worker.job, {'height': None, 'optimal': False,
+                                                     'error': 'exit code {}'.format(worker.process.exitcode)})
+                        self.replace(worker)
+                        continue
+
+                    if not worker.ready:
+                        worker.ready = True
+                    elif worker.job is not None:
+                        job, worker.job, worker.cancelled_at = worker.job, None, None
+                        self.finish(job, message)
+
+
+#================================================== HTTP =================================================================
+
+def to_json(value):
+    # NumPy scalars and arrays left in the results
+    return value.tolist() if hasattr(value, 'tolist') else str(value)
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def send_json(self, status, content):
+        data = json.dumps(content, default=to_json).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def job_id(self, path):
+        match = re.fullmatch(r'/jobs/(\d+)', path)
+        return int(match.group(1)) if match else None
+
+    def do_POST(self):
+
+        service = self.server.service
+        if urlparse(self.path).path != '/solve':
+            return self.send_json(404, {'error': 'not found'})
+        try:
+            body = self.read_json()
+            job_id = service.submit(body)
+        except (ValueError, KeyError, TypeError) as e:
+            return self.send_json(400, {'error': str(e)})
+
+        if body.get('wait', True):
+            self.send_json(200, service.wait(job_id, body.get('timeout')))
+        else:
+            self.send_json(202, service.get(job_id))
+
+    def do_GET(self):
+
+        service = self.server.service
+        url = urlparse(self.path)
+        if url.path == '/health':
+            return self.send_json(200, service.health())
+
+        job_id = self.job_id(url.path)
+        try:
+            timeout = float(parse_qs(url.query).get('wait', [0])[0])
+            view = service.wait(job_id, timeout) if timeout > 0 else service.get(job_id)
+        except (KeyError, ValueError):
+            return self.send_json(404, {'error': 'no job {}'.format(url.path)})
+        self.send_json(200, view)
+
+    def do_DELETE(self):
+
+        try:
+            self.send_json(200, self.server.service.cancel(self.job_id(urlparse(self.path).path)))
+        except KeyError:
+            self.send_json(404, {'error': 'no job {}'.format(self.path)})
+
+    def log_message(self, format, *args):
+        # Unix socket clients have no address
+        if self.server.verbose:
+            print('{} {}'.format(time.strftime('%H:%M:%S'), format % args))
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(service, host='127.0.0.1', port=DEFAULT_PORT, socket_path=None, verbose=False):
+
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = UnixHTTPServer(socket_path, Handler)
+    else:
+        server = ThreadingHTTPServer((host, port), Handler)
+    server.service = service
+    server.verbose = verbose
+    return server
+
+
+#================================================== Client =================================================================
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+
+    def __init__(self, socket_path, timeout=None):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def request(method, path, body=None, host='127.0.0.1', port=DEFAULT_PORT, socket_path=None, timeout=None):
+
+    if socket_path:
+        conn = UnixHTTPConnection(socket_path, timeout)
+    else:
+        conn = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        conn.request(method, path, json.dumps(body) if body is not None else None,
+                     {'Content-Type': 'application/json'})
+        response = conn.getresponse()
+        content = json.loads(response.read() or b'null')
+    finally:
+        conn.close()
+
+    if response.status >= 400:
+        raise RuntimeError('{} {}: {}'.format(method, path, content.get('error')))
+    return content
+
+
+def solve(w, r, d, approach='MIP', rotation=False, time_limit=300, options=None, **connection):
+
+    # Placement of an instance by a running service, e.g. solve(8, [3, 3, 5, 5], [3, 5, 3, 5], socket_path=...)
+    body = {'w': w, 'r': list(r), 'd': list(d), 'approach': approach, 'rotation': rotation,
+            'time_limit': time_limit, 'options': options or {}}
+    return request('POST', '/solve', body, **connection)
+
+
+#================================================== Command line =================================================================
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Local service solving VLSI instances with warm engines.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--socket', default=None, help='Unix socket to use instead of the TCP port')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve = commands.add_parser('serve', help='run the service')
+    serve.add_argument('--workers', type=int, default=None, help='worker processes (default: all cores)')
+    serve.add_argument('--approaches', nargs='+', default=list(APPROACHES), choices=APPROACHES,
+                       help='engines imported by the workers')
+    serve.add_argument('--grace', type=float, default=5, help='seconds before a cancelled job is killed')
+    serve.add_argument('--verbose', action='store_true', help='log every request')
+
+    client = commands.add_parser('solve', help='solve an instance with a running service')
+    client.add_argument('--instance', type=int, default=None, help='number of an instance of the repository')
+    client.add_argument('--file', default=None, help='.dzn file of another instance')
+    client.add_argument('--approach', choices=APPROACHES, default='MIP')
+    client.add_argument('--rotation', action='store_true')
+    client.add_argument('--time-limit', type=int, default=300)
+    client.add_argument('--no-wait', action='store_true', help='only print the id of the job')
+
+    cancel = commands.add_parser('cancel', help='cancel a job of a running service')
+    cancel.add_argument('job', type=int)
+
+    args = parser.parse_args(argv)
+    connection = {'host': args.host, 'port': args.port, 'socket_path': args.socket}
+
+    if args.command == 'serve':
+        service = SolveService(args.workers, args.approaches, args.grace)
+        server = make_server(service, args.host, args.port, args.socket, args.verbose)
+        # Stopped cleanly by SIGTERM as well as by Ctrl-C
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        print('Serving {} workers on {}'.format(len(service.workers), args.socket or '{}:{}'.format(args.host, args.port)))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            service.close()
+            if args.socket and os.path.exists(args.socket):
+                os.remove(args.socket)
+
+    elif args.command == 'solve':
+        body = {'approach': args.approach, 'rotation': args.rotation, 'time_limit': args.time_limit,
+                'wait': not args.no_wait}
+        if args.file:
+            w, r, d, n = read_dzn(args.file)
+            body.update(w=w, r=r, d=d)
+        else:
+            body['instance'] = args.instance
+        print(json.dumps(request('POST', '/solve', body, **connection), indent=2))
+
+    else:
+        print(json.dumps(request('DELETE', '/jobs/{}'.format(args.job), **connection), indent=2))
+
+
+if __name__ == '__main__':
+    main()
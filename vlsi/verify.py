@@ -0,0 +1,222 @@
+"""Verifier of the solutions, inline after a solve or in bulk on output folders.
+
+A placement is valid when every circuit has the dimensions of the instance
+(possibly swapped, if rotations are allowed, and then flagged as rotated), lies
+inside the plate of width ``w`` and below the declared height, the declared
+height is the top of the highest circuit and no two circuits overlap.
+
+The bounds and dimension checks are vectorized with NumPy, and overlaps are
+found by a sweep line over the x coordinates: the circuits crossing the sweep
+line have disjoint y intervals, kept sorted, so each new circuit is only
+compared with its two neighbours.
+
+Circuits are matched with the instance by position, or as a multiset when the
+engine listed them in another order (e.g. the area order of the SMT models).
+
+Output files are read in the format written by ``write_output`` and checked
+against the instance with the same number, e.g. ``ins-12-out.txt`` against
+``ins-12.dzn``:
+
+    $ python -m vlsi.verify CP/out SMT/out MIP/out
+"""
+
+import argparse
+import bisect
+import glob
+import os
+import re
+import sys
+
+import numpy as np
+
+from vlsi.engines import ROOT_DIR
+from vlsi.instances import get_instance
+
+DEFAULT_INSTANCES = os.path.join(ROOT_DIR, 'CP', 'instances')
+
+
+#================================================== Reading =================================================================
+
+def read_output(path):
+
+    with open(path, 'r') as f:
+        lines = f.read().splitlines()
+
+    w, height = (int(v) for v in lines[0].split())
+    n = int(lines[1])
+
+    rows = [lines[2+i].split() for i in range(n)]
+    placement = np.array([row[:4] for row in rows], dtype=np.int64).reshape(n, 4)
+    rotated = [row[4:] for row in rows]
+    rotations = None
+    if any(rotated):
+        rotations = np.array([flag == ['Rotated'] for flag in rotated], dtype=bool)
+
+    return {'w': w, 'height': height, 'n': n, 'dx': placement[:, 0], 'dy': placement[:, 1], 'x': placement[:, 2],
+            'y': placement[:, 3], 'rotations': rotations}
+
+
+#================================================== Checks =================================================================
+
+def find_overlap(x, y, dx, dy):
+
+    # Sweep line over x: ends before starts at the same abscissa, so that touching circuits don't overlap
+    n = len(x)
+    coords = np.concatenate([x + dx, x])
+    kinds = np.concatenate([np.zeros(n, dtype=np.int8), np.ones(n, dtype=np.int8)])
+    circuits = np.concatenate([np.arange(n), np.arange(n)])
+    order = np.lexsort((kinds, coords))
+
+    # Disjoint y intervals of the circuits crossing the sweep line, sorted by their bottom
+    bottoms, active = [], []
+    y, top = y.tolist(), (y + dy).tolist()
+
+    for kind, i in zip(kinds[order].tolist(), circuits[order].tolist()):
+        k = bisect.bisect_left(bottoms, y[i])
+        if kind == 0:
+            while active[k] != i:
+                k += 1
+            del bottoms[k], active[k]
+            continue
+
+        if k > 0 and top[active[k-1]] > y[i]:
+            return active[k-1], i
+        if k < len(active) and bottoms[k] < top[i]:
+            return active[k], i
+        bottoms.insert(k, y[i])
+        active.insert(k, i)
+
+    return None
+
+
+def same_circuits(dx, dy, r, d):
+
+    # Equal multisets of (width, height) pairs, whatever the order of the circuits
+    placed, given = np.stack([dx, dy], axis=1), np.stack([r, d], axis=1)
+    placed = placed[np.lexsort((placed[:, 1], placed[:, 0]))]
+    given = given[np.lexsort((given[:, 1], given[:, 0]))]
+    return np.array_equal(placed, given)
+
+
+def check_placement(w, height, x, y, dx, dy, r=None, d=None, rotation=False, rotations=None):
+
+    # List of the violations found, empty for a valid placement
+    x, y, dx, dy = (np.asarray(v, dtype=np.int64) for v in (x, y, dx, dy))
+    violations = []
+
+    def report(mask, message):
+        for i in np.flatnonzero(mask)[:5].tolist():
+            violations.append(message.format(i=i+1, x=x[i], y=y[i], dx=dx[i], dy=dy[i]))
+
+    if r is not None:
+        r, d = np.asarray(r, dtype=np.int64), np.asarray(d, dtype=np.int64)
+        if len(r) != len(x):
+            return ['{} circuits placed, the instance has {}'.format(len(x), len(r))]
+        if rotation and rotations is not None:
+            # Dimensions before the rotation given by the flags
+            rotations = np.asarray(rotations, dtype=bool)
+            width, length = np.where(rotations, dy, dx), np.where(rotations, dx, dy)
+            given_width, given_length = r, d
+            message = 'circuit {i}: dimensions {dx}x{dy} not those of the instance with its rotation flag'
+        elif rotation:
+            width, length = np.minimum(dx, dy), np.maximum(dx, dy)
+            given_width, given_length = np.minimum(r, d), np.maximum(r, d)
+            message = 'circuit {i}: dimensions {dx}x{dy} not those of the instance'
+        else:
+            width, length, given_width, given_length = dx, dy, r, d
+            message = 'circuit {i}: dimensions {dx}x{dy} not those of the instance'
+
+        matching = (width == given_width) & (length == given_length)
+        if not matching.all() and not same_circuits(width, length, given_width, given_length):
+            report(~matching, message)
+
+    report((dx <= 0) | (dy <= 0), 'circuit {i}: empty dimensions {dx}x{dy}')
+    report((x < 0) | (y < 0), 'circuit {i}: negative position ({x}, {y})')
+    report(x + dx > w, 'circuit {i}: exceeds the width, x + dx = {x} + {dx}')
+    report(y + dy > height, 'circuit {i}: exceeds the height, y + dy = {y} + {dy}')
+
+    top = int((y + dy).max()) if len(y) else 0
+    if top != height:
+        violations.append('height {} but the highest circuit ends at {}'.format(height, top))
+
+    if not violations:
+        overlap = find_overlap(x, y, dx, dy)
+        if overlap is not None:
+            i, j = sorted(overlap)
+            violations.append('circuits {} and {} overlap'.format(i+1, j+1))
+
+    return violations
+
+
+def check_result(result, w, r, d, rotation):
+
+    # Inline check of the result of solve_instance
+    if result.get('height') is None:
+        return []
+    return check_placement(w, result['height'], result['x'], result['y'], result['dx'], result['dy'], r, d, rotation,
+                           result.get('rotations') if rotation else None)
+
+
+def check_file(path, instances_dir=DEFAULT_INSTANCES):
+
+    output = read_output(path)
+    name = re.match(r'(.+)-out\.txt$', os.path.basename(path))
+    if name is None:
+        return ['no instance matching the file name']
+    w, r, d, n = get_instance(instances_dir, name.group(1))
+    if output['w'] != w:
+        return ['width {} but the instance has {}'.format(output['w'], w)]
+
+    # Rotations are allowed when the file flags them
+    rotation = output['rotations'] is not None
+    return check_placement(w, output['height'], output['x'], output['y'], output['dx'], output['dy'], r, d, rotation,
+                           output['rotations'])
+
+
+def check_folder(folder, instances_dir=DEFAULT_INSTANCES):
+
+    # Violations of every output file below the folder, by path
+    reports = {}
+    for path in sorted(glob.glob(os.path.join(folder, '**', '*.txt'), recursive=True)):
+        try:
+            reports[path] = check_file(path, instances_dir)
+        except (OSError, ValueError, IndexError, KeyError) as e:
+            reports[path] = ['unreadable: {!r}'.format(e)]
+    return reports
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Check the placements of VLSI output files.')
+    parser.add_argument('paths', nargs='+', help='output files or folders containing them')
+    parser.add_argument('--instances-dir', default=DEFAULT_INSTANCES, help='folder of the .dzn instances')
+    parser.add_argument('--quiet', action='store_true', help='only print the invalid files')
+    args = parser.parse_args(argv)
+
+    reports = {}
+    for path in args.paths:
+        if os.path.isdir(path):
+            reports.update(check_folder(path, args.instances_dir))
+        else:
+            try:
+                reports[path] = check_file(path, args.instances_dir)
+            except (OSError, ValueError, IndexError, KeyError) as e:
+                reports[path] = ['unreadable: {!r}'.format(e)]
+
+    invalid = 0
+    for path, violations in reports.items():
+        if violations:
+            invalid += 1
+            print('{}: INVALID'.format(path))
+            for violation in violations:
+                print('  ' + violation)
+        elif not args.quiet:
+            print('{}: ok'.format(path))
+
+    print('{} files checked, {} invalid'.format(len(reports), invalid))
+    if invalid:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
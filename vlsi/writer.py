@@ -0,0 +1,163 @@
+"""Output files and plots written off the solving path.
+
+The engines hand their output files and plots over to this module instead of
+writing them on the solving thread:
+
+* output files are written by a background thread, in submission order;
+* plots are rendered with the Agg backend and every figure is closed once
+  saved. Depending on the plot mode they are rendered by a background process
+  (``background``), spooled to ``.cache/plots`` and rendered all together at
+  the end of the sweep (``batch``), or not rendered at all (``off``).
+
+The mode is taken from ``configure`` or from the ``VLSI_PLOTS`` environment
+variable, which is inherited by the worker processes of ``vlsi.batch``. Spooled
+plots can also be rendered later with:
+
+    $ python -m vlsi.writer
+"""
+
+import argparse
+import atexit
+import json
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from random import randint
+
+from vlsi.jsonl import append
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SPOOL_FILE = os.path.join(ROOT_DIR, '.cache', 'plots', 'pending.jsonl')
+
+PLOT_MODES = ('background', 'batch', 'off')
+
+_settings = {'plots': None, 'background': True}
+_executors = {}
+_futures = []
+
+
+def configure(plots=None, background=None):
+
+    if plots is not None:
+        if plots not in PLOT_MODES:
+            raise ValueError("Unknown plot mode '{}', expected one of {}".format(plots, ', '.join(PLOT_MODES)))
+        _settings['plots'] = plots
+    if background is not None:
+        _settings['background'] = background
+
+
+def plot_mode():
+    return _settings['plots'] or os.environ.get('VLSI_PLOTS', 'background')
+
+
+#================================================== Rendering =================================================================
+
+def plot_packing(x_sol, y_sol, dx, dy, path):
+
+    # matplotlib is only imported by the processes rendering plots
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib import pyplot as plt
+    from matplotlib.patches import Rectangle
+
+    fig, ax = plt.subplots()
+
+    for i in range(len(x_sol)):
+        ax.plot()
+        ax.add_patch(Rectangle((x_sol[i], y_sol[i]), dx[i], dy[i], color='#%06X' % randint(0, 0xFFFFFF), alpha=0.5))
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fig.savefig(path)
+    plt.close(fig)
+
+
+def render_pending(workers=None):
+
+    # Taking the whole spool first, so that plots submitted meanwhile go to the next batch
+    taken = SPOOL_FILE + '.{}'.format(os.getpid())
+    try:
+        os.replace(SPOOL_FILE, taken)
+    except FileNotFoundError:
+        return 0
+
+    with open(taken, 'r') as f:
+        plots = [json.loads(line) for line in f if line.strip()]
+
+    with ProcessPoolExecutor(workers, mp_context=mp.get_context('spawn')) as pool:
+        list(pool.map(_render, plots))
+
+    os.remove(taken)
+    return len(plots)
+
+
+def _render(plot):
+    plot_packing(plot['x'], plot['y'], plot['dx'], plot['dy'], plot['path'])
+
+
+#================================================== Submission =================================================================
+
+def _executor(kind):
+
+    # Daemonic processes (the workers of vlsi.batch) can't have children: their plots are rendered by a thread
+    if kind not in _executors:
+        if kind == 'plots' and not mp.current_process().daemon:
+            _executors[kind] = ProcessPoolExecutor(1, mp_context=mp.get_context('spawn'))
+        else:
+            _executors[kind] = ThreadPoolExecutor(1)
+    return _executors[kind]
+
+
+def save_output(write, *args):
+
+    # write(*args) on the writer thread
+    if _settings['background']:
+        _futures.append(_executor('outputs').submit(write, *args))
+    else:
+        write(*args)
+
+
+def save_plot(x_sol, y_sol, dx, dy, path):
+
+    mode = plot_mode()
+    if mode == 'off':
+        return
+
+    plot = {'x': list(x_sol), 'y': list(y_sol), 'dx': list(dx), 'dy': list(dy), 'path': os.path.abspath(path)}
+
+    if mode == 'batch':
+        # One write per plot, as the workers of a sweep spool into the same file
+        os.makedirs(os.path.dirname(SPOOL_FILE), exist_ok=True)
+        append(SPOOL_FILE, plot)
+    elif _settings['background']:
+        _futures.append(_executor('plots').submit(_render, plot))
+    else:
+        _render(plot)
+
+
+def flush():
+
+    # Waiting for every output file and plot submitted so far, errors included
+    while _futures:
+        _futures.pop(0).result()
+
+
+@atexit.register
+def _shutdown():
+
+    flush()
+    for executor in _executors.values():
+        executor.shutdown()
+    _executors.clear()
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Render the plots spooled by the engines in batch plot mode.')
+    parser.add_argument('--workers', type=int, default=None, help='number of rendering processes (default: all cores)')
+    args = parser.parse_args(argv)
+
+    print('{} plots rendered'.format(render_pending(args.workers)))
+
+
+if __name__ == '__main__':
+    main()